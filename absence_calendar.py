@@ -0,0 +1,123 @@
+import time
+import threading
+from datetime import date
+import numpy as np
+from sqlalchemy import select, func
+
+# Календарь отсутствий по отделам: для каждого (отдел, год) хранится число сотрудников
+# в отпуске на каждый день года, отдельно по одобренным и ожидающим заявкам.
+# Массив строится разностным методом: +1 в день начала, -1 в день после окончания,
+# затем накопленная сумма. Решения по заявкам правят готовый массив срезом, без пересчета.
+# Пересекающиеся заявки одного сотрудника считаются дважды
+
+
+class DepartmentCalendar:
+    def __init__(self, year, approved, pending, headcount):
+        self.year = year
+        self.approved = approved
+        self.pending = pending
+        self.headcount = headcount
+        self.built_at = time.monotonic()
+
+    @property
+    def total(self):
+        return self.approved + self.pending
+
+
+def year_days(year):
+    return (date(year + 1, 1, 1) - date(year, 1, 1)).days
+
+
+# starts и ends - порядковые номера дат (date.toordinal): это дешевле, чем datetime64 из объектов date
+def day_counts(starts, ends, year):
+    days = year_days(year)
+    jan1 = date(year, 1, 1).toordinal()
+    first = np.clip(starts - jan1, 0, days)
+    after_last = np.clip(ends - jan1 + 1, 0, days)
+    diff = np.bincount(first, minlength=days + 1) - np.bincount(after_last, minlength=days + 1)
+    return np.cumsum(diff[:days]).astype(np.int32)
+
+
+def day_range(start_date, end_date, year):
+    first = max(start_date, date(year, 1, 1))
+    last = min(end_date, date(year, 12, 31))
+    if first > last:
+        return None
+    return (first - date(year, 1, 1)).days, (last - date(year, 1, 1)).days + 1
+
+
+class AbsenceCalendar:
+    # max_age: через сколько секунд массив перестраивается, чтобы учесть заявки, поданные через бота
+    def __init__(self, users, applications, pending_status, approved_status, max_age=300):
+        self.users = users
+        self.applications = applications
+        self.pending_status = pending_status
+        self.approved_status = approved_status
+        self.max_age = max_age
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def department_filter(self, department):
+        column = self.users.c.department
+        return column.is_(None) if department is None else column == department
+
+    def departments(self, conn):
+        return conn.execute(
+            select(self.users.c.department).distinct().order_by(self.users.c.department.nulls_first())
+        ).scalars().all()
+
+    def build(self, conn, department, year):
+        apps = self.applications.c
+        rows = conn.execute(
+            select(apps.start_date, apps.end_date, apps.status)
+            .join_from(self.applications, self.users, apps.user_id == self.users.c.user_id)
+            .where(
+                self.department_filter(department),
+                apps.status.in_([self.pending_status, self.approved_status]),
+                apps.start_date <= date(year, 12, 31),
+                apps.end_date >= date(year, 1, 1)
+            )
+        ).all()
+        headcount = conn.execute(
+            select(func.count()).select_from(self.users).where(self.department_filter(department))
+        ).scalar()
+        starts = np.fromiter((row[0].toordinal() for row in rows), dtype=np.int64, count=len(rows))
+        ends = np.fromiter((row[1].toordinal() for row in rows), dtype=np.int64, count=len(rows))
+        approved = np.fromiter((row[2] == self.approved_status for row in rows), dtype=bool, count=len(rows))
+        return DepartmentCalendar(
+            year,
+            day_counts(starts[approved], ends[approved], year),
+            day_counts(starts[~approved], ends[~approved], year),
+            headcount
+        )
+
+    def get(self, conn, department, year):
+        key = (department, year)
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry is None or time.monotonic() - entry.built_at > self.max_age:
+            entry = self.build(conn, department, year)
+            with self.lock:
+                self.entries[key] = entry
+        return entry
+
+    # Инкрементальное обновление после решения по заявке: например, одобрение -
+    # pending_delta=-1, approved_delta=+1. Затрагиваются только уже построенные годы
+    def apply(self, department, start_date, end_date, pending_delta=0, approved_delta=0):
+        with self.lock:
+            for (entry_department, year), entry in self.entries.items():
+                if entry_department != department:
+                    continue
+                span = day_range(start_date, end_date, year)
+                if span is None:
+                    continue
+                entry.pending[span[0]:span[1]] += pending_delta
+                entry.approved[span[0]:span[1]] += approved_delta
+
+    def invalidate(self, department=None):
+        with self.lock:
+            if department is None:
+                self.entries.clear()
+            else:
+                for key in [key for key in self.entries if key[0] == department]:
+                    del self.entries[key]
@@ -1,101 +1,92 @@
 from PySide6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
     QPushButton, QLineEdit, QMessageBox, QDateEdit, QFileDialog,
-    QLabel, QScrollArea, QComboBox, QInputDialog, QDialog
+    QLabel, QScrollArea, QComboBox, QInputDialog, QDialog, QSpinBox, QProgressDialog
 )
-from PySide6.QtCore import Qt, QDate
-from sqlalchemy import create_engine, Column, Integer, String, Date, Text, ForeignKey, DateTime, Sequence, BigInteger
+from PySide6.QtCore import Qt, QDate, QObject, Signal, QUrl, QTimer
+from PySide6.QtGui import QDesktopServices, QAction, QKeySequence
+from sqlalchemy import create_engine, Column, Integer, String, Date, Text, ForeignKey, DateTime, Sequence, BigInteger, select, func
 from sqlalchemy.orm import sessionmaker, declarative_base
-from datetime import datetime
-import io
+from sqlalchemy.orm.exc import StaleDataError
+from datetime import datetime, date, timedelta
+from collections import OrderedDict, namedtuple
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 import os
+import re
+import time
+import gzip
+import json
 import logging
-from logging.handlers import RotatingFileHandler
-from telebot import TeleBot
+import bulk_users
+import metrics
+import log_pipeline
+import schema_state
+import offline_cache
+import leave_balance
+import data_version
+import reports
+import report_cache
+import report_scheduler
+import archive
+import profiling
+from enums import ApplicationStatus, LeaveType, CodedEnum
+from admin_widgets import (
+    COMPILED_STYLESHEET, WidgetPool, UserCard, ApplicationCard, AbsenceHeatmap, apply_style, styled_label
+)
 
 # Конфигурация
 CONFIG = {
-    "DB_URL": "",
-    "TELEGRAM_TOKEN": ""
+    "DB_URL": os.environ.get("DB_URL", ""),
+    "TELEGRAM_TOKEN": os.environ.get("TELEGRAM_TOKEN", ""),
+    # ID администратора в журнале (logs.actor_id). Внешнего ключа на users нет:
+    # записи аудита не зависят от наличия и удаления учетной записи администратора
+    "ADMIN_ID": int(os.environ.get("ADMIN_ID", "0")),
+    # Каталог сжатых архивов заявок и логов удаленных сотрудников
+    "OFFBOARDING_ARCHIVE_DIR": "offboarding_archive",
+    # Файл, куда периодически сбрасываются метрики в формате Prometheus
+    "METRICS_FILE": "admin_metrics.prom",
+    "METRICS_DUMP_INTERVAL": 60,
+    # Доля сохраняемых записей ниже WARNING по именам логгеров, например {"crm.handlers": 0.1}
+    "LOG_SAMPLING": {},
+    # Локальный снимок для работы по медленному каналу: путь к файлу SQLite, пустая строка - выключено
+    "OFFLINE_SNAPSHOT": os.environ.get("OFFLINE_SNAPSHOT", ""),
+    "OFFLINE_SYNC_INTERVAL": 30,
+    "OFFLINE_LOG_DAYS": 30,
+    # Каталог готовых PDF отчетов и его предельный размер
+    "REPORT_CACHE_DIR": "report_cache",
+    "REPORT_CACHE_MAX_BYTES": 100 * 1024 * 1024,
+    # Каталог, куда report_scheduler.py складывает отчеты по расписанию
+    "SCHEDULED_REPORTS_DIR": os.environ.get("REPORTS_DIR", "scheduled_reports"),
+    # Процессы для пакета отчетов по отделам; None - по числу ядер. На одном ядре и для небольших
+    # пакетов (batch_reports.MIN_POOL_LINES) отчеты строятся в самом процессе
+    "BATCH_REPORT_WORKERS": None,
+    # Каталог файлов профилирования (Ctrl+Shift+P) и порог журнала медленных запросов, с
+    "PROFILE_DIR": "profiles",
+    "SLOW_QUERY_SECONDS": 0.5
 }
 
-# Настройка логирования с ротацией
-handler = RotatingFileHandler('admin_panel.log', maxBytes=10*1024*1024, backupCount=5)
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', handlers=[handler])
+# Режимы профилирования в диалоге скрытого действия
+PROFILE_MODES = {"Сэмплирование (flamegraph)": "sampling", "cProfile": "cprofile"}
+
+# Разделы только для чтения, которые открываются из локального снимка
+OFFLINE_VIEWS = ("users", "history", "logs")
+
 logger = logging.getLogger(__name__)
 
-# Инициализация Telegram-бота только для отправки сообщений
-bot = TeleBot(CONFIG["TELEGRAM_TOKEN"], threaded=False)
+# Telegram-бот только для отправки сообщений; telebot импортируется при первом уведомлении
+bot = None
+
+def get_bot():
+    global bot
+    if bot is None:
+        from telebot import TeleBot
+        bot = TeleBot(CONFIG["TELEGRAM_TOKEN"], threaded=False)
+    return bot
 
 # Базовый класс для моделей
 Base = declarative_base()
 
-# Константы для статусов
-class ApplicationStatus:
-    PENDING = "на рассмотрении"
-    APPROVED = "одобрена"
-    REJECTED = "отклонена"
-
-# Централизованные стили
-STYLES = {
-    "nav_button": """
-        QPushButton {
-            padding: 8px;
-            font-size: 12px;
-            background-color: #f0f0f0;
-            border: 1px solid #ccc;
-            border-radius: 4px;
-        }
-        QPushButton:hover {
-            background-color: #e0e0e0;
-        }
-        QPushButton:pressed {
-            background-color: #d0d0d0;
-        }
-    """,
-    "card": """
-        QWidget {
-            padding: 2px;
-            border-bottom: 1px solid #ddd;
-            background-color: #fafafa;
-            margin: 0px;
-        }
-    """,
-    "label": """
-        QLabel {
-            padding: 0px;
-            margin: 0px;
-        }
-    """,
-    "approve_button": """
-        QPushButton {
-            background-color: #4CAF50;
-            color: white;
-            border-radius: 4px;
-        }
-        QPushButton:hover {
-            background-color: #45a049;
-        }
-    """,
-    "reject_button": """
-        QPushButton {
-            background-color: #f44336;
-            color: white;
-            border-radius: 4px;
-        }
-        QPushButton:hover {
-            background-color: #da190b;
-        }
-    """,
-    "action_button": """
-        QPushButton {
-            padding: 8px;
-            font-size: 12px;
-            margin: 0px;
-        }
-    """
-}
-
 # Модели БД
 class User(Base):
     __tablename__ = 'users'
@@ -105,30 +96,68 @@ class User(Base):
     position = Column(String(100))
     department = Column(String(100))
     email = Column(String(100), unique=True, nullable=False)
+    # Версия строки для оптимистичной блокировки: UPDATE идет с условием version = прочитанной,
+    # при расхождении SQLAlchemy выбрасывает StaleDataError
+    version = Column(Integer, nullable=False, server_default="1")
+    __mapper_args__ = {"version_id_col": version}
 
 class Application(Base):
     __tablename__ = 'applications'
     application_id = Column(Integer, Sequence('applications_application_id_seq'), primary_key=True)
-    user_id = Column(BigInteger, ForeignKey('users.user_id'), nullable=False)
+    user_id = Column(BigInteger, ForeignKey('users.user_id', ondelete='CASCADE'), nullable=False)
     start_date = Column(Date, nullable=False)
     end_date = Column(Date, nullable=False)
-    type = Column(String(100), nullable=False)
-    status = Column(String(20), nullable=False)
+    type = Column(CodedEnum(LeaveType), nullable=False)
+    status = Column(CodedEnum(ApplicationStatus), nullable=False)
     reason = Column(Text)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    version = Column(Integer, nullable=False, server_default="1")
+    __mapper_args__ = {"version_id_col": version}
 
 class Log(Base):
     __tablename__ = 'logs'
     log_id = Column(Integer, Sequence('logs_log_id_seq'), primary_key=True)
-    user_id = Column(BigInteger, ForeignKey('users.user_id'), nullable=False)
+    # Сотрудник, к которому относится запись; пусто у действий администратора без сотрудника
+    user_id = Column(BigInteger, ForeignKey('users.user_id', ondelete='CASCADE'))
     action = Column(Text, nullable=False)
     timestamp = Column(DateTime, default=datetime.utcnow)
-
-# Инициализация базы данных
-engine = create_engine(CONFIG["DB_URL"], pool_size=5, max_overflow=10)
-Base.metadata.create_all(engine)
-SessionFactory = sessionmaker(bind=engine)
+    # Кто выполнил действие в админ-панели; у действий сотрудников в боте пусто
+    actor_id = Column(BigInteger)
+
+leave_balances = leave_balance.define_table(Base.metadata)
+data_versions = data_version.define_table(Base.metadata)
+applications_archive = archive.define_table(Base.metadata)
+# Рабочая таблица и архив рассмотренных заявок вместе: история, отчеты, календарь и сверка
+all_applications = archive.combined(Application.__table__, applications_archive)
+
+# Инициализация базы данных: выполняется в фоне после показа окна, а не при импорте
+engine = None
+SessionFactory = sessionmaker()
+data_version.track(SessionFactory, data_versions)
+
+def init_db():
+    global engine
+    engine = create_engine(CONFIG["DB_URL"], pool_size=5, max_overflow=10)
+    metrics.instrument_engine(engine)
+    profiling.log_slow_queries(engine, CONFIG["SLOW_QUERY_SECONDS"])
+    if schema_state.ensure_schema(engine, Base.metadata):
+        leave_balance.rebuild_on_start(engine, leave_balances, all_applications)
+    SessionFactory.configure(bind=engine)
+    return engine
+
+# Сессия на одну операцию: identity map не копится за время работы панели
+@contextmanager
+def db_session():
+    session = SessionFactory()
+    try:
+        yield session
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
 
 # Функция уведомления пользователя через Telegram
 def notify_user(app_id, status):
@@ -136,9 +165,10 @@ def notify_user(app_id, status):
     try:
         app = session.query(Application).filter_by(application_id=app_id).first()
         if app:
-            status_text = "одобрена" if status == ApplicationStatus.APPROVED else "отклонена"
+            status_text = ApplicationStatus(status).label
             try:
-                bot.send_message(app.user_id, f"Ваша заявка #{app_id} {status_text}!")
+                with metrics.telegram_call("sendMessage"):
+                    get_bot().send_message(app.user_id, f"Ваша заявка #{app_id} {status_text}!")
                 session.add(Log(user_id=app.user_id, action=f"Уведомление о статусе заявки #{app_id}: {status_text}"))
                 session.commit()
                 logger.info(f"Уведомление отправлено пользователю {app.user_id} о статусе заявки #{app_id}: {status_text}")
@@ -150,18 +180,326 @@ def notify_user(app_id, status):
     finally:
         session.close()
 
+# Массовое удаление сотрудников одной транзакцией: их данные сначала выгружаются
+# в сжатый архив, затем заявки, логи и сами пользователи удаляются set-based запросами.
+# Записи журнала пишутся без user_id, с администратором в actor_id, поэтому не попадают под удаление
+def offboard_users(user_ids, actor_id, archive_dir=None):
+    user_ids = sorted(set(user_ids) - {actor_id})
+    if not user_ids:
+        return [], None
+    users, applications, logs = User.__table__, Application.__table__, Log.__table__
+    archive_dir = archive_dir or CONFIG["OFFBOARDING_ARCHIVE_DIR"]
+    os.makedirs(archive_dir, exist_ok=True)
+    archive_path = os.path.join(archive_dir, f"offboarding_{datetime.now():%Y%m%d_%H%M%S_%f}.jsonl.gz")
+    try:
+        with engine.begin() as conn:
+            found = conn.execute(select(users.c.user_id).where(users.c.user_id.in_(user_ids))).scalars().all()
+            if not found:
+                return [], None
+            with gzip.open(archive_path, "wt", encoding="utf-8") as f:
+                for table in (users, applications, applications_archive, logs, leave_balances):
+                    query = select(table).where(table.c.user_id.in_(found)).execution_options(stream_results=True)
+                    for row in conn.execute(query).mappings():
+                        f.write(json.dumps({"table": table.name, **row}, ensure_ascii=False, default=str) + "\n")
+            conn.execute(applications.delete().where(applications.c.user_id.in_(found)))
+            conn.execute(applications_archive.delete().where(applications_archive.c.user_id.in_(found)))
+            conn.execute(logs.delete().where(logs.c.user_id.in_(found)))
+            conn.execute(leave_balances.delete().where(leave_balances.c.user_id.in_(found)))
+            conn.execute(users.delete().where(users.c.user_id.in_(found)))
+            data_version.bump(conn, data_versions, ["users", "applications"])
+            conn.execute(logs.insert(), [
+                {"user_id": None, "actor_id": actor_id, "action": f"Удаление пользователя {user_id} администратором ({os.path.basename(archive_path)})"}
+                for user_id in found
+            ])
+    except Exception:
+        if os.path.exists(archive_path):
+            os.remove(archive_path)
+        raise
+    logger.info(f"Удалены пользователи {found}, архив {archive_path}")
+    return found, archive_path
+
+# Признак конфликта версий в результатах операций панели
+CONFLICT = object()
+
+def user_fields(user):
+    return (user.first_name, user.last_name, user.position, user.department, user.email)
+
+# Строки списков: только колонки для карточек, без ORM-сущностей и полного текста причины
+REASON_PREVIEW = 80
+
+UserRow = namedtuple("UserRow", "user_id first_name last_name position department email")
+ApplicationRow = namedtuple("ApplicationRow", "application_id first_name last_name type start_date end_date status version reason")
+LogRow = namedtuple("LogRow", "timestamp user_id first_name action actor_id")
+
+# source - таблица applications или объединение с архивом
+def application_columns(source):
+    return (
+        source.c.application_id, User.first_name, User.last_name, source.c.type,
+        source.c.start_date, source.c.end_date, source.c.status, source.c.version,
+        # Символ сверх лимита показывает, что причина обрезана
+        func.substr(source.c.reason, 1, REASON_PREVIEW + 1)
+    )
+
+def reason_preview(reason):
+    if reason and len(reason) > REASON_PREVIEW:
+        return reason[:REASON_PREVIEW] + "…"
+    return reason
+
+def application_rows(session, query):
+    return [ApplicationRow._make(row[:-1] + (reason_preview(row[-1]),)) for row in session.execute(query)]
+
+# Загрузчики страниц для разделов панели: (session, filters, offset, limit) -> строки.
+# Явная сортировка нужна для стабильной пагинации и предзагрузки
+def fetch_users(session, filters, offset, limit):
+    query = select(User.user_id, User.first_name, User.last_name, User.position, User.department, User.email)
+    return [UserRow._make(row) for row in session.execute(query.order_by(User.user_id).limit(limit).offset(offset))]
+
+def fetch_applications(session, filters, offset, limit):
+    status = filters.get("status", "Все")
+    status = ApplicationStatus.PENDING if status == "Все" else ApplicationStatus.from_label(status)
+    # Ожидающие рассмотрения заявки в архив не попадают
+    source = Application.__table__ if status == ApplicationStatus.PENDING else all_applications
+    query = select(*application_columns(source)).join_from(source, User, source.c.user_id == User.user_id)
+    search_text = filters.get("search", "")
+    if search_text:
+        query = query.where(
+            (User.first_name.ilike(f"%{search_text}%")) |
+            (User.last_name.ilike(f"%{search_text}%")) |
+            (source.c.application_id == int(search_text) if search_text.isdigit() else False)
+        )
+    query = query.where(source.c.status == status)
+    return application_rows(session, query.order_by(source.c.application_id).limit(limit).offset(offset))
+
+def fetch_history(session, filters, offset, limit):
+    source = all_applications
+    query = select(*application_columns(source)).join_from(source, User, source.c.user_id == User.user_id).where(
+        source.c.status.in_([ApplicationStatus.APPROVED, ApplicationStatus.REJECTED])
+    )
+    return application_rows(session, query.order_by(source.c.application_id.desc()).limit(limit).offset(offset))
+
+def fetch_logs(session, filters, offset, limit):
+    query = select(Log.timestamp, Log.user_id, User.first_name, Log.action, Log.actor_id).outerjoin_from(
+        Log, User, User.user_id == Log.user_id)
+    return [LogRow._make(row) for row in session.execute(query.order_by(Log.timestamp.desc()).limit(limit).offset(offset))]
+
+# Страница в кэше: строки, версии данных на момент загрузки (None для снимка) и время загрузки
+CachedPage = namedtuple("CachedPage", "rows versions loaded_at")
+
+# Контроллер состояния представления: активный раздел, фильтры и текущая страница.
+# Держит LRU недавно просмотренных страниц и подгружает следующую страницу в фоне.
+# Страница из основной БД действительна, пока не изменились версии данных (заявки
+# и пользователи, в том числе поданные через бота); любая страница живет не дольше ttl -
+# так обновляются логи, у которых версии нет.
+# Кэш и словарь ожидающих загрузок трогаются только из GUI-потока,
+# фоновый поток лишь выполняет запрос в собственной сессии
+class ViewController:
+    def __init__(self, fetchers, per_page, cache_size=32, ttl=30, versions=None):
+        self.fetchers = fetchers
+        self.per_page = per_page
+        self.cache_size = cache_size
+        self.ttl = ttl
+        # versions(session) -> кортеж версий данных основной БД
+        self.versions = versions
+        self.view = None
+        self.filters = ()
+        self.page = 1
+        self.cache = OrderedDict()
+        self.pending = {}
+        # Источник сессий по разделам; по умолчанию основная БД
+        self.sources = {}
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prefetch")
+
+    def key(self, page):
+        return (self.view, self.filters, page)
+
+    def open(self, view, page=1, filters=()):
+        self.view = view
+        self.page = page
+        self.filters = tuple(filters)
+        rows = self.get_page(page, self.current_versions(view))
+        if len(rows) == self.per_page:
+            self.prefetch(page + 1)
+        return rows
+
+    # Один запрос по первичному ключу; для разделов из снимка версии основной БД не читаются
+    def current_versions(self, view):
+        if self.versions is None or view in self.sources:
+            return None
+        session = SessionFactory()
+        try:
+            return self.versions(session)
+        finally:
+            session.close()
+
+    def is_fresh(self, entry, versions):
+        return entry.versions == versions and time.monotonic() - entry.loaded_at < self.ttl
+
+    def get_page(self, page, versions=None):
+        key = self.key(page)
+        entry = self.cache.get(key)
+        if entry is not None and self.is_fresh(entry, versions):
+            self.cache.move_to_end(key)
+            return entry.rows
+        entry = None
+        future = self.pending.pop(key, None)
+        if future is not None:
+            try:
+                entry = future.result()
+            except Exception as e:
+                logger.warning(f"Фоновая загрузка страницы {key} не удалась: {e}")
+        if entry is None or not self.is_fresh(entry, versions):
+            entry = self.load(key)
+        self.store(key, entry)
+        return entry.rows
+
+    def prefetch(self, page):
+        key = self.key(page)
+        if key not in self.cache and key not in self.pending:
+            self.pending[key] = self.executor.submit(self.load, key)
+
+    def load(self, key):
+        view, filters, page = key
+        source = self.sources.get(view)
+        session = (source or SessionFactory)()
+        try:
+            # Версии читаются до запроса: при параллельной записи страница окажется новее версий
+            # и просто перезагрузится при следующем открытии
+            versions = self.versions(session) if self.versions is not None and source is None else None
+            rows = self.fetchers[view](session, dict(filters), (page - 1) * self.per_page, self.per_page)
+            return CachedPage(rows, versions, time.monotonic())
+        finally:
+            session.close()
+
+    def store(self, key, entry):
+        self.cache[key] = entry
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    # Переход по кнопке раздела всегда показывает свежие данные этого раздела
+    def drop(self, view):
+        for key in [key for key in self.cache if key[0] == view]:
+            del self.cache[key]
+        for key in [key for key in self.pending if key[0] == view]:
+            self.pending.pop(key).cancel()
+
+    def invalidate(self):
+        # Незавершенные загрузки отбрасываются: их результат мог устареть
+        self.cache.clear()
+        for future in self.pending.values():
+            future.cancel()
+        self.pending.clear()
+
+    def shutdown(self):
+        self.invalidate()
+        self.executor.shutdown(wait=False)
+
+# Сигналы фоновых задач: результат доставляется в GUI-поток
+class TaskSignals(QObject):
+    done = Signal(object)
+    failed = Signal(object)
+
 # Главное окно админ-панели
 class AdminPanel(QMainWindow):
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Панель администратора CRM")
         self.setGeometry(100, 100, 800, 600)
-        self.session = SessionFactory()
-        self.current_page = 1
+        self.db_ready = False
+        self.snapshot = None
+        self.calendar = None
+        self.report_cache = report_cache.ReportCache()
+        self.pdf_cache = report_cache.PdfCache(CONFIG["REPORT_CACHE_DIR"], CONFIG["REPORT_CACHE_MAX_BYTES"])
         self.per_page = 20
+        self.views = ViewController({
+            "users": fetch_users,
+            "applications": fetch_applications,
+            "history": fetch_history,
+            "logs": fetch_logs
+        }, self.per_page, versions=lambda session: data_version.current(session, data_versions))
+        QApplication.instance().setStyleSheet(COMPILED_STYLESHEET)
         self.init_ui()
+        self.startup = TaskSignals()
+        self.startup.done.connect(self.on_db_ready)
+        self.startup.failed.connect(self.on_db_failed)
+        self.sync_signals = TaskSignals()
+        self.sync_signals.done.connect(self.on_snapshot_synced)
+        # Пакет отчетов по отделам: результаты процессов пула приходят в поток GUI через сигналы
+        self.batch = None
+        self.batch_progress = None
+        self.batch_signals = TaskSignals()
+        self.batch_signals.done.connect(self.on_batch_document)
+        self.batch_signals.failed.connect(self.on_batch_error)
+        self.profiler = profiling.Profiler(CONFIG["PROFILE_DIR"], "admin")
+        self.profile_timer = QTimer(self)
+        self.profile_timer.setSingleShot(True)
+        self.profile_timer.timeout.connect(self.stop_profiling)
+        self.views.executor.submit(self.connect_db, self.application_filters())
         logger.info("Панель администратора инициализирована")
 
+    # Подключение к БД и загрузка первой страницы заявок в фоновом потоке
+    def connect_db(self, filters):
+        try:
+            if engine is None:
+                init_db()
+            if CONFIG["OFFLINE_SNAPSHOT"]:
+                self.snapshot = offline_cache.OfflineSnapshot(
+                    CONFIG["OFFLINE_SNAPSHOT"], engine, Base.metadata, log_days=CONFIG["OFFLINE_LOG_DAYS"])
+            key = ("applications", filters, 1)
+            self.startup.done.emit((key, self.views.load(key)))
+        except Exception as e:
+            logger.error(f"Ошибка подключения к базе данных: {e}", exc_info=True)
+            self.startup.failed.emit(e)
+
+    def on_db_ready(self, result):
+        key, page = result
+        self.db_ready = True
+        self.views.store(key, page)
+        self.set_navigation_enabled(True)
+        if self.snapshot:
+            if self.snapshot.ready:
+                self.use_snapshot()
+            self.snapshot.start(CONFIG["OFFLINE_SYNC_INTERVAL"], on_sync=self.sync_signals.done.emit)
+        self.show_applications(page=1)
+
+    def use_snapshot(self):
+        self.views.sources = {view: self.snapshot.SessionFactory for view in OFFLINE_VIEWS}
+
+    def on_snapshot_synced(self, counts):
+        if not self.views.sources:
+            self.use_snapshot()
+        # Открытая страница не перерисовывается, чтобы не сбивать администратора;
+        # новые данные появятся при следующем переходе
+        if any(counts.values()):
+            self.views.invalidate()
+        if self.views.view in self.views.sources:
+            self.update_pagination_label()
+
+    # После изменения через панель снимок догоняет основную БД вне очереди
+    def data_changed(self):
+        self.views.invalidate()
+        if self.snapshot:
+            self.snapshot.request_sync()
+
+    # Состав отделов изменился (импорт, редактирование, удаление): календарь строится заново
+    def staff_changed(self):
+        self.data_changed()
+        if self.calendar:
+            self.calendar.invalidate()
+
+    def on_db_failed(self, error):
+        self.clear_content()
+        self.add_label("Не удалось подключиться к базе данных")
+        QMessageBox.critical(self, "Ошибка", f"Не удалось подключиться к базе данных:\n{error}")
+
+    def set_navigation_enabled(self, enabled):
+        for widget in [self.btn_users, self.btn_applications, self.btn_history, self.btn_calendar, self.btn_reports, self.btn_logs,
+                       self.search_input, self.status_filter]:
+            widget.setEnabled(enabled)
+
+    def application_filters(self):
+        return (("search", self.search_input.text().lower()), ("status", self.status_filter.currentText()))
+
     def init_ui(self):
         main_widget = QWidget()
         self.setCentralWidget(main_widget)
@@ -175,9 +513,10 @@ class AdminPanel(QMainWindow):
         self.btn_users = QPushButton("👤 Пользователи")
         self.btn_applications = QPushButton("📋 Заявки")
         self.btn_history = QPushButton("🕒 История заявок")
+        self.btn_calendar = QPushButton("📅 Календарь")
         self.btn_reports = QPushButton("📊 Отчеты")
         self.btn_logs = QPushButton("📜 Логи")
-        for btn in [self.btn_users, self.btn_applications, self.btn_history, self.btn_reports, self.btn_logs]:
+        for btn in [self.btn_users, self.btn_applications, self.btn_history, self.btn_calendar, self.btn_reports, self.btn_logs]:
             self.apply_style(btn, "nav_button")
             nav_layout.addWidget(btn)
         main_layout.addLayout(nav_layout)
@@ -187,7 +526,7 @@ class AdminPanel(QMainWindow):
         self.search_input = QLineEdit()
         self.search_input.setPlaceholderText("Поиск по имени, фамилии или ID")
         self.status_filter = QComboBox()
-        self.status_filter.addItems(["Все", ApplicationStatus.PENDING, ApplicationStatus.APPROVED, ApplicationStatus.REJECTED])
+        self.status_filter.addItems(["Все", *(status.label for status in ApplicationStatus)])
         self.search_input.textChanged.connect(lambda: self.show_applications(page=1))
         self.status_filter.currentTextChanged.connect(lambda: self.show_applications(page=1))
         filter_layout.addWidget(QLabel("Фильтр:"))
@@ -201,6 +540,11 @@ class AdminPanel(QMainWindow):
         self.content_layout.setSpacing(1)
         self.content_layout.setContentsMargins(0, 0, 0, 0)
         self.content_layout.setAlignment(Qt.AlignTop)
+        self.pool = WidgetPool(self.content_layout)
+        self.pool.register("label", styled_label)
+        self.pool.register("user", lambda: UserCard(self.edit_user, self.delete_user))
+        self.pool.register("application", lambda: ApplicationCard(
+            self.approve_application, self.reject_application, self.show_application_details))
         self.scroll = QScrollArea()
         self.scroll.setWidget(self.content_widget)
         self.scroll.setWidgetResizable(True)
@@ -223,206 +567,335 @@ class AdminPanel(QMainWindow):
         main_layout.addLayout(pagination_layout)
 
         # Подключение кнопок
-        self.btn_users.clicked.connect(lambda: self.show_users(page=1))
-        self.btn_applications.clicked.connect(lambda: self.show_applications(page=1))
-        self.btn_history.clicked.connect(lambda: self.show_history(page=1))
+        self.btn_users.clicked.connect(lambda: self.navigate("users", self.show_users))
+        self.btn_applications.clicked.connect(lambda: self.navigate("applications", self.show_applications))
+        self.btn_history.clicked.connect(lambda: self.navigate("history", self.show_history))
+        self.btn_calendar.clicked.connect(self.show_calendar)
         self.btn_reports.clicked.connect(self.show_reports)
-        self.btn_logs.clicked.connect(lambda: self.show_logs(page=1))
-        self.show_applications(page=1)
+        self.btn_logs.clicked.connect(lambda: self.navigate("logs", self.show_logs))
+        self.set_navigation_enabled(False)
+        self.prev_page_btn.setEnabled(False)
+        self.next_page_btn.setEnabled(False)
+        self.add_label("Подключение к базе данных...")
+
+        # Скрытое действие профилирования: без пункта меню, только по Ctrl+Shift+P
+        profile_action = QAction("Профилирование", self)
+        profile_action.setShortcut(QKeySequence("Ctrl+Shift+P"))
+        profile_action.triggered.connect(self.toggle_profiling)
+        self.addAction(profile_action)
+
+    def navigate(self, view, show):
+        self.views.drop(view)
+        show(page=1)
+
+    @property
+    def current_page(self):
+        return self.views.page
 
     def apply_style(self, widget, style_key):
-        widget.setStyleSheet(STYLES[style_key])
+        apply_style(widget, style_key)
+
+    def take_widget(self, kind):
+        return self.pool.acquire(kind)
+
+    def add_widget(self, widget):
+        self.pool.insert(widget)
+
+    def add_label(self, text):
+        self.take_widget("label").setText(text)
 
     def add_header(self, text):
-        header = QLabel(f"<b>{text}</b>")
-        self.apply_style(header, "label")
-        self.content_layout.addWidget(header)
+        self.add_label(f"<b>{text}</b>")
 
     def clear_content(self):
         logger.info("Очистка контента")
-        while self.content_layout.count():
-            item = self.content_layout.takeAt(0)
-            if item.widget():
-                item.widget().deleteLater()
+        self.pool.reset()
 
-    def log_action(self, user_id, action):
+    # С переданной сессией запись попадает в транзакцию вызывающего.
+    # user_id - сотрудник, к которому относится действие, или None; исполнитель - администратор панели
+    def log_action(self, user_id, action, session=None):
+        if session is not None:
+            session.add(Log(user_id=user_id, action=action, actor_id=CONFIG["ADMIN_ID"]))
+            logger.info(f"Лог: {action}")
+            return
         try:
-            self.session.add(Log(user_id=user_id, action=action))
-            self.session.commit()
+            with db_session() as own_session:
+                own_session.add(Log(user_id=user_id, action=action, actor_id=CONFIG["ADMIN_ID"]))
             logger.info(f"Лог: {action}")
         except Exception as e:
-            self.session.rollback()
             logger.error(f"Ошибка при записи лога: {e}")
 
     def prev_page(self):
-        if self.current_page > 1:
-            self.current_page -= 1
-            self.refresh_content()
+        if self.views.page > 1:
+            self.refresh_content(self.views.page - 1)
 
     def next_page(self):
-        self.current_page += 1
-        self.refresh_content()
-
-    def refresh_content(self):
-        if self.btn_applications.isDown():
-            self.show_applications(self.current_page)
-        elif self.btn_users.isDown():
-            self.show_users(self.current_page)
-        elif self.btn_history.isDown():
-            self.show_history(self.current_page)
-        elif self.btn_logs.isDown():
-            self.show_logs(self.current_page)
-
+        self.refresh_content(self.views.page + 1)
+
+    def refresh_content(self, page=None):
+        views = {
+            "users": self.show_users,
+            "applications": self.show_applications,
+            "history": self.show_history,
+            "logs": self.show_logs
+        }
+        show = views.get(self.views.view)
+        if show:
+            show(page or self.views.page)
+
+    def update_pagination(self, rows):
+        self.update_pagination_label()
+        self.prev_page_btn.setEnabled(self.views.page > 1)
+        self.next_page_btn.setEnabled(len(rows) == self.per_page)
+
+    def update_pagination_label(self):
+        text = f"Страница {self.views.page}"
+        if self.views.view in self.views.sources:
+            text += f" (снимок от {self.snapshot.last_synced.replace('T', ' ')})"
+        self.page_label.setText(text)
+
+    @metrics.timed
     def show_users(self, page=1):
         logger.info(f"Показ пользователей, страница {page}")
-        self.current_page = page
+        users = self.views.open("users", page)
         self.clear_content()
         self.add_header("Список пользователей")
-        offset = (page - 1) * self.per_page
-        users = self.session.query(User).limit(self.per_page).offset(offset).all()
+        toolbar = QWidget()
+        toolbar_layout = QHBoxLayout(toolbar)
+        toolbar_layout.setContentsMargins(0, 0, 0, 0)
+        for text, callback in [
+            ("📥 Импорт", self.import_users),
+            ("📤 Экспорт", self.export_users),
+            ("🗑️ Массовое удаление", self.bulk_delete_users)
+        ]:
+            btn = QPushButton(text)
+            btn.clicked.connect(callback)
+            self.apply_style(btn, "action_button")
+            toolbar_layout.addWidget(btn)
+        toolbar_layout.addStretch()
+        self.add_widget(toolbar)
         if not users:
-            no_data = QLabel("Нет пользователей")
-            self.apply_style(no_data, "label")
-            self.content_layout.addWidget(no_data)
+            self.add_label("Нет пользователей")
         for user in users:
-            user_widget = QWidget()
-            user_layout = QHBoxLayout(user_widget)
-            user_layout.setContentsMargins(0, 0, 0, 0)
-            user_info = QLabel(f"ID: {user.user_id} | {user.first_name} {user.last_name} | {user.position or '-'} | {user.department or '-'} | {user.email}")
-            edit_btn = QPushButton("✏️ Редактировать")
-            delete_btn = QPushButton("🗑️ Удалить")
-            edit_btn.clicked.connect(lambda _, u=user.user_id: self.edit_user(u))
-            delete_btn.clicked.connect(lambda _, u=user.user_id: self.delete_user(u))
-            user_layout.addWidget(user_info)
-            user_layout.addStretch()
-            user_layout.addWidget(edit_btn)
-            user_layout.addWidget(delete_btn)
-            self.apply_style(user_widget, "card")
-            self.content_layout.addWidget(user_widget)
-        self.page_label.setText(f"Страница {page}")
+            self.take_widget("user").bind(
+                user.user_id,
+                f"ID: {user.user_id} | {user.first_name} {user.last_name} | {user.position or '-'} | {user.department or '-'} | {user.email}"
+            )
+        self.update_pagination(users)
 
+    @metrics.timed
     def show_applications(self, page=1):
         logger.info(f"Показ заявок, страница {page}")
-        self.current_page = page
+        applications = self.views.open("applications", page, self.application_filters())
         self.clear_content()
         self.add_header("Заявки")
-        offset = (page - 1) * self.per_page
-        query = self.session.query(Application, User).join(User)
-        search_text = self.search_input.text().lower()
-        if search_text:
-            query = query.filter(
-                (User.first_name.ilike(f"%{search_text}%")) |
-                (User.last_name.ilike(f"%{search_text}%")) |
-                (Application.application_id == search_text if search_text.isdigit() else False)
-            )
-        status = self.status_filter.currentText()
-        if status != "Все":
-            query = query.filter(Application.status == status)
-        else:
-            query = query.filter(Application.status == ApplicationStatus.PENDING)
-        applications = query.limit(self.per_page).offset(offset).all()
         if not applications:
-            no_data = QLabel("Нет заявок")
-            self.apply_style(no_data, "label")
-            self.content_layout.addWidget(no_data)
-        for app, user in applications:
-            self.add_application_card(app, user, history=(app.status != ApplicationStatus.PENDING))
-        self.page_label.setText(f"Страница {page}")
+            self.add_label("Нет заявок")
+        for app in applications:
+            self.add_application_card(app, history=(app.status != ApplicationStatus.PENDING))
+        self.update_pagination(applications)
 
+    @metrics.timed
     def show_history(self, page=1):
         logger.info(f"Показ истории заявок, страница {page}")
-        self.current_page = page
+        apps = self.views.open("history", page)
         self.clear_content()
         self.add_header("История заявок")
-        offset = (page - 1) * self.per_page
-        apps = self.session.query(Application, User).join(User).filter(
-            Application.status.in_([ApplicationStatus.APPROVED, ApplicationStatus.REJECTED])
-        ).limit(self.per_page).offset(offset).all()
         if not apps:
-            no_data = QLabel("История пуста")
-            self.apply_style(no_data, "label")
-            self.content_layout.addWidget(no_data)
-        for app, user in apps:
-            self.add_application_card(app, user, history=True)
-        self.page_label.setText(f"Страница {page}")
-
-    def format_application_text(self, app, user):
+            self.add_label("История пуста")
+        for app in apps:
+            self.add_application_card(app, history=True)
+        self.update_pagination(apps)
+
+    def format_application_text(self, app):
         return (
-            f"#{app.application_id} | {user.first_name} {user.last_name} | "
+            f"#{app.application_id} | {app.first_name} {app.last_name} | "
             f"{app.type} | {app.start_date} — {app.end_date} | "
             f"Причина: {app.reason or '-'} | Статус: {app.status}"
         )
 
-    def add_application_card(self, app, user, history=False):
-        card_widget = QWidget()
-        card_layout = QHBoxLayout(card_widget)
-        card_layout.setContentsMargins(0, 0, 0, 0)
-        card_text = self.format_application_text(app, user)
-        card_label = QLabel(card_text)
-        card_label.setWordWrap(True)
-        if not history:
-            approve_btn = QPushButton("✅")
-            reject_btn = QPushButton("❌")
-            approve_btn.setFixedSize(40, 40)
-            reject_btn.setFixedSize(40, 40)
-            self.apply_style(approve_btn, "approve_button")
-            self.apply_style(reject_btn, "reject_button")
-            approve_btn.clicked.connect(lambda: self.approve_application(app.application_id))
-            reject_btn.clicked.connect(lambda: self.reject_application(app.application_id))
-            card_layout.addWidget(card_label)
-            card_layout.addStretch()
-            card_layout.addWidget(approve_btn)
-            card_layout.addWidget(reject_btn)
-        else:
-            card_layout.addWidget(card_label)
-        self.apply_style(card_widget, "card")
-        self.content_layout.addWidget(card_widget)
+    def add_application_card(self, app, history=False):
+        self.take_widget("application").bind(app.application_id, self.format_application_text(app), history, app.version)
+
+    # Полные данные заявки загружаются только по запросу из карточки
+    def show_application_details(self, app_id):
+        logger.info(f"Просмотр заявки #{app_id}")
+        with db_session() as session:
+            app = session.execute(
+                select(all_applications, User.first_name, User.last_name, User.department, User.position)
+                .join_from(all_applications, User, all_applications.c.user_id == User.user_id)
+                .where(all_applications.c.application_id == app_id)
+            ).first()
+            if app is None:
+                QMessageBox.warning(self, "Предупреждение", f"Заявка #{app_id} не найдена")
+                return
+            text = (f"Заявка #{app.application_id}\n"
+                    f"Сотрудник: {app.first_name} {app.last_name} (ID {app.user_id})\n"
+                    f"Отдел: {app.department or '-'}, должность: {app.position or '-'}\n"
+                    f"Тип: {app.type}\n"
+                    f"Период: {app.start_date} — {app.end_date}\n"
+                    f"Статус: {app.status}\n"
+                    f"Создана: {app.created_at:%Y-%m-%d %H:%M}, изменена: {app.updated_at:%Y-%m-%d %H:%M}\n\n"
+                    f"Причина:\n{app.reason or '-'}")
+        dialog = QMessageBox(self)
+        dialog.setWindowTitle(f"Заявка #{app_id}")
+        dialog.setText(text)
+        dialog.exec()
 
+    def get_calendar(self):
+        if self.calendar is None:
+            # NumPy подгружается только при первом открытии календаря
+            import absence_calendar
+            self.calendar = absence_calendar.AbsenceCalendar(
+                User.__table__, all_applications, ApplicationStatus.PENDING, ApplicationStatus.APPROVED)
+        return self.calendar
+
+    @metrics.timed
+    def show_calendar(self):
+        logger.info("Показ календаря отсутствий")
+        self.views.view = None
+        self.prev_page_btn.setEnabled(False)
+        self.next_page_btn.setEnabled(False)
+        self.clear_content()
+        self.add_header("Календарь отсутствий")
+        calendar = self.get_calendar()
+        with engine.connect() as conn:
+            departments = calendar.departments(conn)
+        toolbar = QWidget()
+        toolbar_layout = QHBoxLayout(toolbar)
+        toolbar_layout.setContentsMargins(0, 0, 0, 0)
+        department_box = QComboBox()
+        department_box.setMinimumWidth(200)
+        for department in departments:
+            department_box.addItem(department or "Без отдела", department)
+        year_box = QSpinBox()
+        year_box.setRange(2000, 2100)
+        year_box.setValue(datetime.now().year)
+        toolbar_layout.addWidget(QLabel("Отдел:"))
+        toolbar_layout.addWidget(department_box)
+        toolbar_layout.addWidget(QLabel("Год:"))
+        toolbar_layout.addWidget(year_box)
+        toolbar_layout.addStretch()
+        self.add_widget(toolbar)
+        heatmap = AbsenceHeatmap()
+        summary = styled_label()
+        self.add_widget(heatmap)
+        self.add_widget(summary)
+
+        def refresh():
+            if department_box.count() == 0:
+                summary.setText("Нет сотрудников")
+                return
+            department, year = department_box.currentData(), year_box.value()
+            with engine.connect() as conn:
+                entry = calendar.get(conn, department, year)
+            heatmap.set_data(year, entry.approved, entry.pending, entry.headcount)
+            total = entry.total
+            peak_day = date(year, 1, 1) + timedelta(days=int(total.argmax()))
+            summary.setText(f"Сотрудников: {entry.headcount} | пик: {int(total.max())} ({peak_day:%d.%m.%Y}) | "
+                            f"дней с отсутствиями: {int((total > 0).sum())}")
+        department_box.currentIndexChanged.connect(refresh)
+        year_box.valueChanged.connect(refresh)
+        refresh()
+
+    # Поправка календаря по решению: заявка переходит из ожидающих в одобренные или выбывает
+    def calendar_decided(self, department, start_date, end_date, approved):
+        if self.calendar is None:
+            return
+        self.calendar.apply(department, start_date, end_date, pending_delta=-1, approved_delta=1 if approved else 0)
+
+    @metrics.timed
     def show_reports(self):
         logger.info("Показ отчетов")
+        self.views.view = None
+        self.prev_page_btn.setEnabled(False)
+        self.next_page_btn.setEnabled(False)
         self.clear_content()
         self.add_header("Отчеты")
         report_btns = [
             ("Заявки за период", self.report_applications_period),
             ("Длительность по отделам", self.report_duration_departments),
-            ("Заявки сотрудника", self.report_employee_applications)
+            ("Отчеты по отделам (пакет)", self.report_departments_batch),
+            ("Заявки сотрудника", self.report_employee_applications),
+            ("Сверка остатков отпусков", self.reconcile_balances)
         ]
         for text, callback in report_btns:
             btn = QPushButton(text)
             btn.clicked.connect(callback)
             self.apply_style(btn, "action_button")
-            self.content_layout.addWidget(btn)
-
+            self.add_widget(btn)
+        self.show_scheduled_reports()
+
+    # Отчеты, построенные планировщиком: открываются сразу, без запросов к базе
+    def show_scheduled_reports(self):
+        directory = CONFIG["SCHEDULED_REPORTS_DIR"]
+        index = report_scheduler.load_index(directory)
+        if not index:
+            return
+        self.add_header("Готовые отчеты")
+        for name, entry in sorted(index.items()):
+            ready = entry.get("ready")
+            last = entry.get("last", {})
+            row = QWidget()
+            row_layout = QHBoxLayout(row)
+            row_layout.setContentsMargins(0, 0, 0, 0)
+            if ready:
+                period = " — ".join(sorted(ready.get("key", [None, {}])[1].values()))
+                text = (f"{ready.get('title') or name} {period}: построен {ready['finished_at'].replace('T', ' ')}"
+                        f" за {ready['duration']} с")
+            else:
+                text = f"{name}: готового файла нет"
+            if last.get("status") == "error":
+                text += f" (последний запуск с ошибкой: {last.get('error')})"
+            label = QLabel(text)
+            label.setWordWrap(True)
+            row_layout.addWidget(label, 1)
+            if ready:
+                btn = QPushButton("Открыть")
+                btn.clicked.connect(lambda _, f=ready["file"]: self.open_scheduled_report(directory, f))
+                self.apply_style(btn, "action_button")
+                row_layout.addWidget(btn)
+            self.add_widget(row)
+
+    def open_scheduled_report(self, directory, filename):
+        path = os.path.abspath(os.path.join(directory, filename))
+        logger.info(f"Открытие готового отчета {path}")
+        if not os.path.exists(path) or not QDesktopServices.openUrl(QUrl.fromLocalFile(path)):
+            QMessageBox.warning(self, "Предупреждение", f"Не удалось открыть отчет:\n{path}")
+
+    @metrics.timed
     def show_logs(self, page=1):
         logger.info(f"Показ логов, страница {page}")
-        self.current_page = page
+        logs = self.views.open("logs", page)
         self.clear_content()
         self.add_header("Логи")
-        offset = (page - 1) * self.per_page
-        logs = self.session.query(Log).order_by(Log.timestamp.desc()).limit(self.per_page).offset(offset).all()
         if not logs:
-            no_data = QLabel("Нет логов")
-            self.apply_style(no_data, "label")
-            self.content_layout.addWidget(no_data)
+            self.add_label("Нет логов")
         for log in logs:
-            user = self.session.query(User).filter_by(user_id=log.user_id).first()
-            log_text = f"{log.timestamp.strftime('%Y-%m-%d %H:%M')} | {user.first_name if user else log.user_id} | {log.action}"
-            log_label = QLabel(log_text)
-            self.apply_style(log_label, "label")
-            self.content_layout.addWidget(log_label)
-        self.page_label.setText(f"Страница {page}")
+            who = log.first_name or log.user_id or f"администратор {log.actor_id}"
+            log_text = f"{log.timestamp.strftime('%Y-%m-%d %H:%M')} | {who} | {log.action}"
+            self.add_label(log_text)
+        self.update_pagination(logs)
 
     def edit_user(self, user_id):
         logger.info(f"Редактирование пользователя {user_id}")
-        user = self.session.query(User).filter_by(user_id=user_id).first()
+        with db_session() as session:
+            user = session.get(User, user_id)
+            original = user_fields(user) if user else None
+            version = user.version if user else None
+        if original is None:
+            QMessageBox.warning(self, "Предупреждение", f"Пользователь {user_id} не найден")
+            self.staff_changed()
+            return
+        first_name, last_name, position, department, email = original
         dialog = QDialog(self)
         dialog.setWindowTitle("Редактировать пользователя")
         layout = QVBoxLayout(dialog)
-        first_name = QLineEdit(user.first_name)
-        last_name = QLineEdit(user.last_name)
-        position = QLineEdit(user.position or "")
-        department = QLineEdit(user.department or "")
-        email = QLineEdit(user.email)
+        first_name = QLineEdit(first_name)
+        last_name = QLineEdit(last_name)
+        position = QLineEdit(position or "")
+        department = QLineEdit(department or "")
+        email = QLineEdit(email)
         layout.addWidget(QLineEdit(f"ID: {user_id}", readOnly=True))
         layout.addWidget(first_name)
         layout.addWidget(last_name)
@@ -431,117 +904,225 @@ class AdminPanel(QMainWindow):
         layout.addWidget(email)
         save_btn = QPushButton("Сохранить")
         save_btn.clicked.connect(
-            lambda: self.save_user(user_id, first_name.text(), last_name.text(), position.text(), department.text(), email.text(), dialog))
+            lambda: self.save_user(user_id, first_name.text(), last_name.text(), position.text(), department.text(), email.text(), dialog, version))
         layout.addWidget(save_btn)
         dialog.setStyleSheet("QWidget { padding: 10px; }")
         dialog.exec()
 
-    def save_user(self, user_id, first_name, last_name, position, department, email, dialog):
+    def save_user(self, user_id, first_name, last_name, position, department, email, dialog, version=None):
         logger.info(f"Сохранение пользователя {user_id}")
         try:
-            user = self.session.query(User).filter_by(user_id=user_id).first()
-            user.first_name = first_name
-            user.last_name = last_name
-            user.position = position or None
-            user.department = department or None
-            user.email = email
-            self.log_action(user_id, f"Редактирование данных пользователя администратором")
-            self.session.commit()
+            try:
+                with db_session() as session:
+                    user = session.get(User, user_id)
+                    # Данные могли измениться в основной БД, пока был открыт диалог
+                    conflict = user is None or (version is not None and user.version != version)
+                    if not conflict:
+                        user.first_name = first_name
+                        user.last_name = last_name
+                        user.position = position or None
+                        user.department = department or None
+                        user.email = email
+                        self.log_action(user_id, f"Редактирование данных пользователя администратором", session)
+            except StaleDataError:
+                # Другой администратор сохранил карточку между чтением и записью
+                conflict = True
+            if conflict:
+                logger.warning(f"Конфликт при сохранении пользователя {user_id}: данные изменены другим пользователем")
+                QMessageBox.warning(self, "Конфликт", "Данные пользователя изменились или он удален. Откройте карточку заново.")
             dialog.close()
+            self.staff_changed()
             self.show_users(self.current_page)
         except Exception as e:
-            self.session.rollback()
             logger.error(f"Ошибка при сохранении пользователя: {e}")
             QMessageBox.critical(self, "Ошибка", "Не удалось сохранить пользователя")
 
+    def import_users(self):
+        filename, _ = QFileDialog.getOpenFileName(self, "Импорт пользователей", "", "Таблицы (*.csv *.xlsx)")
+        if not filename:
+            return
+        logger.info(f"Импорт пользователей из {filename}")
+        try:
+            report = bulk_users.import_users(engine, User.__table__, filename, versions=data_versions)
+        except Exception as e:
+            logger.error(f"Ошибка при импорте пользователей: {e}", exc_info=True)
+            QMessageBox.critical(self, "Ошибка", f"Не удалось импортировать пользователей: {str(e)}")
+            return
+        self.log_action(None, f"{report.summary()} (файл {os.path.basename(filename)})")
+        text = report.summary()
+        if report.errors:
+            errors_file = f"{os.path.splitext(filename)[0]}_errors.csv"
+            report.write_errors(errors_file)
+            shown = "\n".join(f"Строка {row_no}: {message}" for row_no, message in sorted(report.errors)[:20])
+            text += f"\n\n{shown}\n\nПолный список ошибок: {errors_file}"
+        self.staff_changed()
+        self.show_users(1)
+        QMessageBox.information(self, "Импорт", text)
+
+    def export_users(self):
+        filename, _ = QFileDialog.getSaveFileName(self, "Экспорт пользователей", "users.csv", "CSV (*.csv);;Excel (*.xlsx)")
+        if not filename:
+            return
+        logger.info(f"Экспорт пользователей в {filename}")
+        try:
+            count = bulk_users.export_users(engine, User.__table__, filename)
+            QMessageBox.information(self, "Экспорт", f"Выгружено пользователей: {count}\n{filename}")
+        except Exception as e:
+            logger.error(f"Ошибка при экспорте пользователей: {e}", exc_info=True)
+            QMessageBox.critical(self, "Ошибка", f"Не удалось выгрузить пользователей: {str(e)}")
+
     def delete_user(self, user_id):
         logger.info(f"Удаление пользователя {user_id}")
         reply = QMessageBox.question(self, "Подтверждение", f"Удалить пользователя {user_id}?",
                                      QMessageBox.Yes | QMessageBox.No)
         if reply == QMessageBox.Yes:
-            session = SessionFactory()
-            try:
-                # Удаляем все связанные заявки пользователя
-                session.query(Application).filter_by(user_id=user_id).delete()
-
-                # Удаляем все логи пользователя
-                session.query(Log).filter_by(user_id=user_id).delete()
-
-                # Удаляем самого пользователя
-                user = session.query(User).filter_by(user_id=user_id).first()
-                if user:
-                    session.delete(user)
-                    self.log_action(user_id, "Удаление пользователя администратором")
-                    session.commit()
-                    QMessageBox.information(self, "Успех", f"Пользователь {user_id} удален")
-                else:
-                    QMessageBox.warning(self, "Предупреждение", f"Пользователь с ID {user_id} не найден")
-
-                self.show_users(self.current_page)
-            except Exception as e:
-                session.rollback()
-                logger.error(f"Ошибка при удалении пользователя: {e}")
-                QMessageBox.critical(self, "Ошибка", f"Не удалось удалить пользователя: {str(e)}")
-            finally:
-                session.close()
+            self.offboard([user_id])
 
-    def approve_application(self, app_id):
+    def bulk_delete_users(self):
+        text, ok = QInputDialog.getMultiLineText(self, "Массовое удаление", "ID сотрудников (через пробел, запятую или с новой строки):")
+        if not ok:
+            return
+        try:
+            user_ids = {int(part) for part in re.split(r"[\s,;]+", text) if part}
+        except ValueError:
+            QMessageBox.warning(self, "Предупреждение", "ID сотрудников должны быть числами")
+            return
+        if not user_ids:
+            return
+        reply = QMessageBox.question(self, "Подтверждение", f"Удалить пользователей: {len(user_ids)}?",
+                                     QMessageBox.Yes | QMessageBox.No)
+        if reply == QMessageBox.Yes:
+            self.offboard(user_ids)
+
+    def offboard(self, user_ids):
+        try:
+            found, archive_path = offboard_users(user_ids, CONFIG["ADMIN_ID"])
+            missing = sorted(set(user_ids) - set(found))
+            if found:
+                text = f"Удалено пользователей: {len(found)}\nАрхив: {archive_path}"
+                if missing:
+                    text += f"\nНе найдены: {', '.join(map(str, missing))}"
+                QMessageBox.information(self, "Успех", text)
+            else:
+                QMessageBox.warning(self, "Предупреждение", f"Пользователи не найдены: {', '.join(map(str, missing))}")
+            self.staff_changed()
+            self.show_users(self.current_page)
+        except Exception as e:
+            logger.error(f"Ошибка при удалении пользователей: {e}")
+            QMessageBox.critical(self, "Ошибка", f"Не удалось удалить пользователей: {str(e)}")
+
+    # Решение по заявке в одной транзакции. None - заявки нет или она уже рассмотрена;
+    # CONFLICT - заявку изменили после показа карточки или параллельно с этим решением
+    def decide_application(self, app_id, version, status, apply_balance, action):
+        try:
+            with db_session() as session:
+                app = session.get(Application, app_id)
+                if not app or app.status != ApplicationStatus.PENDING:
+                    return None
+                if version is not None and app.version != version:
+                    return CONFLICT
+                app.status = status
+                apply_balance(session, app)
+                self.log_action(app.user_id, f"{action} заявки #{app_id} администратором", session)
+                user = session.get(User, app.user_id)
+                return (user.department if user else None, app.start_date, app.end_date)
+        except StaleDataError:
+            return CONFLICT
+
+    def decision_conflict(self, app_id):
+        logger.warning(f"Конфликт версий заявки #{app_id}: заявка изменена другим пользователем")
+        QMessageBox.warning(self, "Конфликт",
+                            f"Заявка #{app_id} изменилась после открытия списка. Проверьте данные и примите решение заново.")
+        self.data_changed()
+        self.show_applications(self.current_page)
+
+    def approve_application(self, app_id, version=None):
         logger.info(f"Одобрение заявки #{app_id}")
         try:
-            app = self.session.query(Application).filter_by(application_id=app_id).first()
-            if app and app.status == ApplicationStatus.PENDING:
-                app.status = ApplicationStatus.APPROVED
-                self.log_action(app.user_id, f"Одобрение заявки #{app_id} администратором")
-                self.session.commit()
+            decided = self.decide_application(
+                app_id, version, ApplicationStatus.APPROVED,
+                lambda session, app: leave_balance.approve(
+                    session, leave_balances, app.user_id, app.type, app.start_date, app.end_date),
+                "Одобрение")
+            if decided is CONFLICT:
+                self.decision_conflict(app_id)
+                return
+            if decided:
+                self.calendar_decided(*decided, approved=True)
                 notify_user(app_id, ApplicationStatus.APPROVED)
                 QMessageBox.information(self, "Успех", f"Заявка #{app_id} одобрена")
             else:
                 logger.warning(f"Заявка #{app_id} не найдена или не в статусе PENDING")
                 QMessageBox.warning(self, "Предупреждение", f"Заявка #{app_id} не может быть одобрена")
+            self.data_changed()
             self.show_applications(self.current_page)
         except Exception as e:
-            self.session.rollback()
             logger.error(f"Ошибка при одобрении заявки #{app_id}: {e}")
             QMessageBox.critical(self, "Ошибка", f"Не удалось одобрить заявку: {str(e)}")
 
-    def reject_application(self, app_id):
+    def reject_application(self, app_id, version=None):
         logger.info(f"Отклонение заявки #{app_id}")
+        # Причина спрашивается до обращения к БД, чтобы не держать транзакцию открытой на время диалога
+        reason, ok = QInputDialog.getText(self, "Причина отклонения", "Введите причину:")
+        if not ok:
+            logger.info(f"Отклонение заявки #{app_id} отменено")
+            return
+        def release(session, app):
+            app.reason = f"{app.reason or ''} [Отклонено: {reason}]"
+            leave_balance.release(session, leave_balances, app.user_id, app.type, app.start_date, app.end_date)
+
         try:
-            app = self.session.query(Application).filter_by(application_id=app_id).first()
-            if app and app.status == ApplicationStatus.PENDING:
-                reason, ok = QInputDialog.getText(self, "Причина отклонения", "Введите причину:")
-                if ok:
-                    app.status = ApplicationStatus.REJECTED
-                    app.reason = f"{app.reason or ''} [Отклонено: {reason}]"
-                    self.log_action(app.user_id, f"Отклонение заявки #{app_id} администратором")
-                    self.session.commit()
-                    notify_user(app_id, ApplicationStatus.REJECTED)
-                    QMessageBox.information(self, "Успех", f"Заявка #{app_id} отклонена")
-                else:
-                    logger.info(f"Отклонение заявки #{app_id} отменено")
-                    return
+            decided = self.decide_application(app_id, version, ApplicationStatus.REJECTED, release, "Отклонение")
+            if decided is CONFLICT:
+                self.decision_conflict(app_id)
+                return
+            if decided:
+                self.calendar_decided(*decided, approved=False)
+                notify_user(app_id, ApplicationStatus.REJECTED)
+                QMessageBox.information(self, "Успех", f"Заявка #{app_id} отклонена")
             else:
                 logger.warning(f"Заявка #{app_id} не найдена или не в статусе PENDING")
                 QMessageBox.warning(self, "Предупреждение", f"Заявка #{app_id} не может быть отклонена")
+            self.data_changed()
             self.show_applications(self.current_page)
         except Exception as e:
-            self.session.rollback()
             logger.error(f"Ошибка при отклонении заявки #{app_id}: {e}")
             QMessageBox.critical(self, "Ошибка", f"Не удалось отклонить заявку: {str(e)}")
 
-    def report_applications_period(self):
-        logger.info("Генерация отчета: Заявки за период")
+    @metrics.timed
+    def reconcile_balances(self):
+        logger.info("Сверка остатков отпусков")
+        try:
+            with engine.begin() as conn:
+                discrepancies = leave_balance.rebuild(conn, leave_balances, all_applications,
+                                                      ApplicationStatus.PENDING, ApplicationStatus.APPROVED)
+        except Exception as e:
+            logger.error(f"Ошибка при сверке остатков: {e}", exc_info=True)
+            QMessageBox.critical(self, "Ошибка", f"Не удалось выполнить сверку: {str(e)}")
+            return
+        self.log_action(None, f"Сверка остатков отпусков: исправлено строк {len(discrepancies)}")
+        text = f"Исправлено строк: {len(discrepancies)}"
+        if discrepancies:
+            shown = "\n".join(
+                f"{user_id}, {year}, {leave_type}: ожидание/использовано {was[0]}/{was[1]} → {now[0]}/{now[1]}"
+                for (user_id, year, leave_type), was, now in discrepancies[:20]
+            )
+            text += f"\n\n{shown}"
+        QMessageBox.information(self, "Сверка остатков", text)
+
+    # (начало, конец) или None, если выбор отменен
+    def ask_period(self, start=None, end=None):
         dialog = QDialog(self)
         dialog.setWindowTitle("Выберите период")
         layout = QVBoxLayout(dialog)
 
-        start_date_edit = QDateEdit(QDate.currentDate())
+        start_date_edit = QDateEdit(start or QDate.currentDate())
         start_date_edit.setCalendarPopup(True)
         start_date_edit.setDisplayFormat("yyyy-MM-dd")
         layout.addWidget(QLabel("Начало периода:"))
         layout.addWidget(start_date_edit)
 
-        end_date_edit = QDateEdit(QDate.currentDate())
+        end_date_edit = QDateEdit(end or QDate.currentDate())
         end_date_edit.setCalendarPopup(True)
         end_date_edit.setDisplayFormat("yyyy-MM-dd")
         layout.addWidget(QLabel("Конец периода:"))
@@ -556,114 +1137,186 @@ class AdminPanel(QMainWindow):
         button_box.addWidget(cancel_btn)
         layout.addLayout(button_box)
 
-        if dialog.exec():
-            start_date = start_date_edit.date().toPython()
-            end_date = end_date_edit.date().toPython()
-            apps = self.session.query(Application).filter(
-                Application.start_date >= start_date,
-                Application.end_date <= end_date
-            ).all()
-            if not apps:
-                logger.info("Заявки за выбранный период не найдены")
-                QMessageBox.information(self, "Информация", "Заявки за выбранный период отсутствуют")
-                return
-            self.generate_pdf_report("Заявки за период",
-                                     [f"#{a.application_id} - {a.type}, {a.start_date} - {a.end_date}, {a.status}" for a in apps])
-        else:
+        if not dialog.exec():
             logger.info("Выбор периода отменен")
+            return None
+        return start_date_edit.date().toPython(), end_date_edit.date().toPython()
 
+    @metrics.timed
+    def report_applications_period(self):
+        logger.info("Генерация отчета: Заявки за период")
+        period = self.ask_period()
+        if period:
+            start_date, end_date = period
+            self.run_report(
+                ("applications_period", start_date, end_date),
+                lambda conn: reports.applications_period(conn, User.__table__, all_applications, start_date, end_date),
+                empty_message="Заявки за выбранный период отсутствуют"
+            )
+
+    @metrics.timed
     def report_duration_departments(self):
         logger.info("Генерация отчета: Длительность по отделам")
         year, ok = QInputDialog.getInt(self, "Год", "Введите год (ГГГГ):")
         if ok:
-            start_date = datetime(year, 1, 1)
-            end_date = datetime(year, 12, 31)
-            apps = self.session.query(Application).filter(
-                Application.start_date >= start_date.date(),
-                Application.end_date <= end_date.date()
-            ).all()
-            dept_duration = {}
-            for app in apps:
-                user = self.session.query(User).filter_by(user_id=app.user_id).first()
-                dept = user.department or "Без отдела"
-                days = (app.end_date - app.start_date).days + 1
-                dept_duration[dept] = dept_duration.get(dept, 0) + days
-            self.generate_pdf_report("Длительность по отделам",
-                                     [f"{dept}: {days} дней" for dept, days in dept_duration.items()])
+            self.run_report(
+                ("duration_departments", year),
+                lambda conn: reports.duration_departments(conn, User.__table__, all_applications, year)
+            )
         else:
             logger.info("Ввод года отменен")
 
+    # PDF по каждому отделу за период строятся параллельно в пуле процессов,
+    # окно остается отзывчивым, прогресс и отмена - в диалоге
+    @metrics.timed
+    def report_departments_batch(self):
+        logger.info("Генерация пакета отчетов по отделам")
+        if self.batch is not None:
+            QMessageBox.information(self, "Информация", "Пакет отчетов по отделам уже строится")
+            return
+        year = QDate.currentDate().year()
+        period = self.ask_period(QDate(year, 1, 1), QDate(year, 12, 31))
+        if not period:
+            return
+        start_date, end_date = period
+        import batch_reports
+        try:
+            with engine.connect() as conn:
+                documents = batch_reports.department_documents(conn, User.__table__, all_applications, start_date, end_date)
+        except Exception as e:
+            logger.error(f"Ошибка при выборке данных для отчетов по отделам: {e}", exc_info=True)
+            QMessageBox.critical(self, "Ошибка", f"Не удалось получить данные: {str(e)}")
+            return
+        if not documents:
+            QMessageBox.information(self, "Информация", "Заявки за выбранный период отсутствуют")
+            return
+        target, selected = QFileDialog.getSaveFileName(
+            self, "Сохранить отчеты по отделам", f"Отчеты_по_отделам_{start_date}_{end_date}.zip",
+            "Архив ZIP (*.zip);;Каталог (*)")
+        if not target:
+            return
+        if selected.startswith("Архив") and not target.lower().endswith(".zip"):
+            target += ".zip"
+        try:
+            self.batch = batch_reports.Batch(documents, target, CONFIG["BATCH_REPORT_WORKERS"])
+        except Exception as e:
+            logger.error(f"Ошибка при подготовке {target}: {e}", exc_info=True)
+            QMessageBox.critical(self, "Ошибка", f"Не удалось создать {target}:\n{e}")
+            return
+        self.batch_progress = QProgressDialog(
+            f"Построение отчетов по отделам ({self.batch.description})", "Отмена", 0, self.batch.total, self)
+        self.batch_progress.setWindowTitle("Отчеты по отделам")
+        self.batch_progress.setWindowModality(Qt.WindowModal)
+        self.batch_progress.setMinimumDuration(0)
+        self.batch_progress.canceled.connect(self.cancel_batch)
+        self.batch_progress.setValue(0)
+        for future, (department, _, _) in zip(self.batch.start(), documents):
+            future.add_done_callback(lambda f, d=department: self.batch_document_done(f, d))
+
+    # Вызывается в служебном потоке пула: только передача результата в поток GUI
+    def batch_document_done(self, future, department):
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is None:
+            self.batch_signals.done.emit(future.result())
+        else:
+            self.batch_signals.failed.emit((department, error))
+
+    def on_batch_document(self, result):
+        if self.batch is None:
+            return
+        try:
+            self.batch.add(result)
+        except Exception as e:
+            self.batch.add_error(result[0], e)
+        self.batch_progressed()
+
+    def on_batch_error(self, failure):
+        if self.batch is None:
+            return
+        self.batch.add_error(*failure)
+        self.batch_progressed()
+
+    def batch_progressed(self):
+        batch, progress = self.batch, self.batch_progress
+        if batch.done < batch.total:
+            progress.setValue(batch.done)
+            return
+        # Модальный диалог обрабатывает события внутри setValue, поэтому пакет снимается до закрытия
+        self.batch, self.batch_progress = None, None
+        progress.setValue(batch.done)
+        progress.deleteLater()
+        try:
+            batch.finish()
+        except Exception as e:
+            logger.error(f"Ошибка сохранения {batch.output.target}: {e}", exc_info=True)
+            QMessageBox.critical(self, "Ошибка сохранения", f"Не удалось сохранить отчеты:\n{e}")
+            return
+        self.log_action(None, f"Пакет отчетов по отделам: {len(batch.output.files)} PDF")
+        text = f"Отчетов по отделам: {len(batch.output.files)}\n{batch.output.target}"
+        if batch.failed:
+            shown = "\n".join(f"{department}: {error}" for department, error in batch.failed[:20])
+            text += f"\n\nНе построены:\n{shown}"
+            QMessageBox.warning(self, "Отчеты по отделам", text)
+        else:
+            QMessageBox.information(self, "Отчеты по отделам", text)
+
+    def cancel_batch(self):
+        if self.batch is None:
+            return
+        self.batch_progress.deleteLater()
+        batch, self.batch, self.batch_progress = self.batch, None, None
+        batch.cancel()
+
+    @metrics.timed
     def report_employee_applications(self):
         logger.info("Генерация отчета: Заявки сотрудника")
         user_id, ok = QInputDialog.getInt(self, "ID сотрудника", "Введите ID сотрудника:")
         if ok:
-            user = self.session.query(User).filter_by(user_id=user_id).first()
-            if not user:
-                logger.warning(f"Пользователь с ID {user_id} не найден")
-                QMessageBox.warning(self, "Предупреждение", f"Пользователь с ID {user_id} не найден")
-                return
-            apps = self.session.query(Application).filter_by(user_id=user_id).all()
-            if not apps:
-                logger.info(f"Заявки для пользователя {user_id} не найдены")
-                QMessageBox.information(self, "Информация", f"Заявки для {user.first_name} {user.last_name} отсутствуют")
-                return
-            title = f"Заявки сотрудника {user.first_name} {user.last_name}"
-            self.generate_pdf_report(title,
-                                     [f"#{a.application_id} - {a.type}, {a.start_date} - {a.end_date}, {a.status}" for a in apps])
+            self.run_report(
+                ("employee_applications", user_id),
+                lambda conn: reports.employee_applications(conn, User.__table__, all_applications, user_id),
+                missing_message=f"Пользователь с ID {user_id} не найден",
+                empty_message="{title} отсутствуют"
+            )
         else:
             logger.info("Ввод ID сотрудника отменен")
 
-    def generate_pdf_report(self, title, content_lines):
+    # Результат запроса берется из кэша, если с прошлого запуска не менялись заявки и пользователи.
+    # Версии читаются до запроса: при параллельной записи результат окажется новее версий,
+    # и следующий запуск просто пересчитает отчет
+    def run_report(self, key, query, empty_message=None, missing_message=None):
+        # NumPy для подсчета рабочих дней загружается при первом отчете, а не при старте панели
+        import workdays
+        with engine.connect() as conn:
+            # Правка производственного календаря меняет длительности так же, как правка заявок
+            versions = data_version.current(conn, data_versions) + (workdays.calendar().digest,)
+            result = self.report_cache.get(key, versions)
+            if result is None:
+                result = query(conn)
+                self.report_cache.put(key, versions, result)
+            else:
+                logger.info(f"Отчет {key} взят из кэша")
+        if result is None:
+            logger.warning(missing_message)
+            QMessageBox.warning(self, "Предупреждение", missing_message)
+            return
+        title, lines = result
+        if not lines and empty_message:
+            logger.info(f"Отчет {key} пуст")
+            QMessageBox.information(self, "Информация", empty_message.format(title=title))
+            return
+        self.generate_pdf_report(title, lines, (key, versions))
+
+    def generate_pdf_report(self, title, content_lines, cache_key=None):
         logger.info(f"Генерация PDF отчета: {title}")
         try:
-            from reportlab.lib.pagesizes import A4
-            from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-            from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-            from reportlab.pdfbase import pdfmetrics
-            from reportlab.pdfbase.ttfonts import TTFont
-            import os
-
-            # 1. Настройка шрифтов
+            # 1. Построение PDF или готовый файл из кэша
             try:
-                # Проверяем наличие шрифта в разных местах
-                font_paths = [
-                    "DejaVuSans.ttf",  # Текущая директория
-                    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",  # Linux
-                    "C:/Windows/Fonts/DejaVuSans.ttf"  # Windows
-                ]
-
-                found_font = None
-                for path in font_paths:
-                    if os.path.exists(path):
-                        found_font = path
-                        break
-
-                if not found_font:
-                    raise FileNotFoundError("Шрифт DejaVuSans.ttf не найден")
-
-                # Регистрируем шрифты
-                pdfmetrics.registerFont(TTFont('DejaVuSans', found_font))
-                pdfmetrics.registerFont(TTFont('DejaVuSans-Bold', found_font))  # Используем тот же файл для bold
-
-                # Создаем кастомные стили
-                styles = getSampleStyleSheet()
-                styles.add(ParagraphStyle(
-                    name='DejaVuNormal',
-                    fontName='DejaVuSans',
-                    fontSize=10,
-                    leading=12,
-                    encoding='UTF-8'
-                ))
-                styles.add(ParagraphStyle(
-                    name='DejaVuTitle',
-                    fontName='DejaVuSans-Bold',
-                    fontSize=14,
-                    leading=16,
-                    spaceAfter=12,
-                    encoding='UTF-8'
-                ))
-
-            except Exception as font_error:
+                render = lambda: reports.render_pdf(title, content_lines)
+                pdf = self.pdf_cache.get_or_render(*cache_key, render) if cache_key else render()
+            except FileNotFoundError as font_error:
                 logger.error(f"Ошибка шрифтов: {font_error}", exc_info=True)
                 QMessageBox.critical(
                     self,
@@ -671,6 +1324,14 @@ class AdminPanel(QMainWindow):
                     "Не удалось загрузить шрифты. Убедитесь, что файл DejaVuSans.ttf доступен."
                 )
                 return
+            except Exception as build_error:
+                logger.error(f"Ошибка построения PDF: {build_error}", exc_info=True)
+                QMessageBox.critical(
+                    self,
+                    "Ошибка генерации",
+                    f"Не удалось сгенерировать PDF:\n{build_error}"
+                )
+                return
 
             # 2. Запрос места сохранения
             filename, _ = QFileDialog.getSaveFileName(
@@ -686,41 +1347,10 @@ class AdminPanel(QMainWindow):
             if not filename.lower().endswith('.pdf'):
                 filename += '.pdf'
 
-            # 3. Генерация PDF
-            buffer = io.BytesIO()
-            doc = SimpleDocTemplate(
-                buffer,
-                pagesize=A4,
-                encoding='UTF-8'
-            )
-
-            story = []
-
-            # Добавляем заголовок
-            story.append(Paragraph(title, styles['DejaVuTitle']))
-            story.append(Spacer(1, 12))
-
-            # Добавляем содержимое
-            for line in content_lines:
-                if line:  # Пропускаем пустые строки
-                    story.append(Paragraph(str(line), styles['DejaVuNormal']))
-                    story.append(Spacer(1, 6))
-
-            try:
-                doc.build(story)
-            except Exception as build_error:
-                logger.error(f"Ошибка построения PDF: {build_error}", exc_info=True)
-                QMessageBox.critical(
-                    self,
-                    "Ошибка генерации",
-                    f"Не удалось сгенерировать PDF:\n{build_error}"
-                )
-                return
-
-            # 4. Сохранение файла
+            # 3. Сохранение файла
             try:
                 with open(filename, 'wb') as f:
-                    f.write(buffer.getvalue())
+                    f.write(pdf)
 
                 logger.info(f"Отчет успешно сохранен: {filename}")
                 QMessageBox.information(
@@ -744,14 +1374,63 @@ class AdminPanel(QMainWindow):
                 f"Произошла непредвиденная ошибка:\n{e}"
             )
 
+    # Повторное нажатие во время съемки останавливает ее досрочно
+    def toggle_profiling(self):
+        if self.profiler.running:
+            self.stop_profiling()
+            return
+        mode, ok = QInputDialog.getItem(self, "Профилирование", "Режим:", list(PROFILE_MODES), 0, False)
+        if not ok:
+            return
+        seconds, ok = QInputDialog.getInt(self, "Профилирование", "Длительность, с:", 30, 1, 3600)
+        if not ok:
+            return
+        try:
+            # Поток GUI профилируется целиком: медленная панель - это чаще всего он
+            self.profiler.start(PROFILE_MODES[mode], thread_wide=True)
+        except Exception as e:
+            logger.error(f"Ошибка запуска профилирования: {e}", exc_info=True)
+            QMessageBox.critical(self, "Ошибка", f"Не удалось запустить профилирование: {str(e)}")
+            return
+        self.profile_timer.start(seconds * 1000)
+        self.setWindowTitle(f"Панель администратора CRM — профилирование ({seconds} с)")
+
+    def stop_profiling(self, show=True):
+        self.profile_timer.stop()
+        self.setWindowTitle("Панель администратора CRM")
+        try:
+            result = self.profiler.stop()
+        except Exception as e:
+            logger.error(f"Ошибка сохранения профиля: {e}", exc_info=True)
+            QMessageBox.critical(self, "Ошибка", f"Не удалось сохранить профиль: {str(e)}")
+            return
+        if result is None or not show:
+            return
+        path, summary = result
+        dialog = QMessageBox(self)
+        dialog.setWindowTitle("Профилирование")
+        dialog.setText(f"Профиль сохранен:\n{os.path.abspath(path)}" if path else "За время съемки профилируемых вызовов не было")
+        dialog.setDetailedText(summary)
+        dialog.exec()
+
     def closeEvent(self, event):
         logger.info("Закрытие админ-панели")
-        self.session.close()
-        engine.dispose()
+        self.views.shutdown()
+        self.cancel_batch()
+        # Незавершенная съемка сохраняется в файл без диалога
+        self.stop_profiling(show=False)
+        if self.snapshot:
+            self.snapshot.stop()
+        if engine:
+            engine.dispose()
         event.accept()
 
 if __name__ == "__main__":
+    log_pipeline.setup_logging('admin_panel.log', max_bytes=10*1024*1024, backup_count=5, sampling=CONFIG["LOG_SAMPLING"])
+    metrics_dump = metrics.start_dump(CONFIG["METRICS_FILE"], CONFIG["METRICS_DUMP_INTERVAL"]) if CONFIG["METRICS_FILE"] else None
     app = QApplication([])
     window = AdminPanel()
     window.show()
-    app.exec()
\ No newline at end of file
+    app.exec()
+    if metrics_dump:
+        metrics_dump.set()
@@ -0,0 +1,276 @@
+from PySide6.QtWidgets import QWidget, QHBoxLayout, QPushButton, QLabel, QToolTip, QSizePolicy
+from PySide6.QtGui import QPainter, QColor
+from PySide6.QtCore import Qt, QRectF
+from datetime import date, timedelta
+import re
+
+# Слой отрисовки админ-панели: стили компилируются в одну таблицу стилей приложения,
+# а карточки списков переиспользуются на своих местах в макете вместо пересоздания на каждой странице
+
+# Централизованные стили
+STYLES = {
+    "nav_button": """
+        QPushButton {
+            padding: 8px;
+            font-size: 12px;
+            background-color: #f0f0f0;
+            border: 1px solid #ccc;
+            border-radius: 4px;
+        }
+        QPushButton:hover {
+            background-color: #e0e0e0;
+        }
+        QPushButton:pressed {
+            background-color: #d0d0d0;
+        }
+    """,
+    "card": """
+        QWidget {
+            padding: 2px;
+            border-bottom: 1px solid #ddd;
+            background-color: #fafafa;
+            margin: 0px;
+        }
+    """,
+    "label": """
+        QLabel {
+            padding: 0px;
+            margin: 0px;
+        }
+    """,
+    "approve_button": """
+        QPushButton {
+            background-color: #4CAF50;
+            color: white;
+            border-radius: 4px;
+        }
+        QPushButton:hover {
+            background-color: #45a049;
+        }
+    """,
+    "reject_button": """
+        QPushButton {
+            background-color: #f44336;
+            color: white;
+            border-radius: 4px;
+        }
+        QPushButton:hover {
+            background-color: #da190b;
+        }
+    """,
+    "action_button": """
+        QPushButton {
+            padding: 8px;
+            font-size: 12px;
+            margin: 0px;
+        }
+    """
+}
+
+
+# Селекторы каждого стиля привязываются к динамическому свойству styleClass,
+# поэтому Qt разбирает CSS один раз при установке на QApplication
+def compile_stylesheet(styles):
+    rules = []
+    for key, css in styles.items():
+        rules.append(re.sub(
+            r"(Q\w+)((?::\w+)?)\s*\{",
+            lambda m, key=key: f'{m.group(1)}[styleClass="{key}"]{m.group(2)} {{',
+            css
+        ))
+    return "\n".join(rules)
+
+COMPILED_STYLESHEET = compile_stylesheet(STYLES)
+
+def apply_style(widget, style_key):
+    widget.setProperty("styleClass", style_key)
+
+def styled_label(text=""):
+    label = QLabel(text)
+    apply_style(label, "label")
+    return label
+
+# Пул виджетов макета: карточки не вынимаются из макета между страницами, а остаются на своих
+# местах скрытыми, и следующая страница заново привязывает их по порядку (только setText).
+# Вынутый и снова добавленный виджет Qt заново полирует и раскладывает, это дороже создания нового
+class WidgetPool:
+    def __init__(self, layout):
+        self.layout = layout
+        self.factories = {}
+        self.position = 0
+
+    def register(self, kind, factory):
+        self.factories[kind] = factory
+
+    # Начало страницы: виджеты пула скрываются на месте, остальные удаляются
+    def reset(self):
+        index = 0
+        while index < self.layout.count():
+            widget = self.layout.itemAt(index).widget()
+            if getattr(widget, "pool_kind", None):
+                widget.hide()
+                index += 1
+                continue
+            self.layout.takeAt(index)
+            if widget is not None:
+                widget.deleteLater()
+        self.position = 0
+
+    def acquire(self, kind):
+        while self.position < self.layout.count():
+            widget = self.layout.itemAt(self.position).widget()
+            if widget.pool_kind == kind:
+                break
+            # На этом месте виджет другого вида: страница другого раздела, он больше не нужен
+            self.layout.takeAt(self.position)
+            widget.deleteLater()
+        else:
+            widget = self.factories[kind]()
+            widget.pool_kind = kind
+            self.layout.addWidget(widget)
+        self.position += 1
+        widget.show()
+        return widget
+
+    # Виджет вне пула встает на текущее место страницы и удаляется при следующем reset
+    def insert(self, widget):
+        self.layout.insertWidget(self.position, widget)
+        self.position += 1
+
+# Карточка пользователя: сигналы подключаются один раз, ID берется из текущей привязки
+class UserCard(QWidget):
+    def __init__(self, on_edit, on_delete):
+        super().__init__()
+        self.user_id = None
+        layout = QHBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        self.info = QLabel()
+        edit_btn = QPushButton("✏️ Редактировать")
+        delete_btn = QPushButton("🗑️ Удалить")
+        edit_btn.clicked.connect(lambda: on_edit(self.user_id))
+        delete_btn.clicked.connect(lambda: on_delete(self.user_id))
+        layout.addWidget(self.info)
+        layout.addStretch()
+        layout.addWidget(edit_btn)
+        layout.addWidget(delete_btn)
+        apply_style(self, "card")
+
+    def bind(self, user_id, text):
+        self.user_id = user_id
+        self.info.setText(text)
+
+# Карточка заявки: кнопки решения скрываются для истории, полные данные - по кнопке просмотра
+class ApplicationCard(QWidget):
+    def __init__(self, on_approve, on_reject, on_details=None):
+        super().__init__()
+        self.app_id = None
+        self.version = None
+        layout = QHBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        self.label = QLabel()
+        self.label.setWordWrap(True)
+        self.approve_btn = QPushButton("✅")
+        self.reject_btn = QPushButton("❌")
+        self.approve_btn.setFixedSize(40, 40)
+        self.reject_btn.setFixedSize(40, 40)
+        apply_style(self.approve_btn, "approve_button")
+        apply_style(self.reject_btn, "reject_button")
+        # Решение принимается по той версии заявки, которую видел администратор
+        self.approve_btn.clicked.connect(lambda: on_approve(self.app_id, self.version))
+        self.reject_btn.clicked.connect(lambda: on_reject(self.app_id, self.version))
+        layout.addWidget(self.label)
+        layout.addStretch()
+        if on_details:
+            details_btn = QPushButton("🔍")
+            details_btn.setFixedSize(40, 40)
+            details_btn.setToolTip("Подробнее")
+            details_btn.clicked.connect(lambda: on_details(self.app_id))
+            layout.addWidget(details_btn)
+        layout.addWidget(self.approve_btn)
+        layout.addWidget(self.reject_btn)
+        apply_style(self, "card")
+
+    def bind(self, app_id, text, history=False, version=None):
+        self.app_id = app_id
+        self.version = version
+        self.label.setText(text)
+        self.approve_btn.setVisible(not history)
+        self.reject_btn.setVisible(not history)
+
+MONTHS = ["Янв", "Фев", "Мар", "Апр", "Май", "Июн", "Июл", "Авг", "Сен", "Окт", "Ноя", "Дек"]
+
+# Тепловая карта отсутствий: месяцы по строкам, дни по столбцам.
+# Насыщенность - доля отсутствующих от пика года, в ячейке - число отсутствующих
+class AbsenceHeatmap(QWidget):
+    def __init__(self):
+        super().__init__()
+        self.year = None
+        self.approved = []
+        self.pending = []
+        self.headcount = 0
+        self.peak = 1
+        self.setMouseTracking(True)
+        self.setMinimumHeight(12 * 22 + 4)
+        self.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Fixed)
+
+    def set_data(self, year, approved, pending, headcount):
+        self.year = year
+        self.approved = approved
+        self.pending = pending
+        self.headcount = headcount
+        self.peak = max(1, int((approved + pending).max())) if len(approved) else 1
+        self.update()
+
+    def geometry_cells(self):
+        label_width = 36
+        cell_width = max(8, (self.width() - label_width) / 31)
+        cell_height = (self.height() - 4) / 12
+        return label_width, cell_width, cell_height
+
+    def day_at(self, x, y):
+        label_width, cell_width, cell_height = self.geometry_cells()
+        month, day = int(y // cell_height) + 1, int((x - label_width) // cell_width) + 1
+        if self.year is None or x < label_width or not 1 <= month <= 12:
+            return None
+        try:
+            return date(self.year, month, day)
+        except ValueError:
+            return None
+
+    def paintEvent(self, event):
+        if self.year is None:
+            return
+        painter = QPainter(self)
+        label_width, cell_width, cell_height = self.geometry_cells()
+        jan1 = date(self.year, 1, 1)
+        day = jan1
+        while day.year == self.year:
+            index = (day - jan1).days
+            approved, pending = int(self.approved[index]), int(self.pending[index])
+            total = approved + pending
+            rect = QRectF(label_width + (day.day - 1) * cell_width, (day.month - 1) * cell_height,
+                          cell_width - 1, cell_height - 1)
+            share = total / self.peak
+            color = QColor(244, 67, 54) if approved else QColor(255, 152, 0)
+            color.setAlpha(int(40 + 215 * share) if total else 0)
+            painter.fillRect(rect, color if total else QColor("#f5f5f5"))
+            if total and cell_width >= 16:
+                painter.drawText(rect, Qt.AlignCenter, str(total))
+            day += timedelta(days=1)
+        for month, name in enumerate(MONTHS):
+            painter.drawText(QRectF(0, month * cell_height, label_width, cell_height), Qt.AlignVCenter, name)
+        painter.end()
+
+    def mouseMoveEvent(self, event):
+        day = self.day_at(event.position().x(), event.position().y())
+        if day is None:
+            QToolTip.hideText()
+            return
+        index = (day - date(self.year, 1, 1)).days
+        approved, pending = int(self.approved[index]), int(self.pending[index])
+        QToolTip.showText(
+            event.globalPosition().toPoint(),
+            f"{day:%d.%m.%Y}: отсутствуют {approved + pending} из {self.headcount} "
+            f"(одобрено {approved}, на рассмотрении {pending})",
+            self
+        )
@@ -0,0 +1,89 @@
+import time
+import logging
+from datetime import date, datetime, timedelta
+from sqlalchemy import (Table, Column, Integer, BigInteger, Date, Text, DateTime, ForeignKey, Index,
+                        select, insert, delete, literal)
+from enums import ApplicationStatus, LeaveType, CodedEnum
+
+# Холодный архив рассмотренных заявок. Одобренные и отклоненные заявки, закончившиеся
+# больше age_days дней назад, больше не меняются, поэтому переносятся пачками из applications
+# в applications_archive с той же структурой. В рабочей таблице остаются недавние
+# и ожидающие рассмотрения заявки, с которыми работают бот и кнопки панели.
+# История, отчеты, календарь и сверка остатков читают обе таблицы через combined()
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = ("application_id", "user_id", "start_date", "end_date", "type", "status", "reason", "created_at", "updated_at", "version")
+DECIDED = (ApplicationStatus.APPROVED, ApplicationStatus.REJECTED)
+
+
+def define_table(metadata):
+    return Table(
+        "applications_archive", metadata,
+        Column("application_id", Integer, primary_key=True),
+        Column("user_id", BigInteger, ForeignKey("users.user_id", ondelete="CASCADE"), nullable=False),
+        Column("start_date", Date, nullable=False),
+        Column("end_date", Date, nullable=False),
+        Column("type", CodedEnum(LeaveType), nullable=False),
+        Column("status", CodedEnum(ApplicationStatus), nullable=False),
+        Column("reason", Text),
+        Column("created_at", DateTime),
+        Column("updated_at", DateTime),
+        Column("version", Integer, nullable=False, server_default="1"),
+        Column("archived_at", DateTime, nullable=False),
+        Index("applications_archive_user_id_idx", "user_id")
+    )
+
+
+# Обе таблицы как одна: подзапрос UNION ALL с колонками applications. Его можно передавать
+# вместо таблицы в reports, absence_calendar и leave_balance.rebuild - условия WHERE
+# планировщик БД опускает в каждую ветку и использует индексы обеих таблиц
+def combined(applications, archive, name="applications_all"):
+    return select(*(applications.c[column] for column in COLUMNS)).union_all(
+        select(*(archive.c[column] for column in COLUMNS))
+    ).subquery(name)
+
+
+def archive_decided(engine, applications, archive, age_days, batch_size=5000, today=None):
+    cutoff = (today or date.today()) - timedelta(days=age_days)
+    apps = applications.c
+    candidates = (
+        select(apps.application_id)
+        .where(apps.status.in_(DECIDED), apps.end_date < cutoff)
+        .order_by(apps.application_id)
+        .limit(batch_size)
+    )
+    moved = 0
+    started = time.perf_counter()
+    while True:
+        # Каждая пачка - своя короткая транзакция, чтобы не держать блокировки на всей таблице
+        with engine.begin() as conn:
+            ids = conn.execute(candidates).scalars().all()
+            if not ids:
+                break
+            archived_at = datetime.utcnow()
+            conn.execute(insert(archive).from_select(
+                [*COLUMNS, "archived_at"],
+                select(*(apps[column] for column in COLUMNS), literal(archived_at, DateTime))
+                .where(apps.application_id.in_(ids))
+            ))
+            # Версии данных не увеличиваются: объединение обеих таблиц не меняется, кэши отчетов остаются верными
+            conn.execute(delete(applications).where(apps.application_id.in_(ids)))
+        moved += len(ids)
+        logger.info(f"В архив перенесено {moved} заявок")
+        if len(ids) < batch_size:
+            break
+    logger.info(f"Архивация завершена за {time.perf_counter() - started:.1f} с: {moved} заявок, "
+                f"закончившихся до {cutoff}")
+    return moved
+
+
+# Плановый перенос без GUI: python archive.py [дней]
+if __name__ == "__main__":
+    import sys
+    import tgbot
+    import log_pipeline
+    log_pipeline.setup_logging("archive.log")
+    tgbot.init_db()
+    age_days = int(sys.argv[1]) if len(sys.argv) > 1 else tgbot.CONFIG["ARCHIVE_AFTER_DAYS"]
+    print(f"Перенесено в архив: {archive_decided(tgbot.engine, tgbot.Application.__table__, tgbot.applications_archive, age_days)}")
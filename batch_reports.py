@@ -0,0 +1,205 @@
+import os
+import re
+import sys
+import time
+import logging
+import zipfile
+import itertools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from sqlalchemy import select
+import reports
+
+# Пакет PDF по отделам за период: заявки сотрудников отдела и длительность в рабочих днях.
+# Данные читаются одним запросом и делятся по users.department в основном процессе,
+# PDF строятся параллельно в пуле процессов (reportlab однопоточный и держит GIL).
+# Запуск процесса пула (spawn, импорт reportlab) стоит десятые доли секунды, поэтому на одном ядре
+# и на небольших пакетах PDF строятся в самом процессе, в одном фоновом потоке.
+# Шрифты регистрируются один раз в каждом процессе пула, файлы пишутся в zip или каталог
+#
+#   python batch_reports.py 2026-01-01 2026-12-31 отделы_2026.zip
+
+logger = logging.getLogger(__name__)
+
+NO_DEPARTMENT = "Без отдела"
+# Меньше строк во всех отчетах пакета - пул не окупает запуск процессов (bench_batch_reports.py)
+MIN_POOL_LINES = 2000
+
+
+# Список (отдел, заголовок, строки); крупные отделы первыми, чтобы пул не ждал в конце самый длинный
+def department_documents(conn, users, applications, start_date, end_date):
+    apps = applications.c
+    rows = conn.execute(
+        select(users.c.department, users.c.last_name, users.c.first_name,
+               apps.application_id, apps.type, apps.start_date, apps.end_date, apps.status)
+        .join_from(applications, users, apps.user_id == users.c.user_id)
+        .where(apps.start_date >= start_date, apps.end_date <= end_date)
+        .order_by(users.c.department, users.c.last_name, users.c.first_name, apps.application_id)
+    ).all()
+    if not rows:
+        return []
+    import workdays
+    days = workdays.calendar().count([row.start_date for row in rows], [row.end_date for row in rows]).tolist()
+    documents = []
+    for department, group in itertools.groupby(zip(rows, days), key=lambda item: item[0].department):
+        group = list(group)
+        employees = {}
+        for row, count in group:
+            name = f"{row.last_name} {row.first_name}"
+            employees[name] = employees.get(name, 0) + count
+        department = department or NO_DEPARTMENT
+        lines = [f"Заявок: {len(group)}, рабочих дней: {sum(employees.values())}", "Длительность по сотрудникам:"]
+        lines += [f"{name}: {count} раб. дн." for name, count in employees.items()]
+        lines.append("Заявки:")
+        lines += [f"#{row.application_id} - {row.last_name} {row.first_name}, {row.type}, "
+                  f"{row.start_date} - {row.end_date} ({count} раб. дн.), {row.status}" for row, count in group]
+        documents.append((department, f"{department}: заявки за период {start_date} — {end_date}", lines))
+    documents.sort(key=lambda document: len(document[2]), reverse=True)
+    return documents
+
+
+def init_worker():
+    reports.register_fonts()
+
+
+def render_document(department, title, lines):
+    return department, reports.render_pdf(title, lines)
+
+
+def file_name(department, used):
+    base = re.sub(r'[\\/:*?"<>|\s]+', "_", department).strip("._") or "department"
+    name, number = base, 1
+    while name.lower() in used:
+        number += 1
+        name = f"{base}_{number}"
+    used.add(name.lower())
+    return f"{name}.pdf"
+
+
+# Куда складываются PDF: архив .zip или каталог. Запись идет в основном процессе по мере готовности
+class BatchOutput:
+    def __init__(self, target):
+        self.target = target
+        self.used = set()
+        self.files = []
+        if target.lower().endswith(".zip"):
+            # PDF уже сжаты внутри, повторное сжатие почти ничего не дает
+            self.archive = zipfile.ZipFile(f"{target}.part", "w", zipfile.ZIP_STORED)
+        else:
+            self.archive = None
+            os.makedirs(target, exist_ok=True)
+
+    def add(self, department, pdf):
+        name = file_name(department, self.used)
+        if self.archive is not None:
+            self.archive.writestr(name, pdf)
+        else:
+            with open(os.path.join(self.target, name), "wb") as f:
+                f.write(pdf)
+        self.files.append(name)
+
+    # Архив появляется под своим именем только целиком; при отмене недописанный файл удаляется
+    def close(self, discard=False):
+        if self.archive is None:
+            return
+        self.archive.close()
+        if discard:
+            os.remove(f"{self.target}.part")
+        else:
+            os.replace(f"{self.target}.part", self.target)
+
+
+def available_cpus():
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+class Batch:
+    # parallel: None - пул только если окупается, True/False - принудительно (для замеров)
+    def __init__(self, documents, target, workers=None, parallel=None):
+        self.documents = documents
+        self.output = BatchOutput(target)
+        self.workers = min(workers or available_cpus(), len(documents)) or 1
+        if parallel is None:
+            parallel = self.workers > 1 and sum(len(lines) for _, _, lines in documents) >= MIN_POOL_LINES
+        self.parallel = parallel
+        if not parallel:
+            self.workers = 1
+        self.executor = None
+        self.futures = []
+        self.failed = []
+        self.started = None
+
+    @property
+    def total(self):
+        return len(self.documents)
+
+    @property
+    def done(self):
+        return len(self.output.files) + len(self.failed)
+
+    @property
+    def description(self):
+        return f"{self.workers} процессов" if self.parallel else "в одном процессе"
+
+    def start(self):
+        self.started = time.perf_counter()
+        if self.parallel:
+            # spawn, а не fork: пакет запускается из многопоточной админ-панели (Qt, пул потоков view),
+            # а копия такого процесса может унаследовать захваченные чужими потоками блокировки
+            self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=init_worker,
+                                                mp_context=multiprocessing.get_context("spawn"))
+        else:
+            # Тот же интерфейс Future, но без запуска процессов; поток GUI не блокируется
+            self.executor = ThreadPoolExecutor(max_workers=1, initializer=init_worker)
+        self.futures = [self.executor.submit(render_document, *document) for document in self.documents]
+        logger.info(f"Пакет отчетов по отделам: {self.total} PDF, {self.description}")
+        return self.futures
+
+    def add(self, result):
+        self.output.add(*result)
+
+    def add_error(self, department, error):
+        logger.error(f"Не удалось построить отчет отдела {department}: {error}")
+        self.failed.append((department, str(error)))
+
+    def cancel(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.output.close(discard=True)
+        logger.info(f"Пакет отчетов по отделам отменен: готово {self.done} из {self.total}")
+
+    def finish(self):
+        self.executor.shutdown(wait=True)
+        self.output.close()
+        logger.info(f"Пакет отчетов по отделам построен за {time.perf_counter() - self.started:.1f} с: "
+                    f"{len(self.output.files)} PDF, ошибок {len(self.failed)} -> {self.output.target}")
+
+    # Без GUI: ожидание всех задач в текущем потоке
+    def run(self, on_progress=None):
+        departments = {future: document[0] for future, document in zip(self.start(), self.documents)}
+        for future in as_completed(departments):
+            try:
+                self.add(future.result())
+            except Exception as e:
+                self.add_error(departments[future], e)
+            if on_progress:
+                on_progress(self.done, self.total)
+        self.finish()
+        return self
+
+
+if __name__ == "__main__":
+    from datetime import date
+    import tgbot
+    import log_pipeline
+    log_pipeline.setup_logging("batch_reports.log")
+    start_date, end_date, target = date.fromisoformat(sys.argv[1]), date.fromisoformat(sys.argv[2]), sys.argv[3]
+    workers = int(sys.argv[4]) if len(sys.argv) > 4 else None
+    with tgbot.init_db().connect() as conn:
+        documents = department_documents(conn, tgbot.User.__table__, tgbot.all_applications, start_date, end_date)
+    if not documents:
+        print("Заявки за выбранный период отсутствуют")
+        sys.exit(0)
+    batch = Batch(documents, target, workers).run(lambda done, total: print(f"\r{done}/{total}", end="", flush=True))
+    print(f"\nГотово: {len(batch.output.files)} PDF, ошибок {len(batch.failed)} -> {target}")
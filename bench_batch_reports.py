@@ -0,0 +1,55 @@
+import os
+import sys
+import time
+import tempfile
+import batch_reports
+import reports
+
+# Замер пакета PDF по отделам: последовательное построение в одном процессе (как отчеты
+# по одному из панели), выбор Batch по умолчанию и пул процессов с 1, 2, 4 ... процессами
+# (не меньше 4; сверх числа ядер - с пометкой, такие замеры показывают только накладные расходы).
+# Запуск: python bench_batch_reports.py [отделов] [заявок в отделе]
+
+DEPARTMENTS = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+ROWS = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+
+
+def make_documents():
+    documents = []
+    for dept in range(DEPARTMENTS):
+        lines = [f"Заявок: {ROWS}, рабочих дней: {ROWS * 5}", "Заявки:"]
+        lines += [f"#{dept * ROWS + i} - Петров Иван, ежегодный основной оплачиваемый, "
+                  f"2026-07-01 - 2026-07-07 (5 раб. дн.), одобрена" for i in range(ROWS)]
+        documents.append((f"Отдел {dept}", f"Отдел {dept}: заявки за период 2026-01-01 — 2026-12-31", lines))
+    return documents
+
+
+def main():
+    documents = make_documents()
+    cores = batch_reports.available_cpus()
+    print(f"Отделов: {DEPARTMENTS}, строк в отчете: {ROWS}, ядер: {cores}")
+    with tempfile.TemporaryDirectory() as directory:
+        started = time.perf_counter()
+        for department, title, lines in documents:
+            reports.render_pdf(title, lines)
+        sequential = time.perf_counter() - started
+        print(f"{'Последовательно в одном процессе':<44}{sequential:>8.2f} с")
+
+        def run(label, name, **kwargs):
+            started = time.perf_counter()
+            batch = batch_reports.Batch(documents, os.path.join(directory, f"{name}.zip"), **kwargs).run()
+            elapsed = time.perf_counter() - started
+            assert len(batch.output.files) == DEPARTMENTS and not batch.failed
+            print(f"{label:<44}{elapsed:>8.2f} с  ускорение {sequential / elapsed:.2f}x")
+
+        probe = batch_reports.Batch(documents, os.path.join(directory, "probe"))
+        run(f"Batch по умолчанию ({probe.description})", "auto")
+        workers = 1
+        while workers <= max(cores, 4):
+            note = "" if workers <= cores else ", больше ядер"
+            run(f"Пул, процессов: {workers}{note}", workers, workers=workers, parallel=True)
+            workers *= 2
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+import os
+import sys
+import json
+import time
+import random
+import socket
+import argparse
+import threading
+import statistics
+from collections import defaultdict, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+# Нагрузочный тест бота: локальный фейковый Bot API и тысячи виртуальных чатов,
+# которые проходят регистрацию, подачу заявки на отпуск и просмотр своих заявок.
+# Обновления передаются прямо в bot.process_new_updates, ответы бота уходят в фейковый API.
+#
+#   python bench_bot_flows.py --chats 1000 --concurrency 32
+#   python bench_bot_flows.py --db postgresql://localhost/crm_load --chats 5000
+#   python bench_bot_flows.py --replay capture.jsonl     # запись: UPDATE_CAPTURE=capture.jsonl python tgbot.py
+
+
+class FakeBotApi(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    delay = 0.0
+    calls = defaultdict(int)
+    lock = threading.Lock()
+    message_id = 0
+
+    def setup(self):
+        super().setup()
+        # Без TCP_NODELAY ответ на keep-alive соединении ждет delayed ACK (~40 мс)
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def handle_call(self):
+        path = urlparse(self.path)
+        method = path.path.rsplit("/", 1)[-1]
+        params = {key: values[0] for key, values in parse_qs(path.query).items()}
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            params.update({key: values[0] for key, values in parse_qs(self.rfile.read(length).decode()).items()})
+        with FakeBotApi.lock:
+            FakeBotApi.calls[method] += 1
+            FakeBotApi.message_id += 1
+            message_id = FakeBotApi.message_id
+        if self.delay:
+            time.sleep(self.delay)
+        if method == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "fake", "username": "fake_bot"}
+        elif method == "sendMessage":
+            result = {
+                "message_id": message_id,
+                "date": int(time.time()),
+                "chat": {"id": int(params.get("chat_id") or 0), "type": "private"},
+                "text": params.get("text", "")
+            }
+        else:
+            result = True
+        body = json.dumps({"ok": True, "result": result}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = handle_call
+    do_POST = handle_call
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_fake_api(delay):
+    FakeBotApi.delay = delay
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeBotApi)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class UpdateFactory:
+    def __init__(self):
+        self.update_id = 0
+        self.lock = threading.Lock()
+
+    def next_id(self):
+        with self.lock:
+            self.update_id += 1
+            return self.update_id
+
+    def message(self, chat_id, text):
+        update_id = self.next_id()
+        return {
+            "update_id": update_id,
+            "message": {
+                "message_id": update_id,
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "from": {"id": chat_id, "is_bot": False, "first_name": "Нагрузка"},
+                "text": text
+            }
+        }
+
+
+def scripted_chat(chat_id, n):
+    start_date = date.today() + timedelta(days=30 + n % 60)
+    end_date = start_date + timedelta(days=1 + n % 14)
+    return [
+        ("start", "/start"),
+        ("register_first_name", "Иван"),
+        ("register_last_name", f"Нагрузочный{n}"),
+        ("register_position", "Инженер"),
+        ("register_department", f"Отдел {n % 20}"),
+        ("register_email", f"load{chat_id}@example.com"),
+        ("vacation", "🏖️ Отпуск"),
+        ("vacation_type", "🌴 Ежегодный основной оплачиваемый"),
+        ("application_start_date", start_date.isoformat()),
+        ("application_end_date", end_date.isoformat()),
+        ("application_reason", "Нагрузочный тест"),
+        ("my_applications", "📋 Мои заявки"),
+    ]
+
+
+def update_chat_id(update):
+    if "message" in update:
+        return update["message"]["chat"]["id"]
+    if "callback_query" in update:
+        return update["callback_query"]["message"]["chat"]["id"]
+    return None
+
+
+def update_step(update):
+    if "callback_query" in update:
+        return "callback:" + update["callback_query"].get("data", "").split("_")[0]
+    text = update.get("message", {}).get("text") or ""
+    return text.split()[0] if text.startswith("/") else "text"
+
+
+def load_capture(path):
+    chats = OrderedDict()
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                update = json.loads(line)
+                chats.setdefault(update_chat_id(update), []).append((update_step(update), update))
+    return list(chats.values())
+
+
+def percentile(values, share):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(share * len(ordered)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест сценариев бота")
+    parser.add_argument("--db", default="sqlite:///loadtest.db?timeout=30")
+    parser.add_argument("--chats", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--api-delay", type=float, default=0.0, help="задержка фейкового Bot API, с")
+    parser.add_argument("--replay", help="JSONL с записанными обновлениями")
+    parser.add_argument("--duplicates", type=float, default=0.0,
+                        help="доля обновлений, доставляемых повторно с тем же update_id")
+    args = parser.parse_args()
+
+    os.environ["DB_URL"] = args.db
+    os.environ.setdefault("TELEGRAM_TOKEN", "123456:LOADTEST")
+    os.environ.setdefault("HR_CHAT_ID", "1")
+
+    server = start_fake_api(args.api_delay)
+    from telebot import apihelper, types
+    apihelper.API_URL = f"http://127.0.0.1:{server.server_address[1]}/bot{{0}}/{{1}}"
+
+    import tgbot
+    import metrics
+    tgbot.init_db()
+    bot = tgbot.get_bot()
+    # Обработка в потоке вызывающего, чтобы измерять полное время шага
+    bot.threaded = False
+
+    factory = UpdateFactory()
+    if args.replay:
+        chats = load_capture(args.replay)
+    else:
+        first_chat_id = int(time.time()) * 1000 + random.randint(0, 999)
+        chats = [
+            [(step, factory.message(first_chat_id + n, text)) for step, text in scripted_chat(first_chat_id + n, n)]
+            for n in range(args.chats)
+        ]
+
+    if args.duplicates:
+        # Повторная доставка, как при сбое polling: то же обновление сразу следом
+        chats = [
+            [item for step, update in steps
+             for item in ([(step, update)] + ([("повтор", update)] if random.random() < args.duplicates else []))]
+            for steps in chats
+        ]
+
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    results_lock = threading.Lock()
+
+    def run_chat(steps):
+        for step, update in steps:
+            started = time.perf_counter()
+            try:
+                bot.process_new_updates([types.Update.de_json(update)])
+                failed = False
+            except Exception:
+                failed = True
+            elapsed = time.perf_counter() - started
+            with results_lock:
+                latencies[step].append(elapsed)
+                if failed:
+                    errors[step] += 1
+
+    queries_before = metrics.DB_QUERIES.total()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        list(executor.map(run_chat, chats))
+    wall = time.perf_counter() - started
+    total_updates = sum(len(values) for values in latencies.values())
+    total_queries = metrics.DB_QUERIES.total() - queries_before
+
+    print(f"Чатов: {len(chats)}, обновлений: {total_updates}, параллельно: {args.concurrency}, БД: {args.db}")
+    print(f"{'шаг':<36}{'n':>7}{'p50 мс':>10}{'p95 мс':>10}{'p99 мс':>10}{'ошибок':>8}")
+    for step, values in latencies.items():
+        print(f"{step:<36}{len(values):>7}"
+              f"{statistics.median(values) * 1000:>10.1f}"
+              f"{percentile(values, 0.95) * 1000:>10.1f}"
+              f"{percentile(values, 0.99) * 1000:>10.1f}"
+              f"{errors[step]:>8}")
+    print(f"Пропускная способность: {total_updates / wall:,.0f} обновлений/с за {wall:.1f} с")
+    print(f"Запросов к БД: {total_queries} ({total_queries / max(total_updates, 1):.2f} на обновление)")
+    for handler, count in sorted(metrics.DB_QUERIES.values.items(), key=lambda item: -item[1]):
+        print(f"  {handler[0]:<34}{count:>8}")
+    print(f"Вызовов Bot API: {dict(FakeBotApi.calls)}")
+    print(f"Отброшено повторов: {tgbot.deduplicator.stats()}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
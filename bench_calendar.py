@@ -0,0 +1,105 @@
+import os
+import sys
+import time
+import random
+import tempfile
+from datetime import date, timedelta
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from sqlalchemy import create_engine, MetaData, Table, Column, Integer, String, Date, BigInteger, insert
+from PySide6.QtWidgets import QApplication
+from admin_widgets import AbsenceHeatmap
+from absence_calendar import AbsenceCalendar
+
+# Замер календаря отсутствий: отдел из N сотрудников с несколькими заявками в году.
+# Сравнивается прямой подсчет по дням в Python с разностными массивами NumPy,
+# инкрементальная поправка после решения и отрисовка тепловой карты.
+# Запуск: python bench_calendar.py [сотрудников] [заявок на сотрудника]
+
+EMPLOYEES = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+PER_EMPLOYEE = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+YEAR = 2025
+PENDING, APPROVED = "на рассмотрении", "одобрена"
+
+metadata = MetaData()
+users = Table(
+    "users", metadata,
+    Column("user_id", BigInteger, primary_key=True),
+    Column("department", String(100))
+)
+applications = Table(
+    "applications", metadata,
+    Column("application_id", Integer, primary_key=True),
+    Column("user_id", BigInteger),
+    Column("start_date", Date),
+    Column("end_date", Date),
+    Column("status", String(20))
+)
+
+
+def fill(engine):
+    random.seed(1)
+    metadata.create_all(engine)
+    rows = []
+    for user_id in range(EMPLOYEES):
+        for _ in range(PER_EMPLOYEE):
+            start = date(YEAR, 1, 1) + timedelta(days=random.randint(-10, 364))
+            rows.append({"user_id": user_id, "start_date": start, "end_date": start + timedelta(days=random.randint(0, 20)),
+                         "status": random.choice([PENDING, APPROVED, APPROVED])})
+    with engine.begin() as conn:
+        conn.execute(insert(users), [{"user_id": user_id, "department": "Отдел"} for user_id in range(EMPLOYEES)])
+        conn.execute(insert(applications), rows)
+    return rows
+
+
+def naive_counts(rows):
+    counts = {}
+    for row in rows:
+        day = max(row["start_date"], date(YEAR, 1, 1))
+        while day <= min(row["end_date"], date(YEAR, 12, 31)):
+            counts[day] = counts.get(day, 0) + 1
+            day += timedelta(days=1)
+    return counts
+
+
+def measure(label, func, repeats=5):
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - started)
+    print(f"{label:<44}{min(timings) * 1000:>10.2f} мс")
+    return result
+
+
+def main():
+    path = os.path.join(tempfile.mkdtemp(), "calendar.db")
+    engine = create_engine(f"sqlite:///{path}")
+    rows = fill(engine)
+    print(f"Сотрудников: {EMPLOYEES}, заявок: {len(rows)}")
+    calendar = AbsenceCalendar(users, applications, PENDING, APPROVED)
+
+    counts = measure("Подсчет по дням в Python (без запроса)", lambda: naive_counts(rows))
+    with engine.connect() as conn:
+        entry = measure("Запрос + разностные массивы NumPy", lambda: calendar.build(conn, "Отдел", YEAR))
+        calendar.entries[("Отдел", YEAR)] = entry
+        measure("Повторное открытие (из кэша)", lambda: calendar.get(conn, "Отдел", YEAR))
+    assert all(int(entry.total[(day - date(YEAR, 1, 1)).days]) == count for day, count in counts.items())
+    measure("Поправка после одобрения", lambda: calendar.apply(
+        "Отдел", date(YEAR, 3, 1), date(YEAR, 3, 14), pending_delta=-1, approved_delta=1), repeats=100)
+
+    app = QApplication([])
+    heatmap = AbsenceHeatmap()
+    heatmap.resize(900, 300)
+    heatmap.show()
+    app.processEvents()
+    measure("Отрисовка тепловой карты", lambda: (
+        heatmap.set_data(YEAR, entry.approved, entry.pending, entry.headcount), heatmap.grab()))
+    heatmap.close()
+    engine.dispose()
+    os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
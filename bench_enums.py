@@ -0,0 +1,144 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+import numpy as np
+from datetime import date
+from sqlalchemy import (create_engine, MetaData, Table, Column, Integer, BigInteger, String, Date, Index,
+                        select, insert, func, text)
+from enums import ApplicationStatus, LeaveType, CodedEnum
+
+# Замер перехода applications.status и applications.type со строк на коды SMALLINT:
+# размер таблицы и индекса по статусу, фильтр и группировка по статусу, чтение строк через CodedEnum.
+# Обе таблицы заполняются одними и теми же синтетическими данными.
+#   python bench_enums.py                      # 5 млн строк в SQLite во временном каталоге
+#   python bench_enums.py --rows 1000000 --db postgresql://localhost/crm_bench
+
+BATCH = 50000
+
+metadata = MetaData()
+tables = {
+    "строки": Table(
+        "bench_apps_text", metadata,
+        Column("application_id", Integer, primary_key=True),
+        Column("user_id", BigInteger, nullable=False),
+        Column("start_date", Date, nullable=False),
+        Column("end_date", Date, nullable=False),
+        Column("type", String(100), nullable=False),
+        Column("status", String(20), nullable=False),
+        Index("bench_apps_text_status_idx", "status")
+    ),
+    "коды": Table(
+        "bench_apps_coded", metadata,
+        Column("application_id", Integer, primary_key=True),
+        Column("user_id", BigInteger, nullable=False),
+        Column("start_date", Date, nullable=False),
+        Column("end_date", Date, nullable=False),
+        Column("type", CodedEnum(LeaveType), nullable=False),
+        Column("status", CodedEnum(ApplicationStatus), nullable=False),
+        Index("bench_apps_coded_status_idx", "status")
+    )
+}
+
+
+def generate(rows):
+    rng = np.random.default_rng(1)
+    statuses = rng.choice([status.value for status in ApplicationStatus], size=rows, p=[0.05, 0.75, 0.2])
+    leave_types = rng.choice([leave_type.value for leave_type in LeaveType], size=rows, p=[0.2, 0.6, 0.1, 0.1])
+    starts = date(2020, 1, 1).toordinal() + rng.integers(0, 365 * 6, size=rows)
+    lengths = rng.integers(0, 28, size=rows)
+    users = rng.integers(1, 20000, size=rows)
+    return statuses, leave_types, starts, lengths, users
+
+
+def fill(engine, table, data, coded):
+    statuses, leave_types, starts, lengths, users = data
+    status_of = {status.value: status if coded else status.label for status in ApplicationStatus}
+    type_of = {leave_type.value: leave_type if coded else leave_type.label for leave_type in LeaveType}
+    started = time.perf_counter()
+    with engine.begin() as conn:
+        for offset in range(0, len(statuses), BATCH):
+            end = min(offset + BATCH, len(statuses))
+            conn.execute(insert(table), [
+                {"application_id": i + 1, "user_id": int(users[i]), "start_date": date.fromordinal(int(starts[i])),
+                 "end_date": date.fromordinal(int(starts[i] + lengths[i])), "type": type_of[leave_types[i]],
+                 "status": status_of[statuses[i]]}
+                for i in range(offset, end)
+            ])
+    return time.perf_counter() - started
+
+
+def sizes(engine, table):
+    index = next(iter(table.indexes)).name
+    with engine.connect() as conn:
+        if engine.dialect.name == "postgresql":
+            conn.execute(text(f"VACUUM ANALYZE {table.name}").execution_options(isolation_level="AUTOCOMMIT"))
+            return conn.execute(text(f"SELECT pg_relation_size('{table.name}'), pg_relation_size('{index}')")).one()
+        # dbstat есть в сборках SQLite с SQLITE_ENABLE_DBSTAT_VTAB
+        found = dict(conn.execute(text(
+            "SELECT name, SUM(pgsize) FROM dbstat WHERE name IN (:table, :index) GROUP BY name"),
+            {"table": table.name, "index": index}).all())
+        return found.get(table.name), found.get(index)
+
+
+def measure(label, func, repeats=5):
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - started)
+    print(f"  {label:<46}{min(timings) * 1000:>10.1f} мс")
+    return result
+
+
+def mib(size):
+    return f"{size / 1024 / 1024:.1f} МиБ" if size is not None else "н/д"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=5000000)
+    parser.add_argument("--db", help="URL БД; по умолчанию временный файл SQLite")
+    args = parser.parse_args()
+    path = None
+    if args.db:
+        engine = create_engine(args.db)
+    else:
+        path = os.path.join(tempfile.mkdtemp(), "enums.db")
+        engine = create_engine(f"sqlite:///{path}")
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+
+    data = generate(args.rows)
+    print(f"Строк: {args.rows}, БД: {engine.dialect.name}")
+    results = {}
+    for name, table in tables.items():
+        coded = name == "коды"
+        elapsed = fill(engine, table, data, coded)
+        table_size, index_size = sizes(engine, table)
+        print(f"{name}: загрузка {elapsed:.1f} с, таблица {mib(table_size)}, индекс по статусу {mib(index_size)}")
+        pending = ApplicationStatus.PENDING if coded else ApplicationStatus.PENDING.label
+        approved = ApplicationStatus.APPROVED if coded else ApplicationStatus.APPROVED.label
+        c = table.c
+        with engine.connect() as conn:
+            results[name] = measure("Число заявок на рассмотрении (индекс)", lambda: conn.execute(
+                select(func.count()).where(c.status == pending)).scalar())
+            measure("Страница на рассмотрении, 20 строк", lambda: conn.execute(
+                select(c.application_id, c.type, c.status).where(c.status == pending)
+                .order_by(c.application_id).limit(20).offset(1000)).all())
+            measure("Группировка по статусу и типу (полный просмотр)", lambda: conn.execute(
+                select(c.status, c.type, func.count()).group_by(c.status, c.type)).all(), repeats=3)
+            rows = measure("Чтение 100 тыс. строк статус + тип", lambda: conn.execute(
+                select(c.status, c.type).limit(100000)).all(), repeats=3)
+            measure("Отбор одобренных в Python (100 тыс. строк)",
+                    lambda: sum(1 for row in rows if row.status == approved), repeats=3)
+    assert results["строки"] == results["коды"]
+    metadata.drop_all(engine)
+    engine.dispose()
+    if path:
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
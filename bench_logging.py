@@ -0,0 +1,116 @@
+import os
+import sys
+import time
+import statistics
+import logging
+import tempfile
+import threading
+import log_pipeline
+import metrics
+
+# Пропускная способность обработчика бота при выключенном логировании,
+# синхронной записи в файл (прежний basicConfig) и очереди с фоновым потоком.
+# Обработчик имитирует ожидание БД и Telegram API, как в реальном боте. Оба варианта пишут
+# в настоящие файлы на диске; задержка медленного или сетевого диска по умолчанию выключена,
+# а если задана, добавляется к каждой записи в файл одинаково в обоих вариантах.
+# Запуск: python bench_logging.py [вызовов на поток] [потоков] [ожидание, мс] [задержка записи, мс]
+
+CALLS = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+THREADS = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+IO_WAIT = (float(sys.argv[3]) if len(sys.argv) > 3 else 0.2) / 1000
+DISK_LATENCY = (float(sys.argv[4]) if len(sys.argv) > 4 else 0) / 1000
+
+
+# Файл с задержкой на каждой записи: синхронный обработчик ждет ее в потоке обработчика бота,
+# очередь - в своем фоновом потоке
+class SlowStream:
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, data):
+        time.sleep(DISK_LATENCY)
+        return self.stream.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+def slow_down(handlers):
+    if not DISK_LATENCY:
+        return
+    for file_handler in handlers:
+        file_handler.stream = SlowStream(file_handler.stream)
+
+
+logger = logging.getLogger("tgbot")
+
+
+@metrics.timed
+def handler(chat_id):
+    if IO_WAIT:
+        time.sleep(IO_WAIT)
+    # Как send_message: ответ пользователю и сообщение HR, по записи на каждое
+    logger.info("Сообщение отправлено", extra={"chat_id": chat_id, "length": 42})
+    logger.info("Заявка подана", extra={"chat_id": chat_id, "application_id": chat_id})
+
+
+def run():
+    latencies = []
+
+    def worker(offset):
+        timings = []
+        for i in range(CALLS):
+            call_started = time.perf_counter()
+            handler(offset + i)
+            timings.append(time.perf_counter() - call_started)
+        latencies.extend(timings)
+    threads = [threading.Thread(target=worker, args=(n * CALLS,)) for n in range(THREADS)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    throughput = CALLS * THREADS / (time.perf_counter() - started)
+    p99 = statistics.quantiles(latencies, n=100)[98] * 1e6
+    return f"{throughput:,.0f} обработчиков/с, p99 {p99:.0f} мкс"
+
+
+def reset_root():
+    root = logging.getLogger()
+    for old_handler in root.handlers[:]:
+        root.removeHandler(old_handler)
+        old_handler.close()
+
+
+def main():
+    directory = tempfile.mkdtemp()
+
+    logging.disable(logging.CRITICAL)
+    print(f"Логирование выключено: {run()}")
+    logging.disable(logging.NOTSET)
+
+    reset_root()
+    logging.basicConfig(level=logging.INFO, filename=os.path.join(directory, 'sync.log'),
+                        format='%(asctime)s - %(levelname)s - %(message)s')
+    slow_down(logging.getLogger().handlers)
+    print(f"Синхронный FileHandler: {run()}")
+
+    reset_root()
+    listener = log_pipeline.setup_logging(os.path.join(directory, 'queue.log'))
+    slow_down(listener.handlers)
+    print(f"QueueHandler + JSON: {run()}")
+    started = time.perf_counter()
+    listener.stop()
+    print(f"  дозапись очереди после остановки: {time.perf_counter() - started:.2f} с, "
+          f"отброшено записей: {log_pipeline.DROPPED.total()}")
+
+    reset_root()
+    listener = log_pipeline.setup_logging(os.path.join(directory, 'sampled.log'),
+                                          sampling={"crm.handlers": 0.1, "tgbot": 0.1})
+    slow_down(listener.handlers)
+    print(f"QueueHandler + JSON, сэмплирование 10%: {run()}")
+    listener.stop()
+
+
+if __name__ == "__main__":
+    main()
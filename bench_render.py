@@ -0,0 +1,108 @@
+import os
+import sys
+import time
+import statistics
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PySide6.QtWidgets import QApplication, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QScrollArea
+from PySide6.QtCore import Qt, QEvent
+from admin_widgets import STYLES, COMPILED_STYLESHEET, WidgetPool, ApplicationCard, styled_label
+
+# Замер отрисовки страницы заявок: прежний путь (setStyleSheet на каждом виджете
+# и пересоздание карточек) против общей таблицы стилей и пула карточек.
+# Запуск: python bench_render.py [строк] [повторов]
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+REPEATS = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+
+
+def make_texts(page):
+    return [
+        (i, f"#{i} | Иван Петров | ежегодный основной оплачиваемый | 2025-07-01 — 2025-07-14 | "
+            f"Причина: отпуск, страница {page} | Статус: на рассмотрении")
+        for i in range(ROWS)
+    ]
+
+
+def make_container():
+    scroll = QScrollArea()
+    content = QWidget()
+    layout = QVBoxLayout(content)
+    layout.setAlignment(Qt.AlignTop)
+    scroll.setWidget(content)
+    scroll.setWidgetResizable(True)
+    scroll.resize(800, 600)
+    scroll.show()
+    return scroll, layout
+
+
+def flush(app):
+    app.sendPostedEvents(None, QEvent.DeferredDelete)
+    app.processEvents()
+
+
+def render_legacy(app, layout, texts):
+    while layout.count():
+        item = layout.takeAt(0)
+        if item.widget():
+            item.widget().deleteLater()
+    for app_id, text in texts:
+        card = QWidget()
+        card_layout = QHBoxLayout(card)
+        card_layout.setContentsMargins(0, 0, 0, 0)
+        label = QLabel(text)
+        label.setWordWrap(True)
+        approve_btn = QPushButton("✅")
+        reject_btn = QPushButton("❌")
+        approve_btn.setFixedSize(40, 40)
+        reject_btn.setFixedSize(40, 40)
+        approve_btn.setStyleSheet(STYLES["approve_button"])
+        reject_btn.setStyleSheet(STYLES["reject_button"])
+        card_layout.addWidget(label)
+        card_layout.addStretch()
+        card_layout.addWidget(approve_btn)
+        card_layout.addWidget(reject_btn)
+        card.setStyleSheet(STYLES["card"])
+        layout.addWidget(card)
+    flush(app)
+
+
+def render_pooled(app, pool, texts):
+    pool.reset()
+    for app_id, text in texts:
+        pool.acquire("application").bind(app_id, text)
+    flush(app)
+
+
+def measure(render):
+    timings = []
+    for page in range(REPEATS):
+        texts = make_texts(page)
+        started = time.perf_counter()
+        render(texts)
+        timings.append(time.perf_counter() - started)
+    # Первая отрисовка включает создание виджетов, остальные показывают установившийся режим
+    return timings[0], statistics.median(timings[1:] or timings)
+
+
+def main():
+    app = QApplication([])
+
+    scroll, layout = make_container()
+    first, median = measure(lambda texts: render_legacy(app, layout, texts))
+    print(f"До:    первая {first * 1000:.1f} мс, медиана {median * 1000:.1f} мс ({ROWS} строк)")
+    scroll.close()
+
+    app.setStyleSheet(COMPILED_STYLESHEET)
+    scroll, layout = make_container()
+    pool = WidgetPool(layout)
+    pool.register("label", styled_label)
+    pool.register("application", lambda: ApplicationCard(lambda *_: None, lambda *_: None))
+    first, median = measure(lambda texts: render_pooled(app, pool, texts))
+    print(f"После: первая {first * 1000:.1f} мс, медиана {median * 1000:.1f} мс ({ROWS} строк)")
+    scroll.close()
+
+
+if __name__ == "__main__":
+    main()
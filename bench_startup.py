@@ -0,0 +1,104 @@
+import os
+import re
+import sys
+import time
+import tempfile
+import subprocess
+from collections import defaultdict
+
+# Замер времени запуска: разбивка времени импорта по пакетам (python -X importtime),
+# время до показа окна и до загрузки первой страницы, проверка схемы с холодным и теплым состоянием.
+#   python bench_startup.py
+#   python bench_startup.py --db postgresql://localhost/crm
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+# Сколько ждать первую страницу, прежде чем считать, что БД недоступна
+STARTUP_TIMEOUT = 60
+
+
+def import_breakdown(module, top=12):
+    env = dict(os.environ, QT_QPA_PLATFORM="offscreen")
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=HERE, env=env, capture_output=True, text=True)
+    packages = defaultdict(int)
+    total = 0
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, name = match.groups()
+        packages[name.split(".")[0]] += int(self_us)
+        # Верхний уровень вложенности: его накопленное время складывается в общее
+        if len(indent) == 1:
+            total += int(cumulative_us)
+    print(f"Импорт {module}: {total / 1000:.0f} мс")
+    for name, self_us in sorted(packages.items(), key=lambda item: -item[1])[:top]:
+        print(f"  {name:<28}{self_us / 1000:>8.1f} мс")
+
+
+def measure_admin(db_url):
+    os.environ["DB_URL"] = db_url
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    started = time.perf_counter()
+    from PySide6.QtWidgets import QApplication
+    app = QApplication.instance() or QApplication([])
+    import admin_p
+    imported = time.perf_counter()
+
+    # Ошибка подключения завершает замер вместо модального окна, которое некому закрыть
+    class BenchPanel(admin_p.AdminPanel):
+        db_error = None
+
+        def on_db_failed(self, error):
+            self.db_error = error
+
+    window = BenchPanel()
+    window.show()
+    app.processEvents()
+    shown = time.perf_counter()
+    while not window.db_ready:
+        app.processEvents()
+        if window.db_error is not None or time.perf_counter() - shown > STARTUP_TIMEOUT:
+            window.close()
+            sys.exit(f"Админ-панель не загрузила первую страницу: {window.db_error or f'нет ответа за {STARTUP_TIMEOUT} с'}")
+        time.sleep(0.001)
+    app.processEvents()
+    loaded = time.perf_counter()
+    print(f"Админ-панель: импорт {(imported - started) * 1000:.0f} мс, "
+          f"окно показано {(shown - started) * 1000:.0f} мс, "
+          f"первая страница {(loaded - started) * 1000:.0f} мс")
+    window.close()
+
+
+def measure_schema(db_url):
+    from sqlalchemy import create_engine, delete
+    import schema_state
+    import admin_p
+    engine = create_engine(db_url)
+    # Холодная проверка - как на БД, где отпечатка схемы еще нет
+    with engine.begin() as conn:
+        conn.execute(delete(schema_state.schema_state))
+    for label in ("холодная", "теплая"):
+        started = time.perf_counter()
+        schema_state.ensure_schema(engine, admin_p.Base.metadata)
+        print(f"Проверка схемы ({label}): {(time.perf_counter() - started) * 1000:.1f} мс")
+    engine.dispose()
+
+
+def main():
+    db_url = sys.argv[sys.argv.index("--db") + 1] if "--db" in sys.argv else None
+    tmp_db = None
+    if db_url is None:
+        tmp_db = os.path.join(tempfile.mkdtemp(), "startup.db")
+        db_url = f"sqlite:///{tmp_db}"
+    for module in ("admin_p", "tgbot"):
+        import_breakdown(module)
+    measure_admin(db_url)
+    measure_schema(db_url)
+    if tmp_db:
+        os.remove(tmp_db)
+
+
+if __name__ == "__main__":
+    main()
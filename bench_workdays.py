@@ -0,0 +1,58 @@
+import sys
+import time
+import random
+from datetime import date, timedelta
+import workdays
+
+# Замер подсчета рабочих дней по производственному календарю для N интервалов:
+# перебор дней в Python против np.busday_count по массивам, с переводом списков date
+# в datetime64 и без него. Запуск: python bench_workdays.py [интервалов]
+
+COUNT = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+
+
+def naive_count(calendar, starts, ends):
+    holidays = {day.item() for day in calendar.holidays}
+    extra = {day.item() for day in calendar.workdays}
+    result = []
+    for start, end in zip(starts, ends):
+        count = 0
+        day = start
+        while day <= end:
+            if (day.weekday() < 5 and day not in holidays) or day in extra:
+                count += 1
+            day += timedelta(days=1)
+        result.append(count)
+    return result
+
+
+def measure(label, func, repeats=3):
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - started)
+    print(f"{label:<52}{min(timings) * 1000:>10.1f} мс")
+    return result
+
+
+def main():
+    random.seed(1)
+    calendar = workdays.calendar()
+    first = date(2025, 1, 1).toordinal()
+    starts = [date.fromordinal(first + random.randint(0, 700)) for _ in range(COUNT)]
+    ends = [start + timedelta(days=random.randint(0, 27)) for start in starts]
+    print(f"Интервалов: {COUNT}, праздников в календаре: {len(calendar.holidays)}, "
+          f"рабочих выходных: {len(calendar.workdays)}")
+
+    measure("Календарные дни в цикле Python (прежний отчет)",
+            lambda: [(end - start).days + 1 for start, end in zip(starts, ends)])
+    naive = measure("Рабочие дни перебором дней в Python", lambda: naive_count(calendar, starts, ends), repeats=1)
+    counts = measure("busday_count со списками date", lambda: calendar.count(starts, ends))
+    start_array, end_array = workdays.to_datetime64(starts), workdays.to_datetime64(ends)
+    measure("busday_count по готовым массивам datetime64", lambda: calendar.count(start_array, end_array))
+    assert counts.tolist() == naive
+
+
+if __name__ == "__main__":
+    main()
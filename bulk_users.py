@@ -0,0 +1,182 @@
+import csv
+from sqlalchemy import select, insert, update, bindparam
+from validators import validate_email
+import data_version
+
+# Массовый импорт и экспорт пользователей (CSV/XLSX).
+# Файл читается и пишется построчно, в базу строки уходят пакетами через upsert по email
+
+COLUMNS = ["user_id", "first_name", "last_name", "position", "department", "email"]
+REQUIRED = ["user_id", "first_name", "last_name", "email"]
+MAX_LENGTH = 100
+
+
+class ImportReport:
+    def __init__(self):
+        self.imported = 0
+        self.errors = []
+
+    def add_error(self, row_no, message):
+        self.errors.append((row_no, message))
+
+    def summary(self):
+        return f"Импорт пользователей: загружено {self.imported}, ошибок {len(self.errors)}"
+
+    def write_errors(self, path):
+        with open(path, "w", newline="", encoding="utf-8-sig") as f:
+            writer = csv.writer(f)
+            writer.writerow(["row", "error"])
+            writer.writerows(sorted(self.errors))
+
+
+def read_rows(path):
+    if path.lower().endswith(".xlsx"):
+        from openpyxl import load_workbook
+        workbook = load_workbook(path, read_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = [str(cell).strip().lower() if cell is not None else "" for cell in next(rows, ())]
+            for values in rows:
+                yield dict(zip(header, ["" if value is None else str(value).strip() for value in values]))
+        finally:
+            workbook.close()
+    else:
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            for row in csv.DictReader(f):
+                yield {key.strip().lower(): (value or "").strip() for key, value in row.items() if key}
+
+
+def validate_row(row):
+    missing = [column for column in REQUIRED if not row.get(column)]
+    if missing:
+        return None, f"Не заполнены поля: {', '.join(missing)}"
+    try:
+        user_id = int(row["user_id"])
+    except ValueError:
+        return None, "user_id должен быть числом"
+    too_long = [column for column in COLUMNS[1:] if len(row.get(column) or "") > MAX_LENGTH]
+    if too_long:
+        return None, f"Слишком длинное значение: {', '.join(too_long)}"
+    is_valid, error = validate_email(row["email"])
+    if not is_valid:
+        return None, error
+    return {
+        "user_id": user_id,
+        "first_name": row["first_name"],
+        "last_name": row["last_name"],
+        "position": row.get("position") or None,
+        "department": row.get("department") or None,
+        "email": row["email"]
+    }, None
+
+
+UPDATED_COLUMNS = ("first_name", "last_name", "position", "department")
+
+
+def upsert_statement(conn, users, rows):
+    if conn.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif conn.dialect.name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+    stmt = insert(users).values(rows)
+    set_ = {column: stmt.excluded[column] for column in UPDATED_COLUMNS}
+    # Карточки, открытые в панели до импорта, при сохранении получат конфликт версий
+    set_["version"] = users.c.version + 1
+    return stmt.on_conflict_do_update(index_elements=[users.c.email], set_=set_)
+
+
+# existing - email уже существующих пользователей, прочитанные в этой же транзакции
+def upsert_rows(conn, users, rows, existing):
+    stmt = upsert_statement(conn, users, rows)
+    if stmt is not None:
+        conn.execute(stmt)
+        return
+    # СУБД без ON CONFLICT: новые строки вставляются, существующие обновляются по email
+    new = [values for values in rows if values["email"] not in existing]
+    # Имена параметров не совпадают с колонками: такие имена SQLAlchemy занимает под SET
+    changed = [{f"new_{column}": values[column] for column in ("email",) + UPDATED_COLUMNS}
+               for values in rows if values["email"] in existing]
+    if new:
+        conn.execute(insert(users), new)
+    if changed:
+        set_ = {column: bindparam(f"new_{column}") for column in UPDATED_COLUMNS}
+        set_["version"] = users.c.version + 1
+        conn.execute(update(users).where(users.c.email == bindparam("new_email")).values(set_), changed)
+
+
+def upsert_batch(conn, users, batch, report):
+    # Upsert идет по email, поэтому строки, где ID и email принадлежат разным
+    # пользователям, отсекаются заранее и попадают в отчет об ошибках
+    by_id = dict(conn.execute(
+        select(users.c.user_id, users.c.email).where(users.c.user_id.in_([v["user_id"] for _, v in batch]))
+    ).all())
+    by_email = dict(conn.execute(
+        select(users.c.email, users.c.user_id).where(users.c.email.in_([v["email"] for _, v in batch]))
+    ).all())
+    rows = []
+    for row_no, values in batch:
+        if by_id.get(values["user_id"], values["email"]) != values["email"]:
+            report.add_error(row_no, f"ID {values['user_id']} уже занят пользователем {by_id[values['user_id']]}")
+        elif by_email.get(values["email"], values["user_id"]) != values["user_id"]:
+            report.add_error(row_no, f"Email уже принадлежит пользователю {by_email[values['email']]}")
+        else:
+            rows.append(values)
+    if rows:
+        upsert_rows(conn, users, rows, by_email)
+    return len(rows)
+
+
+# versions - таблица счетчиков data_version: версия users увеличивается в той же транзакции
+def import_users(engine, users, path, batch_size=500, versions=None):
+    report = ImportReport()
+    seen_ids, seen_emails = {}, {}
+    batch = []
+    with engine.begin() as conn:
+        # Первая строка файла - заголовок
+        for row_no, row in enumerate(read_rows(path), start=2):
+            values, error = validate_row(row)
+            if not error and values["user_id"] in seen_ids:
+                error = f"ID повторяется в строке {seen_ids[values['user_id']]}"
+            if not error and values["email"] in seen_emails:
+                error = f"Email повторяется в строке {seen_emails[values['email']]}"
+            if error:
+                report.add_error(row_no, error)
+                continue
+            seen_ids[values["user_id"]] = row_no
+            seen_emails[values["email"]] = row_no
+            batch.append((row_no, values))
+            if len(batch) >= batch_size:
+                report.imported += upsert_batch(conn, users, batch, report)
+                batch = []
+        if batch:
+            report.imported += upsert_batch(conn, users, batch, report)
+        if versions is not None and report.imported:
+            data_version.bump(conn, versions, ["users"])
+    return report
+
+
+def export_users(engine, users, path, chunk_size=1000):
+    query = select(*[users.c[column] for column in COLUMNS]).order_by(users.c.user_id)
+    exported = 0
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True).execute(query)
+        if path.lower().endswith(".xlsx"):
+            from openpyxl import Workbook
+            workbook = Workbook(write_only=True)
+            sheet = workbook.create_sheet("users")
+            sheet.append(COLUMNS)
+            for rows in result.partitions(chunk_size):
+                for row in rows:
+                    sheet.append(list(row))
+                exported += len(rows)
+            workbook.save(path)
+        else:
+            with open(path, "w", newline="", encoding="utf-8-sig") as f:
+                writer = csv.writer(f)
+                writer.writerow(COLUMNS)
+                for rows in result.partitions(chunk_size):
+                    writer.writerows(rows)
+                    exported += len(rows)
+    return exported
@@ -0,0 +1,65 @@
+from sqlalchemy import Table, Column, String, BigInteger, event, select, update, insert
+
+# Счетчики версий данных: любая запись в отслеживаемые таблицы увеличивает версию
+# в той же транзакции. Кэши отчетов сравнивают версии (один запрос по первичному ключу)
+# вместо повторного выполнения тяжелых запросов. Запись через ORM-сессию учитывается
+# автоматически (таблицы собираются в after_flush, версии растут в before_commit),
+# set-based запросы должны вызывать bump явно
+
+TRACKED = ("applications", "users")
+
+
+def define_table(metadata):
+    versions = Table(
+        "data_versions", metadata,
+        Column("name", String(50), primary_key=True),
+        Column("version", BigInteger, nullable=False, default=0)
+    )
+
+    # Строки создаются вместе с таблицей, чтобы параллельные bump не вставляли их наперегонки
+    def seed(target, connection, **kw):
+        connection.execute(insert(versions), [{"name": name, "version": 0} for name in TRACKED])
+    event.listen(versions, "after_create", seed)
+    return versions
+
+
+def bump(conn, versions, names):
+    for name in sorted(set(names)):
+        result = conn.execute(update(versions).where(versions.c.name == name).values(version=versions.c.version + 1))
+        if result.rowcount == 0:
+            conn.execute(insert(versions).values(name=name, version=1))
+
+
+def current(conn, versions, names=TRACKED):
+    found = dict(conn.execute(select(versions.c.name, versions.c.version).where(versions.c.name.in_(names))).all())
+    return tuple(found.get(name, 0) for name in names)
+
+
+def track(session_factory, versions, names=TRACKED):
+    def table_name(obj):
+        table = getattr(obj, "__table__", None)
+        return table.name if table is not None else None
+
+    def after_flush(session, flush_context):
+        # Списки new/dirty/deleted здесь еще в состоянии до flush; dirty содержит
+        # и объекты без реальных изменений колонок, их пропускает is_modified
+        changed = {table_name(obj) for obj in (*session.new, *session.deleted)}
+        changed |= {table_name(obj) for obj in session.dirty if session.is_modified(obj)}
+        changed &= set(names)
+        if changed:
+            session.info.setdefault("data_versions_changed", set()).update(changed)
+
+    # Строка счетчика общая для всех писателей: ее блокировка берется непосредственно перед COMMIT,
+    # а не при первом flush, иначе транзакции ждали бы друг друга, пока одна из них занята чем-то еще
+    def before_commit(session):
+        session.flush()
+        changed = session.info.pop("data_versions_changed", None)
+        if changed:
+            bump(session.connection(), versions, changed)
+
+    def after_rollback(session):
+        session.info.pop("data_versions_changed", None)
+
+    event.listen(session_factory, "after_flush", after_flush)
+    event.listen(session_factory, "before_commit", before_commit)
+    event.listen(session_factory, "after_rollback", after_rollback)
@@ -0,0 +1,105 @@
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+import metrics
+
+# Подавление повторов в боте: повторно доставленные обновления Telegram (тот же update_id),
+# двойные нажатия инлайн-кнопок и повторная подача одинаковой заявки отбрасываются
+# до обращения к БД и до сообщения в чат HR. Ключи живут ограниченное время
+# и в ограниченном количестве, поэтому память не растет при долгой работе бота
+
+logger = logging.getLogger(__name__)
+
+SUPPRESSED = metrics.counter("crm_duplicates_suppressed_total", "Отброшенные повторы", ("kind",))
+
+
+class RecentKeys:
+    def __init__(self, ttl, max_entries=100000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    # Проверка и запись одной операцией: из двух параллельных вызовов с одним ключом новым считается только первый
+    def seen(self, key, now=None):
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            while self.entries:
+                oldest_key, added = next(iter(self.entries.items()))
+                if now - added < self.ttl:
+                    break
+                del self.entries[oldest_key]
+            if key in self.entries:
+                return True
+            self.entries[key] = now
+            if len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            return False
+
+    def forget(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def __len__(self):
+        return len(self.entries)
+
+
+def submission_key(*fields):
+    return hashlib.blake2b(repr(fields).encode("utf-8"), digest_size=16).digest()
+
+
+class Deduplicator:
+    def __init__(self, update_ttl=3600, submission_ttl=600, callback_ttl=3, max_entries=100000):
+        self.updates = RecentKeys(update_ttl, max_entries)
+        self.submissions = RecentKeys(submission_ttl, max_entries)
+        self.callbacks = RecentKeys(callback_ttl, max_entries)
+
+    def suppressed(self, kind, **extra):
+        SUPPRESSED.inc(kind=kind)
+        logger.info(f"Отброшен повтор: {kind}", extra=extra)
+
+    def filter_updates(self, updates):
+        fresh = []
+        for update in updates:
+            if self.updates.seen(update.update_id):
+                self.suppressed("update", update_id=update.update_id)
+            else:
+                fresh.append(update)
+        return fresh
+
+    # Повторная подача заявки с тем же содержимым в течение окна
+    def claim_submission(self, chat_id, *fields):
+        key = submission_key(chat_id, *fields)
+        if self.submissions.seen(key):
+            self.suppressed("submission", chat_id=chat_id)
+            return None
+        return key
+
+    # Подача не состоялась (ошибка, нехватка дней): такую же заявку можно отправить сразу
+    def release_submission(self, key):
+        self.submissions.forget(key)
+
+    def claim_callback(self, chat_id, data):
+        if self.callbacks.seen((chat_id, data)):
+            self.suppressed("callback", chat_id=chat_id)
+            return False
+        return True
+
+    def stats(self):
+        return {kind: SUPPRESSED.value(kind=kind) for kind in ("update", "submission", "callback")}
+
+
+# Отбор повторов перед разбором обновлений: действует и для polling, и для вебхука
+def install(bot, deduplicator):
+    process_new_updates = bot.process_new_updates
+
+    def process_fresh_updates(updates):
+        fresh = deduplicator.filter_updates(updates)
+        # Смещение polling сдвигается и за отброшенными, иначе Telegram пришлет их снова
+        for update in updates:
+            if update.update_id > bot.last_update_id:
+                bot.last_update_id = update.update_id
+        process_new_updates(fresh)
+    bot.process_new_updates = process_fresh_updates
@@ -0,0 +1,68 @@
+from enum import IntEnum
+from sqlalchemy import SmallInteger
+from sqlalchemy.types import TypeDecorator
+
+# Статусы и типы заявок хранятся в БД кодами SMALLINT вместо русских строк, которые
+# повторялись в каждой строке applications и в индексах. Подписи для пользователей есть только
+# здесь: str() и f-строки выводят член перечисления подписью, поэтому тексты бота и панели
+# не меняются. Коды записаны в БД - их нельзя менять или переиспользовать, только добавлять
+
+
+class LabeledEnum(IntEnum):
+    def __new__(cls, code, label):
+        member = int.__new__(cls, code)
+        member._value_ = code
+        member.label = label
+        return member
+
+    def __str__(self):
+        return self.label
+
+    def __format__(self, spec):
+        return format(self.label, spec)
+
+    @classmethod
+    def from_label(cls, label):
+        for member in cls:
+            if member.label == label:
+                return member
+        raise ValueError(f"Неизвестное значение {cls.__name__}: {label}")
+
+
+class ApplicationStatus(LabeledEnum):
+    PENDING = 1, "на рассмотрении"
+    APPROVED = 2, "одобрена"
+    REJECTED = 3, "отклонена"
+
+
+class LeaveType(LabeledEnum):
+    SICK = 1, "больничный"
+    ANNUAL_MAIN = 2, "ежегодный основной оплачиваемый"
+    ANNUAL_EXTRA = 3, "ежегодный дополнительный оплачиваемый"
+    UNPAID = 4, "без сохранения заработной платы"
+
+
+# Колонка SMALLINT, которая в Python отдает член перечисления. При записи принимает
+# и член, и код, и подпись - строки из старого кода и конфигурации продолжают работать
+class CodedEnum(TypeDecorator):
+    impl = SmallInteger
+    cache_ok = True
+
+    def __init__(self, enum_cls):
+        super().__init__()
+        self.enum_cls = enum_cls
+        # Вызов enum_cls(code) заметно дороже словаря на каждой прочитанной строке
+        self.by_code = {member.value: member for member in enum_cls}
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        if isinstance(value, str):
+            return int(self.enum_cls.from_label(value))
+        return int(self.enum_cls(value))
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else self.by_code[value]
+
+    def __repr__(self):
+        return f"CodedEnum({self.enum_cls.__name__})"
@@ -0,0 +1,204 @@
+import logging
+from datetime import date, timedelta
+from collections import defaultdict
+from sqlalchemy import Table, Column, Integer, BigInteger, ForeignKey, select, insert, update, and_, text
+from enums import ApplicationStatus, LeaveType, CodedEnum
+
+# Журнал остатков отпуска по (сотрудник, год, тип отпуска). Остаток хранится готовым
+# и меняется в той же транзакции, что и заявка: подача резервирует дни в pending_days,
+# одобрение переносит их в used_days, отклонение и редактирование возвращают.
+# Проверка при подаче - один условный UPDATE по первичному ключу, без просмотра истории.
+# Дни календарные; заявка на стыке лет списывается с каждого года по своей части
+
+logger = logging.getLogger(__name__)
+
+# Годовая норма по умолчанию для новых строк журнала; индивидуальная норма правится в entitled_days.
+# Типы, которых здесь нет (больничный, отпуск без сохранения), не ограничиваются
+DEFAULT_ENTITLEMENTS = {
+    LeaveType.ANNUAL_MAIN: 28,
+    LeaveType.ANNUAL_EXTRA: 3
+}
+
+
+class InsufficientBalance(Exception):
+    def __init__(self, year, requested, remaining):
+        super().__init__(f"Недостаточно дней в {year} году: запрошено {requested}, доступно {remaining}")
+        self.year = year
+        self.requested = requested
+        self.remaining = remaining
+
+
+def define_table(metadata):
+    return Table(
+        "leave_balances", metadata,
+        Column("user_id", BigInteger, ForeignKey("users.user_id", ondelete="CASCADE"), primary_key=True),
+        Column("year", Integer, primary_key=True),
+        Column("leave_type", CodedEnum(LeaveType), primary_key=True),
+        Column("entitled_days", Integer, nullable=False),
+        Column("pending_days", Integer, nullable=False, default=0),
+        Column("used_days", Integer, nullable=False, default=0)
+    )
+
+
+def is_limited(leave_type):
+    return leave_type in DEFAULT_ENTITLEMENTS
+
+
+def days_by_year(start_date, end_date):
+    result = {}
+    while start_date <= end_date:
+        year_end = min(end_date, date(start_date.year, 12, 31))
+        result[start_date.year] = (year_end - start_date).days + 1
+        start_date = year_end + timedelta(days=1)
+    return result
+
+
+def dialect_name(conn):
+    bind = conn.get_bind() if hasattr(conn, "get_bind") else conn
+    return bind.dialect.name
+
+
+def ensure_rows(conn, balances, user_id, leave_type, years):
+    rows = [{"user_id": user_id, "year": year, "leave_type": leave_type, "entitled_days": DEFAULT_ENTITLEMENTS[leave_type],
+             "pending_days": 0, "used_days": 0} for year in years]
+    name = dialect_name(conn)
+    if name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        # СУБД без ON CONFLICT: вставляются только строки, которых нет, в той же транзакции
+        existing = set(conn.execute(
+            select(balances.c.year).where(balances.c.user_id == user_id, balances.c.leave_type == leave_type,
+                                          balances.c.year.in_(list(years)))
+        ).scalars())
+        rows = [row for row in rows if row["year"] not in existing]
+        if rows:
+            conn.execute(insert(balances), rows)
+        return
+    conn.execute(dialect_insert(balances).values(rows).on_conflict_do_nothing())
+
+
+def key_filter(balances, user_id, leave_type, year):
+    return and_(balances.c.user_id == user_id, balances.c.year == year, balances.c.leave_type == leave_type)
+
+
+def remaining(conn, balances, user_id, leave_type, year):
+    if not is_limited(leave_type):
+        return None
+    row = conn.execute(
+        select(balances.c.entitled_days - balances.c.used_days - balances.c.pending_days)
+        .where(key_filter(balances, user_id, leave_type, year))
+    ).scalar()
+    return DEFAULT_ENTITLEMENTS[leave_type] if row is None else row
+
+
+def reserve(conn, balances, user_id, leave_type, start_date, end_date):
+    if not is_limited(leave_type):
+        return
+    parts = days_by_year(start_date, end_date)
+    ensure_rows(conn, balances, user_id, leave_type, parts)
+    for year, days in parts.items():
+        result = conn.execute(
+            update(balances)
+            .where(key_filter(balances, user_id, leave_type, year))
+            .where(balances.c.entitled_days - balances.c.used_days - balances.c.pending_days >= days)
+            .values(pending_days=balances.c.pending_days + days)
+        )
+        if result.rowcount == 0:
+            # Откат уже зарезервированных лет выполняет вызывающий вместе со всей транзакцией
+            raise InsufficientBalance(year, days, remaining(conn, balances, user_id, leave_type, year))
+
+
+# Снятие резерва заявки: при одобрении дни переходят в used_days, при отклонении возвращаются.
+# Если резерв меньше заявки, журнал разошелся с заявками: резерв обнуляется, а не уходит в минус
+def take_pending(conn, balances, user_id, leave_type, start_date, end_date, used):
+    if not is_limited(leave_type):
+        return
+    parts = days_by_year(start_date, end_date)
+    ensure_rows(conn, balances, user_id, leave_type, parts)
+    for year, days in parts.items():
+        key = key_filter(balances, user_id, leave_type, year)
+        values = {"used_days": balances.c.used_days + days} if used else {}
+        result = conn.execute(
+            update(balances)
+            .where(key, balances.c.pending_days >= days)
+            .values(pending_days=balances.c.pending_days - days, **values)
+        )
+        if result.rowcount == 0:
+            logger.warning(f"Резерв сотрудника {user_id} ({leave_type}, {year}) меньше {days} дн.: "
+                           f"журнал остатков расходится с заявками, нужна сверка")
+            conn.execute(update(balances).where(key).values(pending_days=0, **values))
+
+
+def release(conn, balances, user_id, leave_type, start_date, end_date):
+    take_pending(conn, balances, user_id, leave_type, start_date, end_date, used=False)
+
+
+def approve(conn, balances, user_id, leave_type, start_date, end_date):
+    take_pending(conn, balances, user_id, leave_type, start_date, end_date, used=True)
+
+
+def lock_balances(conn, balances):
+    if dialect_name(conn) == "postgresql":
+        # Блокировка таблицы, а не строк: подача заявки может вставить строку, которой еще нет
+        conn.execute(text(f"LOCK TABLE {balances.name} IN EXCLUSIVE MODE"))
+    else:
+        conn.execute(select(balances.c.user_id).with_for_update()).all()
+
+
+# Сверка: журнал пересчитывается по заявкам, нормы (entitled_days) сохраняются.
+# Возвращает список расхождений (ключ, было, стало) до исправления.
+# Журнал блокируется до чтения заявок: резерв, записанный параллельно, либо закоммичен раньше
+# и виден в заявках, либо ждет конца сверки и ложится поверх пересчитанных значений
+def rebuild(conn, balances, applications, pending_status, approved_status):
+    lock_balances(conn, balances)
+    actual = {
+        (row.user_id, row.year, row.leave_type): [row.pending_days, row.used_days]
+        for row in conn.execute(select(balances))
+    }
+    apps = applications.c
+    query = select(apps.user_id, apps.type, apps.start_date, apps.end_date, apps.status).where(
+        apps.type.in_(list(DEFAULT_ENTITLEMENTS)),
+        apps.status.in_([pending_status, approved_status])
+    )
+    expected = defaultdict(lambda: [0, 0])
+    for user_id, leave_type, start_date, end_date, status in conn.execute(query):
+        for year, days in days_by_year(start_date, end_date).items():
+            expected[(user_id, year, leave_type)][0 if status == pending_status else 1] += days
+
+    discrepancies = []
+    for key in set(expected) | set(actual):
+        was, now = actual.get(key, [0, 0]), expected.get(key, [0, 0])
+        if was == now:
+            continue
+        discrepancies.append((key, tuple(was), tuple(now)))
+        user_id, year, leave_type = key
+        if key not in actual:
+            ensure_rows(conn, balances, user_id, leave_type, [year])
+        conn.execute(
+            update(balances)
+            .where(key_filter(balances, user_id, leave_type, year))
+            .values(pending_days=now[0], used_days=now[1])
+        )
+    logger.info(f"Сверка остатков отпусков: исправлено строк {len(discrepancies)}")
+    return sorted(discrepancies)
+
+
+# Сверка при старте бота и панели, когда схема БД новая или изменилась - в том числе при первом
+# запуске с журналом: заявки, поданные до его появления, попадают в резерв до одобрения или отклонения
+def rebuild_on_start(engine, balances, applications):
+    with engine.begin() as conn:
+        return rebuild(conn, balances, applications, ApplicationStatus.PENDING, ApplicationStatus.APPROVED)
+
+
+# Плановая сверка без GUI: python leave_balance.py
+if __name__ == "__main__":
+    import tgbot
+    import log_pipeline
+    log_pipeline.setup_logging("leave_balance.log")
+    tgbot.init_db()
+    with tgbot.engine.begin() as conn:
+        for key, was, now in rebuild(conn, tgbot.leave_balances, tgbot.all_applications,
+                                     ApplicationStatus.PENDING, ApplicationStatus.APPROVED):
+            print(f"{key}: было {was}, стало {now}")
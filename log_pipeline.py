@@ -0,0 +1,145 @@
+import json
+import queue
+import atexit
+import random
+import logging
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
+import metrics
+
+# Неблокирующее логирование: обработчики только кладут запись в очередь,
+# а форматирование в JSON и запись на диск с ротацией выполняет фоновый поток
+
+# Стандартные атрибуты LogRecord; все остальные (переданные через extra) попадают в JSON как поля
+RESERVED_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+DROPPED = metrics.counter("crm_log_records_dropped_total", "Записи лога, отброшенные из-за переполнения очереди")
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        for key, value in vars(record).items():
+            if key not in RESERVED_ATTRS and value is not None:
+                entry[key] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+# Подставляет имя текущего обработчика, если оно не передано явно
+class ContextFilter(logging.Filter):
+    def filter(self, record):
+        if getattr(record, "handler", None) is None:
+            handler = metrics.current_handler.get()
+            if handler != "-":
+                record.handler = handler
+        return True
+
+
+# Сэмплирование по имени логгера: {"crm.handlers": 0.1} оставляет 10% записей ниже WARNING
+class SamplingFilter(logging.Filter):
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = dict(rates)
+        self.resolved = {}
+
+    def rate_for(self, name):
+        rate = self.resolved.get(name)
+        if rate is None:
+            prefixes = [prefix for prefix in self.rates if name == prefix or name.startswith(prefix + ".")]
+            rate = self.rates[max(prefixes, key=len)] if prefixes else 1.0
+            self.resolved[name] = rate
+        return rate
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rate_for(record.name)
+        return rate >= 1 or random.random() < rate
+
+
+# При переполнении очереди запись отбрасывается, а не блокирует обработчик.
+# Запись не копируется и не форматируется в вызывающем потоке: достаточно
+# собрать текст сообщения и трассировку, остальное сделает фоновый поток
+class DroppingQueueHandler(QueueHandler):
+    def prepare(self, record):
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            DROPPED.inc()
+
+
+# Файловые обработчики не сбрасывают буфер после каждой записи:
+# это делает слушатель, когда очередь опустела
+class DeferredFlushMixin:
+    def flush(self):
+        pass
+
+    def flush_batch(self):
+        logging.StreamHandler.flush(self)
+
+
+class JsonRotatingFileHandler(DeferredFlushMixin, RotatingFileHandler):
+    pass
+
+
+class JsonTimedRotatingFileHandler(DeferredFlushMixin, TimedRotatingFileHandler):
+    pass
+
+
+class BatchingQueueListener(QueueListener):
+    def handle(self, record):
+        super().handle(record)
+        if self.queue.empty():
+            for handler in self.handlers:
+                handler.flush_batch()
+
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+    def stop(self):
+        if self._thread is None:
+            return
+        super().stop()
+        for handler in self.handlers:
+            handler.flush_batch()
+
+
+def setup_logging(filename, level=logging.INFO, max_bytes=10 * 1024 * 1024, backup_count=5,
+                  when=None, sampling=None, queue_size=10000):
+    if when:
+        file_handler = JsonTimedRotatingFileHandler(filename, when=when, backupCount=backup_count, encoding="utf-8")
+    else:
+        file_handler = JsonRotatingFileHandler(filename, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+    file_handler.setFormatter(JsonFormatter())
+
+    log_queue = queue.Queue(queue_size)
+    queue_handler = DroppingQueueHandler(log_queue)
+    queue_handler.addFilter(ContextFilter())
+    if sampling:
+        queue_handler.addFilter(SamplingFilter(sampling))
+
+    root = logging.getLogger()
+    for old_handler in root.handlers[:]:
+        root.removeHandler(old_handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    listener = BatchingQueueListener(log_queue, file_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
@@ -0,0 +1,227 @@
+import os
+import time
+import logging
+import threading
+import functools
+import contextvars
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from sqlalchemy import event
+
+# Метрики в формате Prometheus для бота и админ-панели: длительность обработчиков,
+# число и время запросов к БД, задержка вызовов Telegram API
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Имя выполняющегося обработчика: к нему привязываются запросы к БД
+current_handler = contextvars.ContextVar("current_handler", default="-")
+
+
+def format_labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{value}"' for name, value in zip(names, values))
+    return f"{{{pairs}}}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def value(self, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labels)
+        with self.lock:
+            return self.values.get(key, 0)
+
+    def total(self):
+        with self.lock:
+            return sum(self.values.values())
+
+    def samples(self):
+        with self.lock:
+            items = sorted(self.values.items())
+        return [f"{self.name}{format_labels(self.labels, key)} {value}" for key, value in items]
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labels)
+        with self.lock:
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def samples(self):
+        with self.lock:
+            items = sorted((key, (list(state[0]), state[1], state[2])) for key, state in self.values.items())
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = format_labels(self.labels + ("le",), key + (bound,))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_bucket{format_labels(self.labels + ('le',), key + ('+Inf',))} {count}")
+            lines.append(f"{self.name}_sum{format_labels(self.labels, key)} {total}")
+            lines.append(f"{self.name}_count{format_labels(self.labels, key)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def register(self, metric):
+        with self.lock:
+            return self.metrics.setdefault(metric.name, metric)
+
+    def render(self):
+        with self.lock:
+            metrics = list(self.metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name, help_text, labels=()):
+    return REGISTRY.register(Counter(name, help_text, labels))
+
+
+def histogram(name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+    return REGISTRY.register(Histogram(name, help_text, labels, buckets))
+
+
+HANDLER_SECONDS = histogram("crm_handler_duration_seconds", "Длительность обработчиков", ("handler",))
+HANDLER_ERRORS = counter("crm_handler_errors_total", "Исключения в обработчиках", ("handler",))
+DB_QUERIES = counter("crm_db_queries_total", "Число запросов к БД", ("handler",))
+DB_SECONDS = histogram("crm_db_query_duration_seconds", "Длительность запросов к БД", ("handler",))
+TELEGRAM_SECONDS = histogram("crm_telegram_api_duration_seconds", "Длительность вызовов Telegram API", ("method",))
+
+handler_logger = logging.getLogger("crm.handlers")
+
+# Обертка вызова обработчика на время профилирования (profiling.py): hook(func, args, kwargs)
+call_hook = None
+
+
+# Декоратор для обработчиков бота и методов админ-панели
+def timed(func):
+    name = func.__name__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        token = current_handler.set(name)
+        started = time.perf_counter()
+        try:
+            hook = call_hook
+            return func(*args, **kwargs) if hook is None else hook(func, args, kwargs)
+        except Exception:
+            HANDLER_ERRORS.inc(handler=name)
+            raise
+        finally:
+            duration = time.perf_counter() - started
+            HANDLER_SECONDS.observe(duration, handler=name)
+            handler_logger.info("Обработчик выполнен", extra={"handler": name, "duration": round(duration, 6)})
+            current_handler.reset(token)
+    return wrapper
+
+
+@contextmanager
+def telegram_call(method):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        TELEGRAM_SECONDS.observe(time.perf_counter() - started, method=method)
+
+
+def instrument_engine(engine):
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_started"].pop()
+        handler = current_handler.get()
+        DB_QUERIES.inc(handler=handler)
+        DB_SECONDS.observe(time.perf_counter() - started, handler=handler)
+
+    def handle_error(context):
+        if context.connection is not None and context.connection.info.get("query_started"):
+            context.connection.info["query_started"].pop()
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", after_cursor_execute)
+    event.listen(engine, "handle_error", handle_error)
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port, host="127.0.0.1"):
+    server = ThreadingHTTPServer((host, port), MetricsRequestHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+def dump(path):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(REGISTRY.render())
+    os.replace(tmp_path, path)
+
+
+def start_dump(path, interval=60):
+    stop = threading.Event()
+
+    def loop():
+        while not stop.wait(interval):
+            dump(path)
+        dump(path)
+    threading.Thread(target=loop, name="metrics-dump", daemon=True).start()
+    return stop
@@ -0,0 +1,13 @@
+-- Исполнитель действий админ-панели в отдельной колонке logs.actor_id без внешнего ключа.
+-- Раньше записи аудита (удаление сотрудников, импорт, сверка, пакет отчетов) писались
+-- с user_id = ADMIN_ID: без такого пользователя в users вставка нарушала внешний ключ
+-- и удаление сотрудника откатывалось целиком, а записи терялись вместе с учетной записью
+-- администратора (ON DELETE CASCADE). Теперь у таких записей user_id пуст.
+-- Миграция не зависит от остальных и применяется к любой версии схемы.
+
+BEGIN;
+
+ALTER TABLE logs ALTER COLUMN user_id DROP NOT NULL;
+ALTER TABLE logs ADD COLUMN actor_id BIGINT;
+
+COMMIT;
@@ -0,0 +1,8 @@
+-- Отпечатки схемы, уже проверенной ботом или админ-панелью при старте (schema_state.py).
+-- Отпечаток записывается, только когда все таблицы и колонки моделей есть в БД,
+-- поэтому таблицу можно создать заранее или оставить ее создание приложению.
+
+CREATE TABLE IF NOT EXISTS schema_state (
+    fingerprint VARCHAR(40) PRIMARY KEY,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
@@ -0,0 +1,20 @@
+-- Журнал остатков отпуска по (сотрудник, год, тип отпуска), см. leave_balance.py.
+-- leave_type здесь текстовый, как в версии кода этой миграции; 040 переводит его на коды SMALLINT.
+-- Остатки по уже поданным заявкам заполняет сверка (leave_balance.rebuild): бот и админ-панель
+-- выполняют ее сами при первом старте после изменения схемы, вручную - python leave_balance.py.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS leave_balances (
+    user_id BIGINT NOT NULL,
+    year INTEGER NOT NULL,
+    leave_type VARCHAR(100) NOT NULL,
+    entitled_days INTEGER NOT NULL,
+    pending_days INTEGER NOT NULL DEFAULT 0,
+    used_days INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, year, leave_type),
+    CONSTRAINT leave_balances_user_id_fkey
+        FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
+);
+
+COMMIT;
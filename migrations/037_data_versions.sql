@@ -0,0 +1,14 @@
+-- Счетчики версий данных для кэшей отчетов и списков (data_version.py). Строки создаются
+-- заранее, чтобы параллельные транзакции только обновляли их и не вставляли наперегонки.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS data_versions (
+    name VARCHAR(50) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0
+);
+
+INSERT INTO data_versions (name, version) VALUES ('applications', 0), ('users', 0)
+ON CONFLICT (name) DO NOTHING;
+
+COMMIT;
@@ -0,0 +1,39 @@
+-- Перевод applications.status, applications.type и leave_balances.leave_type на коды SMALLINT.
+-- Коды совпадают с enums.py. Перед запуском остановить бота, админ-панель и report_scheduler.py.
+-- Значение, которого нет в перечислении, дает NULL, миграция падает на NOT NULL и откатывается;
+-- проверить заранее:
+--   SELECT status, count(*) FROM applications GROUP BY status;
+--   SELECT type, count(*) FROM applications GROUP BY type;
+-- ALTER COLUMN TYPE переписывает таблицы целиком и держит на них эксклюзивную блокировку.
+-- Локальные снимки админ-панели (OFFLINE_SNAPSHOT) пересоздаются сами при следующем запуске.
+
+BEGIN;
+
+ALTER TABLE applications
+    ALTER COLUMN status TYPE SMALLINT USING CASE status
+        WHEN 'на рассмотрении' THEN 1
+        WHEN 'одобрена' THEN 2
+        WHEN 'отклонена' THEN 3
+    END,
+    ALTER COLUMN type TYPE SMALLINT USING CASE type
+        WHEN 'больничный' THEN 1
+        WHEN 'ежегодный основной оплачиваемый' THEN 2
+        WHEN 'ежегодный дополнительный оплачиваемый' THEN 3
+        WHEN 'без сохранения заработной платы' THEN 4
+    END;
+
+ALTER TABLE leave_balances
+    ALTER COLUMN leave_type TYPE SMALLINT USING CASE leave_type
+        WHEN 'больничный' THEN 1
+        WHEN 'ежегодный основной оплачиваемый' THEN 2
+        WHEN 'ежегодный дополнительный оплачиваемый' THEN 3
+        WHEN 'без сохранения заработной платы' THEN 4
+    END;
+
+-- Кэши отчетов сравнивают версии данных: после миграции они должны перестроиться
+UPDATE data_versions SET version = version + 1;
+
+COMMIT;
+
+ANALYZE applications;
+ANALYZE leave_balances;
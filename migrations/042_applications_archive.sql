@@ -0,0 +1,23 @@
+-- Таблица архива рассмотренных заявок. Перенос выполняет archive.py по расписанию
+-- (например, cron: 0 3 * * * python archive.py); первый запуск на большой таблице
+-- идет пачками по 5000 строк и не блокирует бота и админ-панель надолго.
+-- После первого переноса рабочую таблицу стоит сжать: VACUUM (ANALYZE) applications;
+-- Бот и админ-панель при старте создают недостающие таблицы сами (create_all), поэтому
+-- к уже запущенной с новым кодом БД миграция применяется без ошибки и ничего не меняет.
+
+CREATE TABLE IF NOT EXISTS applications_archive (
+    application_id INTEGER PRIMARY KEY,
+    user_id BIGINT NOT NULL,
+    start_date DATE NOT NULL,
+    end_date DATE NOT NULL,
+    type SMALLINT NOT NULL,
+    status SMALLINT NOT NULL,
+    reason TEXT,
+    created_at TIMESTAMP,
+    updated_at TIMESTAMP,
+    archived_at TIMESTAMP NOT NULL,
+    CONSTRAINT applications_archive_user_id_fkey
+        FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
+);
+
+CREATE INDEX IF NOT EXISTS applications_archive_user_id_idx ON applications_archive (user_id);
@@ -0,0 +1,16 @@
+-- Версии строк users и applications для оптимистичной блокировки: бот и админ-панель
+-- обновляют строку с условием WHERE version = <прочитанная версия> и увеличивают ее,
+-- при нуле измененных строк администратор видит конфликт вместо молчаливой перезаписи.
+-- В архиве колонка нужна для одинаковой структуры таблиц в UNION ALL.
+-- ADD COLUMN с константным DEFAULT в PostgreSQL 11+ не переписывает таблицы.
+-- Перед запуском остановить бота и админ-панель: их старые версии
+-- обновляют строки без увеличения version. Локальные снимки админ-панели пересоздаются сами.
+
+BEGIN;
+
+ALTER TABLE users ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1;
+ALTER TABLE applications ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1;
+-- Архив, созданный приложением уже с новым кодом, получил колонку при создании
+ALTER TABLE applications_archive ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1;
+
+COMMIT;
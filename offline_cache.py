@@ -0,0 +1,174 @@
+import time
+import logging
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine, event, select, delete, MetaData, Table, Column, String
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import sessionmaker
+import metrics
+import schema_state
+
+# Локальный снимок users, applications с архивом и свежих logs в SQLite для филиалов с медленным
+# каналом до центральной БД. Разделы только для чтения открываются из снимка,
+# изменения по-прежнему идут в основную БД. Снимок догоняется в фоне:
+#   users        - полностью (таблица небольшая и без updated_at);
+#   applications - по водяному знаку updated_at с перекрытием на расхождение часов клиентов;
+#   applications_archive - по водяному знаку archived_at, перенесенные заявки убираются из applications;
+#   logs         - по водяному знаку log_id, только за последние log_days дней
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_TABLES = ("users", "applications", "applications_archive", "logs")
+
+SYNCED_ROWS = metrics.counter("crm_offline_sync_rows_total", "Строки, загруженные в локальный снимок", ("table",))
+
+state_metadata = MetaData()
+sync_state = Table(
+    "sync_state", state_metadata,
+    Column("name", String(50), primary_key=True),
+    Column("value", String(50))
+)
+
+
+def upsert(table, rows):
+    stmt = insert(table).values(rows)
+    key = [column.name for column in table.primary_key]
+    return stmt.on_conflict_do_update(
+        index_elements=key,
+        set_={column.name: stmt.excluded[column.name] for column in table.columns if column.name not in key}
+    )
+
+
+class OfflineSnapshot:
+    def __init__(self, path, primary, metadata, log_days=30, overlap=timedelta(minutes=5), log_overlap=500,
+                 batch_size=1000):
+        self.primary = primary
+        self.tables = metadata.tables
+        self.log_days = log_days
+        self.overlap = overlap
+        self.log_overlap = log_overlap
+        self.batch_size = batch_size
+        self.engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False, "timeout": 30})
+        event.listen(self.engine, "connect", self.configure_connection)
+        state_metadata.create_all(self.engine)
+        self.ensure_schema(metadata, [self.tables[name] for name in SNAPSHOT_TABLES])
+        self.SessionFactory = sessionmaker(bind=self.engine)
+        self.last_synced = self.load_state().get("synced_at")
+        self.stop_event = threading.Event()
+        self.wake = threading.Event()
+        self.thread = None
+
+    @staticmethod
+    def configure_connection(dbapi_connection, connection_record):
+        # WAL: чтение страниц из GUI не ждет фоновую синхронизацию
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.close()
+
+    # Снимок прежней схемы (например, со строковыми статусами до перехода на коды)
+    # не догнать по водяным знакам, поэтому он пересоздается и загружается заново
+    def ensure_schema(self, metadata, tables):
+        fingerprint = schema_state.schema_fingerprint(metadata, tables)
+        if self.load_state().get("schema") == fingerprint:
+            return
+        metadata.drop_all(self.engine, tables=tables)
+        metadata.create_all(self.engine, tables=tables)
+        with self.engine.begin() as conn:
+            conn.execute(delete(sync_state))
+            conn.execute(upsert(sync_state, [{"name": "schema", "value": fingerprint}]))
+
+    @property
+    def ready(self):
+        return self.last_synced is not None
+
+    def load_state(self):
+        with self.engine.connect() as conn:
+            return dict(conn.execute(select(sync_state.c.name, sync_state.c.value)).all())
+
+    def copy(self, src, dst, table, query):
+        count = 0
+        result = src.execution_options(stream_results=True).execute(query)
+        for rows in result.mappings().partitions(self.batch_size):
+            dst.execute(upsert(table, [dict(row) for row in rows]))
+            count += len(rows)
+        SYNCED_ROWS.inc(count, table=table.name)
+        return count
+
+    def sync(self):
+        users, applications, archived, logs = (self.tables[name] for name in SNAPSHOT_TABLES)
+        state = self.load_state()
+        started = time.perf_counter()
+        with self.primary.connect() as src, self.engine.begin() as dst:
+            # Пользователи перезаливаются целиком; заявки и логи удаленных сотрудников вычищаются следом
+            dst.execute(delete(users))
+            counts = {"users": self.copy(src, dst, users, select(users))}
+            dst.execute(delete(applications).where(applications.c.user_id.not_in(select(users.c.user_id))))
+
+            query = select(applications)
+            watermark = state.get("applications_updated_at")
+            if watermark:
+                query = query.where(applications.c.updated_at >= datetime.fromisoformat(watermark) - self.overlap)
+            counts["applications"] = self.copy(src, dst, applications, query)
+            latest = dst.execute(select(applications.c.updated_at).order_by(applications.c.updated_at.desc()).limit(1)).scalar()
+
+            query = select(archived)
+            archive_watermark = state.get("archive_archived_at")
+            if archive_watermark:
+                query = query.where(archived.c.archived_at >= datetime.fromisoformat(archive_watermark) - self.overlap)
+            counts["applications_archive"] = self.copy(src, dst, archived, query)
+            dst.execute(delete(archived).where(archived.c.user_id.not_in(select(users.c.user_id))))
+            dst.execute(delete(applications).where(applications.c.application_id.in_(select(archived.c.application_id))))
+            latest_archived = dst.execute(select(archived.c.archived_at).order_by(archived.c.archived_at.desc()).limit(1)).scalar()
+
+            since = datetime.utcnow() - timedelta(days=self.log_days)
+            query = select(logs).where(logs.c.timestamp >= since)
+            log_watermark = state.get("logs_log_id")
+            if log_watermark:
+                # Транзакции фиксируются не в порядке выдачи log_id, поэтому хвост перечитывается
+                query = query.where(logs.c.log_id > int(log_watermark) - self.log_overlap)
+            counts["logs"] = self.copy(src, dst, logs, query)
+            # Записи администратора без сотрудника (user_id пуст) остаются до истечения срока
+            dst.execute(delete(logs).where((logs.c.timestamp < since) | (logs.c.user_id.is_not(None) &
+                                                                         logs.c.user_id.not_in(select(users.c.user_id)))))
+            last_log_id = dst.execute(select(logs.c.log_id).order_by(logs.c.log_id.desc()).limit(1)).scalar()
+
+            synced_at = datetime.now().isoformat(timespec="seconds")
+            new_state = {"synced_at": synced_at}
+            if latest:
+                new_state["applications_updated_at"] = latest.isoformat()
+            if latest_archived:
+                new_state["archive_archived_at"] = latest_archived.isoformat()
+            if last_log_id is not None:
+                new_state["logs_log_id"] = str(max(last_log_id, int(log_watermark or 0)))
+            dst.execute(upsert(sync_state, [{"name": name, "value": value} for name, value in new_state.items()]))
+        self.last_synced = synced_at
+        logger.info(f"Снимок синхронизирован за {time.perf_counter() - started:.2f} с: {counts}")
+        return counts
+
+    def start(self, interval=30, on_sync=None, on_error=None):
+        def loop():
+            while not self.stop_event.is_set():
+                try:
+                    counts = self.sync()
+                    if on_sync:
+                        on_sync(counts)
+                except Exception as e:
+                    logger.warning(f"Синхронизация снимка не удалась: {e}")
+                    if on_error:
+                        on_error(e)
+                self.wake.wait(interval)
+                self.wake.clear()
+        self.thread = threading.Thread(target=loop, name="offline-sync", daemon=True)
+        self.thread.start()
+
+    # Внеочередная синхронизация, например после изменения данных из панели
+    def request_sync(self):
+        self.wake.set()
+
+    def stop(self):
+        self.stop_event.set()
+        self.wake.set()
+        if self.thread:
+            self.thread.join(timeout=5)
+        self.engine.dispose()
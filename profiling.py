@@ -0,0 +1,226 @@
+import io
+import os
+import sys
+import time
+import pstats
+import cProfile
+import logging
+import threading
+from collections import Counter
+from datetime import datetime
+from sqlalchemy import event
+import metrics
+
+# Профилирование по запросу в работающих боте и админ-панели, без перезапуска:
+#   sampling - фоновый поток раз в interval снимает стеки всех потоков (sys._current_frames)
+#              и пишет их в свернутом виде (*.folded): flamegraph.pl, speedscope, inferno;
+#   cprofile - точные счетчики вызовов (*.pstats: snakeviz, gprof2dot, pstats). До Python 3.12 cProfile
+#              работает в пределах потока, поэтому профилируются вызовы обработчиков с metrics.timed
+#              в любых потоках и, при thread_wide, весь поток, запустивший съемку (поток GUI).
+#              С 3.12 cProfile построен на sys.monitoring: активен один профиль на процесс, зато он
+#              видит все потоки - включается один общий профиль на время съемки.
+# Отдельно - журнал медленных SQL-запросов через события курсора SQLAlchemy
+
+logger = logging.getLogger(__name__)
+
+MODES = ("sampling", "cprofile")
+PROCESS_WIDE_CPROFILE = sys.version_info >= (3, 12)
+
+
+def frame_label(frame):
+    code = frame.f_code
+    # ";" разделяет кадры в свернутом формате
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ",")
+
+
+class SamplingCapture:
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="profiling-sampler", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def run(self):
+        own = threading.get_ident()
+        while not self.stop_event.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(frame_label(frame))
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)).replace(";", ","))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+
+    def write(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        return True
+
+    # Функции, чаще всего оказывавшиеся на вершине стека
+    def summary(self, limit):
+        leaves = Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        lines = [f"Снимков стеков: {self.samples}, интервал {self.interval * 1000:.0f} мс"]
+        lines += [f"{count:>7}  {label}" for label, count in leaves.most_common(limit)]
+        return "\n".join(lines)
+
+
+class CProfileCapture:
+    def __init__(self, thread_wide=False):
+        self.thread_wide = thread_wide
+        self.owner = None
+        self.owner_profile = None
+        self.profiles = []
+        self.calls = threading.local()
+        self.lock = threading.Lock()
+        self.active = False
+
+    def start(self):
+        if PROCESS_WIDE_CPROFILE or self.thread_wide:
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError as e:
+                # Уже активен другой профилировщик (отладчик, coverage, внешний cProfile)
+                raise RuntimeError(f"cProfile недоступен: {e}") from e
+            self.owner = threading.get_ident()
+            self.owner_profile = profile
+        self.active = True
+        if not PROCESS_WIDE_CPROFILE:
+            metrics.call_hook = self.call
+
+    # Вызов обработчика под отдельным профилем; вложенные вызовы в том же потоке уже внутри него.
+    # Если профиль не включился, обработчик выполняется без профилирования: съемка не должна ронять запрос
+    def call(self, func, args, kwargs):
+        if not self.active or threading.get_ident() == self.owner or getattr(self.calls, "depth", 0):
+            return func(*args, **kwargs)
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError as e:
+            logger.warning(f"Вызов {getattr(func, '__name__', func)} не профилируется: {e}")
+            return func(*args, **kwargs)
+        self.calls.depth = 1
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profile.disable()
+            self.calls.depth = 0
+            with self.lock:
+                if self.active:
+                    self.profiles.append(profile)
+
+    # До 3.12 при thread_wide вызывается из потока, запустившего съемку: cProfile отключается только в своем потоке
+    def stop(self):
+        if metrics.call_hook == self.call:
+            metrics.call_hook = None
+        with self.lock:
+            self.active = False
+        if self.owner_profile is not None:
+            self.owner_profile.disable()
+            self.profiles.append(self.owner_profile)
+
+    def stats(self):
+        if not self.profiles:
+            return None
+        stats = pstats.Stats(self.profiles[0], stream=io.StringIO())
+        for profile in self.profiles[1:]:
+            stats.add(profile)
+        return stats
+
+    def write(self, path):
+        stats = self.stats()
+        if stats is None:
+            return False
+        stats.dump_stats(path)
+        return True
+
+    def summary(self, limit):
+        stats = self.stats()
+        if stats is None:
+            return "За время съемки профилируемых вызовов не было"
+        stats.stream = io.StringIO()
+        stats.sort_stats("cumulative").print_stats(limit)
+        return stats.stream.getvalue().strip()
+
+
+class Profiler:
+    def __init__(self, directory, prefix, sample_interval=0.005):
+        self.directory = directory
+        self.prefix = prefix
+        self.sample_interval = sample_interval
+        self.capture = None
+        self.mode = None
+        self.started = None
+        self.lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self.capture is not None
+
+    def start(self, mode, thread_wide=False):
+        if mode not in MODES:
+            raise ValueError(f"Неизвестный режим профилирования: {mode}")
+        with self.lock:
+            if self.capture is not None:
+                raise RuntimeError("Профилирование уже запущено")
+            if mode == "sampling":
+                capture = SamplingCapture(self.sample_interval)
+            else:
+                capture = CProfileCapture(thread_wide)
+            capture.start()
+            self.capture, self.mode, self.started = capture, mode, time.perf_counter()
+        logger.warning(f"Профилирование запущено: {mode}")
+
+    # (путь к файлу или None, если писать нечего; краткая сводка) или None, если съемка не шла
+    def stop(self, limit=15):
+        with self.lock:
+            capture, mode, started = self.capture, self.mode, self.started
+            if capture is None:
+                return None
+            self.capture = None
+        capture.stop()
+        os.makedirs(self.directory, exist_ok=True)
+        extension = "folded" if mode == "sampling" else "pstats"
+        path = os.path.join(self.directory, f"{self.prefix}_{datetime.now():%Y%m%d_%H%M%S_%f}_{mode}.{extension}")
+        if not capture.write(path):
+            path = None
+        duration = time.perf_counter() - started
+        logger.warning(f"Профилирование остановлено через {duration:.1f} с: {path}")
+        return path, f"{mode}, {duration:.1f} с\n{capture.summary(limit)}"
+
+
+# Запросы дольше threshold секунд пишутся в журнал с текстом SQL и обработчиком, который их выполнил
+def log_slow_queries(engine, threshold):
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("slow_query_started", []).append(time.perf_counter())
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        duration = time.perf_counter() - conn.info["slow_query_started"].pop()
+        if duration >= threshold:
+            # Параметры не пишутся: в них персональные данные сотрудников
+            logger.warning(f"Медленный запрос {duration * 1000:.0f} мс: {' '.join(statement.split())[:2000]}",
+                           extra={"handler": metrics.current_handler.get(), "duration": round(duration, 6),
+                                  "executemany": executemany})
+
+    def handle_error(context):
+        if context.connection is not None and context.connection.info.get("slow_query_started"):
+            context.connection.info["slow_query_started"].pop()
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", after_cursor_execute)
+    event.listen(engine, "handle_error", handle_error)
@@ -0,0 +1,99 @@
+import os
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+# Кэш отчетов по ключу (отчет, параметры). Результат запроса хранится в памяти вместе
+# с версиями данных, на которых он получен; готовые PDF лежат на диске с вытеснением
+# давно не использованных файлов при превышении лимита размера каталога
+
+logger = logging.getLogger(__name__)
+
+
+class ReportCache:
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, versions):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] == versions:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+
+    def put(self, key, versions, result):
+        with self.lock:
+            self.entries[key] = (versions, result)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def get_or_compute(self, key, versions, compute):
+        result = self.get(key, versions)
+        if result is None:
+            result = compute()
+            self.put(key, versions, result)
+        return result
+
+
+# Время последнего использования файла - mtime, поэтому порядок LRU переживает перезапуск
+class PdfCache:
+    def __init__(self, directory, max_bytes=100 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key, versions):
+        digest = hashlib.sha1(repr((key, versions)).encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{digest}.pdf")
+
+    def get(self, key, versions):
+        path = self.path(key, versions)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        os.utime(path)
+        return data
+
+    def put(self, key, versions, data):
+        path = self.path(key, versions)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def evict(self):
+        with self.lock:
+            files = []
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith(".pdf"):
+                    stat = entry.stat()
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+            total = sum(size for _, size, _ in files)
+            for _, size, path in sorted(files):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError as e:
+                    logger.warning(f"Не удалось удалить {path} из кэша отчетов: {e}")
+
+    def get_or_render(self, key, versions, render):
+        data = self.get(key, versions)
+        if data is None:
+            data = render()
+            self.put(key, versions, data)
+        return data
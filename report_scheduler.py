@@ -0,0 +1,315 @@
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import threading
+import traceback
+from datetime import datetime, date, timedelta
+from concurrent.futures import ProcessPoolExecutor
+from sqlalchemy import create_engine, inspect, MetaData, Table, Column
+import reports
+import data_version
+import archive
+from enums import ApplicationStatus, LeaveType, CodedEnum
+
+# Планировщик отчетов без GUI: по расписанию в формате cron строит PDF в каталог отчетов,
+# задания выполняются параллельно в пуле процессов. Результаты и длительность запусков
+# пишутся в index.json, откуда админ-панель берет последний готовый файл.
+#
+#   python report_scheduler.py            # работа по расписанию
+#   python report_scheduler.py --once     # выполнить все задания сейчас и выйти
+#   python report_scheduler.py --list     # ближайшие запуски
+
+CONFIG = {
+    "DB_URL": os.environ.get("DB_URL", ""),
+    "REPORTS_DIR": os.environ.get("REPORTS_DIR", "scheduled_reports"),
+    "WORKERS": 2,
+    # Сколько последних файлов каждого задания хранить
+    "KEEP_FILES": 5,
+    # Сколько последних длительностей хранить для оценки времени выполнения
+    "KEEP_DURATIONS": 20,
+    # report - имя функции из reports.py; относительные параметры вычисляются в момент запуска
+    "JOBS": [
+        {"name": "weekly_period", "schedule": "0 6 * * 1", "report": "applications_period",
+         "params": {"period": "previous_week"}},
+        {"name": "monthly_period", "schedule": "0 5 1 * *", "report": "applications_period",
+         "params": {"period": "previous_month"}},
+        {"name": "departments_year", "schedule": "30 6 * * 1", "report": "duration_departments",
+         "params": {"year": "current"}}
+    ]
+}
+
+INDEX_FILE = "index.json"
+
+logger = logging.getLogger(__name__)
+
+
+# Поле cron: *, число, список через запятую, диапазон a-b, шаг */n или a-b/n
+def parse_field(field, low, high):
+    values = set()
+    for part in field.split(","):
+        step = 1
+        if "/" in part:
+            part, step = part.split("/")
+            step = int(step)
+        if part == "*":
+            start, end = low, high
+        elif "-" in part:
+            start, end = map(int, part.split("-"))
+        else:
+            start = end = int(part)
+        if start < low or end > high or start > end or step < 1:
+            raise ValueError(f"Недопустимое значение поля cron: {field}")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class CronSchedule:
+    def __init__(self, expression):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Ожидается 5 полей cron: {expression}")
+        self.expression = expression
+        self.minutes = parse_field(fields[0], 0, 59)
+        self.hours = parse_field(fields[1], 0, 23)
+        self.days = parse_field(fields[2], 1, 31)
+        self.months = parse_field(fields[3], 1, 12)
+        # 0 и 7 - воскресенье
+        self.weekdays = {day % 7 for day in parse_field(fields[4], 0, 7)}
+        self.any_day = fields[2] == "*"
+        self.any_weekday = fields[4] == "*"
+
+    def day_matches(self, moment):
+        in_days = moment.day in self.days
+        in_weekdays = (moment.isoweekday() % 7) in self.weekdays
+        # Как в cron: если ограничены и число, и день недели, достаточно одного совпадения
+        if not self.any_day and not self.any_weekday:
+            return in_days or in_weekdays
+        return in_days and in_weekdays
+
+    def matches(self, moment):
+        return (moment.minute in self.minutes and moment.hour in self.hours
+                and moment.month in self.months and self.day_matches(moment))
+
+    def next_after(self, moment):
+        moment = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = moment + timedelta(days=366 * 4)
+        while moment < limit:
+            if moment.month not in self.months or not self.day_matches(moment):
+                moment = datetime.combine(moment.date() + timedelta(days=1), datetime.min.time())
+            elif moment.hour not in self.hours:
+                moment = moment.replace(minute=0) + timedelta(hours=1)
+            elif moment.minute not in self.minutes:
+                moment += timedelta(minutes=1)
+            else:
+                return moment
+        raise ValueError(f"Расписание никогда не срабатывает: {self.expression}")
+
+
+def resolve_params(params, now):
+    today = now.date()
+    resolved = dict(params)
+    period = resolved.pop("period", None)
+    if period == "previous_week":
+        start = today - timedelta(days=today.weekday() + 7)
+        resolved.update(start_date=start, end_date=start + timedelta(days=6))
+    elif period == "current_month":
+        start = today.replace(day=1)
+        resolved.update(start_date=start, end_date=(start + timedelta(days=32)).replace(day=1) - timedelta(days=1))
+    elif period == "previous_month":
+        end = today.replace(day=1) - timedelta(days=1)
+        resolved.update(start_date=end.replace(day=1), end_date=end)
+    elif period is not None:
+        raise ValueError(f"Неизвестный период: {period}")
+    if resolved.get("year") == "current":
+        resolved["year"] = today.year
+    for key in ("start_date", "end_date"):
+        if isinstance(resolved.get(key), str):
+            resolved[key] = date.fromisoformat(resolved[key])
+    return resolved
+
+
+# Состояние процесса пула: соединение, таблицы и шрифты создаются один раз на процесс
+worker = {}
+
+
+def init_worker(db_url):
+    engine = create_engine(db_url, pool_size=1, max_overflow=0)
+    metadata = MetaData()
+    metadata.reflect(engine, only=lambda name, _: name in ("users", "data_versions"))
+    # Коды статуса и типа переводятся в подписи тем же типом колонок, что у бота и панели
+    applications = Table("applications", metadata, Column("status", CodedEnum(ApplicationStatus)),
+                         Column("type", CodedEnum(LeaveType)), autoload_with=engine)
+    tables = dict(metadata.tables)
+    # Отчеты строятся по рабочей таблице и архиву рассмотренных заявок вместе
+    if inspect(engine).has_table("applications_archive"):
+        tables["applications"] = archive.combined(applications, archive.define_table(MetaData()))
+    worker.update(engine=engine, tables=tables)
+    reports.register_fonts()
+
+
+def run_job(job, now, previous, directory):
+    # Импорт здесь: админ-панель импортирует модуль ради load_index и не должна тянуть NumPy при старте
+    import workdays
+    started = time.perf_counter()
+    result = {"name": job["name"], "started_at": now.isoformat(timespec="seconds")}
+    try:
+        params = resolve_params(job.get("params", {}), now)
+        tables = worker["tables"]
+        with worker["engine"].connect() as conn:
+            versions = (list(data_version.current(conn, tables["data_versions"])) + [workdays.calendar().digest]
+                        if "data_versions" in tables else None)
+            key = [job["report"], {name: str(value) for name, value in sorted(params.items())}]
+            # Данные и параметры не менялись с прошлого запуска: файл остается прежним
+            if (versions is not None and previous and previous.get("status") == "ok"
+                    and previous.get("versions") == versions and previous.get("key") == key
+                    and os.path.exists(os.path.join(directory, previous["file"]))):
+                result.update(status="ok", file=previous["file"], title=previous.get("title"), rows=previous.get("rows"),
+                              versions=versions, key=key, unchanged=True)
+                return result
+            report = getattr(reports, job["report"])(conn, tables["users"], tables["applications"], **params)
+        if report is None:
+            raise ValueError("Отчет не построен: нет данных для указанных параметров")
+        title, lines = report
+        pdf = reports.render_pdf(title, lines)
+        filename = f"{job['name']}_{now:%Y%m%d_%H%M}.pdf"
+        tmp_path = os.path.join(directory, f"{filename}.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(pdf)
+        os.replace(tmp_path, os.path.join(directory, filename))
+        result.update(status="ok", file=filename, title=title, rows=len(lines), versions=versions, key=key)
+    except Exception as e:
+        result.update(status="error", error=str(e), traceback=traceback.format_exc())
+    finally:
+        result["duration"] = round(time.perf_counter() - started, 3)
+        result["finished_at"] = datetime.now().isoformat(timespec="seconds")
+    return result
+
+
+def load_index(directory):
+    try:
+        with open(os.path.join(directory, INDEX_FILE), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_index(directory, index):
+    path = os.path.join(directory, INDEX_FILE)
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False, indent=2)
+    os.replace(f"{path}.tmp", path)
+
+
+# В индексе по каждому заданию: последний результат, последний готовый файл и история длительностей
+def record_result(directory, result, keep_files, keep_durations):
+    index = load_index(directory)
+    entry = index.setdefault(result["name"], {"durations": [], "files": []})
+    entry["last"] = {key: value for key, value in result.items() if key != "traceback"}
+    entry["durations"] = (entry["durations"] + [result["duration"]])[-keep_durations:]
+    if result.get("unchanged") and entry.get("ready", {}).get("file") == result["file"]:
+        # Файл прежний: время и длительность построения остаются от запуска, который его создал
+        entry["ready"]["checked_at"] = result["finished_at"]
+    elif result["status"] == "ok":
+        entry["ready"] = entry["last"]
+        if result["file"] not in entry["files"]:
+            entry["files"].append(result["file"])
+        for old_file in entry["files"][:-keep_files]:
+            try:
+                os.remove(os.path.join(directory, old_file))
+            except OSError:
+                pass
+        entry["files"] = entry["files"][-keep_files:]
+    save_index(directory, index)
+    return entry
+
+
+class ReportScheduler:
+    def __init__(self, config):
+        self.config = config
+        self.directory = config["REPORTS_DIR"]
+        self.jobs = [(job, CronSchedule(job["schedule"])) for job in config["JOBS"]]
+        self.running = {}
+        # Колбэки завершения пишут общий index.json
+        self.index_lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+        self.executor = ProcessPoolExecutor(
+            max_workers=config["WORKERS"], initializer=init_worker, initargs=(config["DB_URL"],))
+
+    def submit(self, job, now):
+        name = job["name"]
+        if name in self.running and not self.running[name].done():
+            logger.warning(f"Задание {name} еще выполняется, запуск {now:%Y-%m-%d %H:%M} пропущен")
+            return
+        previous = load_index(self.directory).get(name, {}).get("ready")
+        future = self.executor.submit(run_job, job, now, previous, self.directory)
+        future.add_done_callback(self.job_done)
+        self.running[name] = future
+        logger.info(f"Задание {name} запущено")
+
+    def job_done(self, future):
+        try:
+            result = future.result()
+        except Exception as e:
+            logger.error(f"Процесс задания завершился с ошибкой: {e}")
+            return
+        with self.index_lock:
+            record_result(self.directory, result, self.config["KEEP_FILES"], self.config["KEEP_DURATIONS"])
+        if result["status"] == "ok":
+            logger.info(f"Задание {result['name']} выполнено за {result['duration']} с: {result['file']}"
+                        + (" (данные не менялись)" if result.get("unchanged") else ""))
+        else:
+            logger.error(f"Задание {result['name']} завершилось ошибкой: {result['error']}\n{result['traceback']}")
+
+    def run_once(self):
+        now = datetime.now().replace(second=0, microsecond=0)
+        for job, _ in self.jobs:
+            self.submit(job, now)
+        self.shutdown()
+
+    def run_forever(self):
+        logger.info(f"Планировщик отчетов запущен, заданий: {len(self.jobs)}")
+        try:
+            while True:
+                now = datetime.now().replace(second=0, microsecond=0)
+                for job, schedule in self.jobs:
+                    if schedule.matches(now):
+                        self.submit(job, now)
+                next_minute = now + timedelta(minutes=1)
+                time.sleep(max(0, (next_minute - datetime.now()).total_seconds()))
+        finally:
+            self.shutdown()
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Планировщик отчетов CRM")
+    parser.add_argument("--once", action="store_true", help="выполнить все задания сейчас и выйти")
+    parser.add_argument("--list", action="store_true", help="показать ближайшие запуски")
+    args = parser.parse_args()
+
+    if args.list:
+        index = load_index(CONFIG["REPORTS_DIR"])
+        for job in CONFIG["JOBS"]:
+            durations = index.get(job["name"], {}).get("durations", [])
+            average = f", в среднем {sum(durations) / len(durations):.1f} с" if durations else ""
+            print(f"{job['name']:<24}{job['schedule']:<16}следующий запуск "
+                  f"{CronSchedule(job['schedule']).next_after(datetime.now()):%Y-%m-%d %H:%M}{average}")
+        return 0
+
+    import log_pipeline
+    log_pipeline.setup_logging("report_scheduler.log")
+    scheduler = ReportScheduler(CONFIG)
+    if args.once:
+        scheduler.run_once()
+    else:
+        scheduler.run_forever()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+import io
+import os
+import threading
+from datetime import date
+from sqlalchemy import select
+
+# Отчеты админ-панели: запросы отделены от диалогов и от построения PDF,
+# чтобы результат можно было кэшировать и строить без GUI
+
+FONT_PATHS = [
+    "DejaVuSans.ttf",  # Текущая директория
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "DejaVuSans.ttf"),
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",  # Linux
+    "C:/Windows/Fonts/DejaVuSans.ttf"  # Windows
+]
+
+# Шрифты регистрируются в reportlab один раз на процесс
+styles = None
+styles_lock = threading.Lock()
+
+
+# Рабочие дни считаются для всех строк отчета одним вызовом; NumPy загружается при первом отчете
+def application_lines(rows):
+    import workdays
+    days = workdays.calendar().count([row.start_date for row in rows], [row.end_date for row in rows])
+    return [f"#{row.application_id} - {row.type}, {row.start_date} - {row.end_date} ({count} раб. дн.), {row.status}"
+            for row, count in zip(rows, days.tolist())]
+
+
+def applications_period(conn, users, applications, start_date, end_date):
+    apps = applications.c
+    rows = conn.execute(
+        select(apps.application_id, apps.type, apps.start_date, apps.end_date, apps.status)
+        .where(apps.start_date >= start_date, apps.end_date <= end_date)
+        .order_by(apps.application_id)
+    ).all()
+    return "Заявки за период", application_lines(rows)
+
+
+def duration_departments(conn, users, applications, year):
+    apps = applications.c
+    rows = conn.execute(
+        select(users.c.department, apps.start_date, apps.end_date)
+        .join_from(applications, users, apps.user_id == users.c.user_id)
+        .where(apps.start_date >= date(year, 1, 1), apps.end_date <= date(year, 12, 31))
+    ).all()
+    title = "Длительность по отделам (рабочие дни)"
+    if not rows:
+        return title, []
+    import numpy as np
+    import workdays
+    days = workdays.calendar().count([row.start_date for row in rows], [row.end_date for row in rows])
+    departments, index = np.unique([row.department or "Без отдела" for row in rows], return_inverse=True)
+    totals = np.bincount(index, weights=days).astype(np.int64)
+    return title, [f"{dept}: {count} раб. дн." for dept, count in zip(departments.tolist(), totals.tolist())]
+
+
+# None, если сотрудника нет
+def employee_applications(conn, users, applications, user_id):
+    user = conn.execute(
+        select(users.c.first_name, users.c.last_name).where(users.c.user_id == user_id)
+    ).first()
+    if user is None:
+        return None
+    apps = applications.c
+    rows = conn.execute(
+        select(apps.application_id, apps.type, apps.start_date, apps.end_date, apps.status)
+        .where(apps.user_id == user_id)
+        .order_by(apps.application_id)
+    ).all()
+    return f"Заявки сотрудника {user.first_name} {user.last_name}", application_lines(rows)
+
+
+def register_fonts():
+    global styles
+    with styles_lock:
+        if styles is not None:
+            return styles
+        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+        from reportlab.pdfbase import pdfmetrics
+        from reportlab.pdfbase.ttfonts import TTFont
+        found_font = next((path for path in FONT_PATHS if os.path.exists(path)), None)
+        if not found_font:
+            raise FileNotFoundError("Шрифт DejaVuSans.ttf не найден")
+        pdfmetrics.registerFont(TTFont('DejaVuSans', found_font))
+        pdfmetrics.registerFont(TTFont('DejaVuSans-Bold', found_font))  # Используем тот же файл для bold
+        sheet = getSampleStyleSheet()
+        sheet.add(ParagraphStyle(name='DejaVuNormal', fontName='DejaVuSans', fontSize=10, leading=12, encoding='UTF-8'))
+        sheet.add(ParagraphStyle(name='DejaVuTitle', fontName='DejaVuSans-Bold', fontSize=14, leading=16,
+                                 spaceAfter=12, encoding='UTF-8'))
+        styles = sheet
+        return styles
+
+
+def render_pdf(title, content_lines):
+    from reportlab.lib.pagesizes import A4
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+    sheet = register_fonts()
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, encoding='UTF-8')
+    story = [Paragraph(title, sheet['DejaVuTitle']), Spacer(1, 12)]
+    for line in content_lines:
+        if line:  # Пропускаем пустые строки
+            story.append(Paragraph(str(line), sheet['DejaVuNormal']))
+            story.append(Spacer(1, 6))
+    doc.build(story)
+    return buffer.getvalue()
@@ -0,0 +1,81 @@
+import hashlib
+import logging
+from sqlalchemy import MetaData, Table, Column, String, DateTime, select, insert, func, inspect
+from sqlalchemy.exc import DBAPIError
+
+# Проверка схемы при старте: create_all опрашивает БД по каждой таблице, поэтому
+# отпечаток метаданных хранится в самой БД (таблица schema_state) и при совпадении
+# проверка сводится к одному запросу. Пересозданная или восстановленная из копии БД
+# без этой таблицы или без отпечатка снова проходит create_all.
+# create_all только создает недостающие таблицы и не меняет существующие: новые колонки и смена
+# типов приходят миграциями из migrations/. Поэтому отпечаток записывается, лишь когда колонки
+# таблиц в БД совпадают с моделями, иначе старт прерывается со списком расхождений
+
+logger = logging.getLogger(__name__)
+
+state_metadata = MetaData()
+schema_state = Table(
+    "schema_state", state_metadata,
+    # Бот и админ-панель описывают разные наборы моделей, поэтому отпечатков для одной БД несколько
+    Column("fingerprint", String(40), primary_key=True),
+    Column("created_at", DateTime, server_default=func.now())
+)
+
+
+def schema_fingerprint(metadata, tables=None):
+    lines = []
+    for table in sorted(metadata.tables.values() if tables is None else tables, key=lambda t: t.name):
+        for column in table.columns:
+            lines.append(f"{table.name}.{column.name}:{column.type!r}:{column.nullable}:{column.primary_key}")
+        for index in sorted(table.indexes, key=lambda i: i.name or ""):
+            lines.append(f"{table.name}#{index.name}:{','.join(c.name for c in index.columns)}")
+    return hashlib.sha1("\n".join(lines).encode("utf-8")).hexdigest()
+
+
+class SchemaMismatch(Exception):
+    def __init__(self, problems):
+        super().__init__("Схема БД не соответствует моделям, примените миграции из migrations/: " + "; ".join(problems))
+        self.problems = problems
+
+
+# Сравнение по наличию колонок и классу типа (число, строка, дата): имена типов различаются между СУБД
+def schema_problems(conn, metadata):
+    inspector = inspect(conn)
+    problems = []
+    for table in metadata.sorted_tables:
+        actual = {column["name"]: column["type"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in actual:
+                problems.append(f"нет колонки {table.name}.{column.name}")
+            elif not isinstance(actual[column.name], column.type._type_affinity):
+                problems.append(f"{table.name}.{column.name}: {actual[column.name]} вместо {column.type.compile(conn.dialect)}")
+    return problems
+
+
+def is_known(engine, fingerprint):
+    try:
+        with engine.connect() as conn:
+            return conn.execute(
+                select(schema_state.c.fingerprint).where(schema_state.c.fingerprint == fingerprint)
+            ).first() is not None
+    except DBAPIError:
+        # Таблицы нет: новая, пересозданная или восстановленная БД
+        return False
+
+
+def ensure_schema(engine, metadata):
+    fingerprint = schema_fingerprint(metadata)
+    if is_known(engine, fingerprint):
+        return False
+    logger.info(f"Проверка схемы БД {engine.url.render_as_string(hide_password=True)}")
+    metadata.create_all(engine)
+    state_metadata.create_all(engine)
+    with engine.connect() as conn:
+        problems = schema_problems(conn, metadata)
+    if problems:
+        raise SchemaMismatch(problems)
+    with engine.begin() as conn:
+        # Бот и панель могут стартовать одновременно: отпечаток записывается один раз
+        if conn.execute(select(schema_state.c.fingerprint).where(schema_state.c.fingerprint == fingerprint)).first() is None:
+            conn.execute(insert(schema_state).values(fingerprint=fingerprint))
+    return True
@@ -1,25 +1,55 @@
 import telebot
-from telebot import types
-from sqlalchemy import create_engine, Column, Integer, String, Date, Text, ForeignKey, DateTime, Sequence, BigInteger
+from telebot import types, apihelper
+from sqlalchemy import create_engine, Column, Integer, String, Date, Text, ForeignKey, DateTime, Sequence, BigInteger, select
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.orm.exc import StaleDataError
 from datetime import datetime
 from contextlib import contextmanager
-import re
+import os
+import json
 import logging
+import threading
+from validators import validate_email
+import metrics
+import log_pipeline
+import schema_state
+import leave_balance
+import data_version
+import dedup
+import archive
+import profiling
+from enums import ApplicationStatus, LeaveType, CodedEnum
 
 # Конфигурация
 CONFIG = {
-    "",
-    "",
-    ""
+    "TELEGRAM_TOKEN": os.environ.get("TELEGRAM_TOKEN", ""),
+    "DB_URL": os.environ.get("DB_URL", ""),
+    "HR_CHAT_ID": os.environ.get("HR_CHAT_ID", ""),
+    # Порт локального эндпоинта /metrics (None - отключен)
+    "METRICS_PORT": 9108,
+    # Доля сохраняемых записей ниже WARNING по именам логгеров, например {"crm.handlers": 0.1}
+    "LOG_SAMPLING": {},
+    # Файл JSONL для записи входящих обновлений (для воспроизведения в bench_bot_flows.py).
+    # Содержит персональные данные сотрудников, включать только на время снятия нагрузки
+    "UPDATE_CAPTURE": os.environ.get("UPDATE_CAPTURE"),
+    # Окна подавления повторов, с: update_id, одинаковая заявка, повторное нажатие инлайн-кнопки
+    "DEDUP_UPDATE_TTL": 3600,
+    "DEDUP_SUBMISSION_TTL": 600,
+    "DEDUP_CALLBACK_TTL": 3,
+    # Через сколько дней после окончания рассмотренные заявки переносятся в архив (python archive.py)
+    "ARCHIVE_AFTER_DAYS": 180,
+    # Каталог файлов профилирования (/profile в чате HR) и порог журнала медленных запросов, с
+    "PROFILE_DIR": "profiles",
+    "SLOW_QUERY_SECONDS": 0.5
 }
 
-# Настройка логирования
-logging.basicConfig(level=logging.INFO, filename='bot.log', format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# Инициализация бота
-bot = telebot.TeleBot(CONFIG["TELEGRAM_TOKEN"])
+# Бот создается при первом обращении (get_bot): импорт модуля не создает TeleBot
+bot = None
+deduplicator = dedup.Deduplicator(CONFIG["DEDUP_UPDATE_TTL"], CONFIG["DEDUP_SUBMISSION_TTL"], CONFIG["DEDUP_CALLBACK_TTL"])
+profiler = profiling.Profiler(CONFIG["PROFILE_DIR"], "bot")
+profile_timer = None
 
 # Базовый класс для моделей
 Base = declarative_base()
@@ -34,33 +64,61 @@ class User(Base):
     position = Column(String(100))
     department = Column(String(100))
     email = Column(String(100), unique=True, nullable=False)
+    # Версия строки для оптимистичной блокировки: UPDATE идет с условием version = прочитанной,
+    # при расхождении SQLAlchemy выбрасывает StaleDataError
+    version = Column(Integer, nullable=False, server_default="1")
+    __mapper_args__ = {"version_id_col": version}
 
 
 class Application(Base):
     __tablename__ = 'applications'
     application_id = Column(Integer, Sequence('applications_application_id_seq'), primary_key=True)
-    user_id = Column(BigInteger, ForeignKey('users.user_id'), nullable=False)
+    user_id = Column(BigInteger, ForeignKey('users.user_id', ondelete='CASCADE'), nullable=False)
     start_date = Column(Date, nullable=False)
     end_date = Column(Date, nullable=False)
-    type = Column(String(100), nullable=False)
-    status = Column(String(20), nullable=False)
+    type = Column(CodedEnum(LeaveType), nullable=False)
+    status = Column(CodedEnum(ApplicationStatus), nullable=False)
     reason = Column(Text)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    version = Column(Integer, nullable=False, server_default="1")
+    __mapper_args__ = {"version_id_col": version}
 
 
 class Log(Base):
     __tablename__ = 'logs'
     log_id = Column(Integer, Sequence('logs_log_id_seq'), primary_key=True)
-    user_id = Column(BigInteger, ForeignKey('users.user_id'), nullable=False)
+    # Сотрудник, к которому относится запись; пусто у действий администратора без сотрудника
+    user_id = Column(BigInteger, ForeignKey('users.user_id', ondelete='CASCADE'))
     action = Column(Text, nullable=False)
     timestamp = Column(DateTime, default=datetime.utcnow)
+    # Кто выполнил действие в админ-панели; у действий сотрудников в боте пусто
+    actor_id = Column(BigInteger)
 
 
-# Инициализация базы данных
-engine = create_engine(CONFIG["DB_URL"])
-Base.metadata.create_all(engine)
-SessionFactory = sessionmaker(bind=engine)
+leave_balances = leave_balance.define_table(Base.metadata)
+data_versions = data_version.define_table(Base.metadata)
+applications_archive = archive.define_table(Base.metadata)
+# Список и просмотр заявок сотрудника включают перенесенные в архив
+all_applications = archive.combined(Application.__table__, applications_archive)
+
+
+# Инициализация базы данных: при импорте модуля соединение не создается
+engine = None
+SessionFactory = sessionmaker()
+# Отчеты админ-панели кэшируются по версиям данных: заявки и регистрации из бота их увеличивают
+data_version.track(SessionFactory, data_versions)
+
+
+def init_db():
+    global engine
+    engine = create_engine(CONFIG["DB_URL"])
+    metrics.instrument_engine(engine)
+    profiling.log_slow_queries(engine, CONFIG["SLOW_QUERY_SECONDS"])
+    if schema_state.ensure_schema(engine, Base.metadata):
+        leave_balance.rebuild_on_start(engine, leave_balances, all_applications)
+    SessionFactory.configure(bind=engine)
+    return engine
 
 
 # Контекстный менеджер для работы с БД
@@ -78,6 +136,14 @@ def db_session():
         session.close()
 
 
+# Кнопки выбора типа отпуска
+VACATION_TYPES = {
+    "🌴 Ежегодный основной оплачиваемый": LeaveType.ANNUAL_MAIN,
+    "🌞 Ежегодный дополнительный оплачиваемый": LeaveType.ANNUAL_EXTRA,
+    "🏝️ Без сохранения заработной платы": LeaveType.UNPAID
+}
+
+
 # Клавиатуры
 class Keyboards:
     @staticmethod
@@ -90,25 +156,45 @@ class Keyboards:
 
     @staticmethod
     def vacation_type():
-        return types.ReplyKeyboardMarkup(resize_keyboard=True).add(
-            "🌴 Ежегодный основной оплачиваемый",
-            "🌞 Ежегодный дополнительный оплачиваемый",
-            "🏝️ Без сохранения заработной платы",
-            "🏠 В главное меню"
-        )
+        return types.ReplyKeyboardMarkup(resize_keyboard=True).add(*VACATION_TYPES, "🏠 В главное меню")
 
 
 # Утилитные функции
 def send_message(chat_id, text, reply_markup=None):
     try:
-        msg = bot.send_message(chat_id, text, reply_markup=reply_markup)
-        logger.info(f"Сообщение отправлено {chat_id}: {text}")
+        with metrics.telegram_call("sendMessage"):
+            msg = bot.send_message(chat_id, text, reply_markup=reply_markup)
+        logger.info("Сообщение отправлено", extra={"chat_id": chat_id, "length": len(text)})
         return msg
     except Exception as e:
-        logger.error(f"Ошибка отправки сообщения {chat_id}: {e}")
+        logger.error(f"Ошибка отправки сообщения: {e}", extra={"chat_id": chat_id})
         raise
 
 
+# Без ответа на callback клиент Telegram показывает часики и повторяет запрос
+def answer_callback(call, text=None):
+    try:
+        with metrics.telegram_call("answerCallbackQuery"):
+            bot.answer_callback_query(call.id, text)
+    except Exception as e:
+        logger.warning(f"Не удалось ответить на callback: {e}", extra={"chat_id": call.message.chat.id})
+
+
+# Запись сырых обновлений Telegram в JSONL: оборачивает получение обновлений при polling
+def enable_update_capture(path):
+    get_updates = apihelper.get_updates
+
+    def capture(*args, **kwargs):
+        updates = get_updates(*args, **kwargs)
+        if updates:
+            with open(path, "a", encoding="utf-8") as f:
+                for update in updates:
+                    f.write(json.dumps(update, ensure_ascii=False) + "\n")
+        return updates
+    apihelper.get_updates = capture
+    logger.info(f"Запись обновлений в {path}")
+
+
 def validate_date(date_str, allow_past=False):
     try:
         date_obj = datetime.strptime(date_str, '%Y-%m-%d')
@@ -119,11 +205,6 @@ def validate_date(date_str, allow_past=False):
         return False, "Неверный формат (ГГГГ-ММ-ДД)"
 
 
-def validate_email(email):
-    email_pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    return bool(re.match(email_pattern, email)), "Неверный email" if not re.match(email_pattern, email) else None
-
-
 def handle_main_menu_return(message, next_step=None, *args):
     if message.text == "🏠 В главное меню":
         back_to_main_menu(message)
@@ -134,7 +215,7 @@ def handle_main_menu_return(message, next_step=None, *args):
 
 
 # Обработчики
-@bot.message_handler(commands=['start'])
+@metrics.timed
 def start(message):
     chat_id = message.chat.id
     with db_session() as session:
@@ -146,7 +227,50 @@ def start(message):
             bot.register_next_step_handler(message, register_first_name)
 
 
-@bot.message_handler(func=lambda m: m.text == "🏠 В главное меню")
+# Профилирование работающего бота: /profile N [sampling|cprofile], /profile stop.
+# Только из чата HR, для остальных команда не существует
+@metrics.timed
+def profile_command(message):
+    global profile_timer
+    chat_id = message.chat.id
+    if str(chat_id) != str(CONFIG["HR_CHAT_ID"]):
+        return
+    args = message.text.split()[1:]
+    if args and args[0] == "stop":
+        finish_profiling()
+        return
+    try:
+        seconds = int(args[0]) if args else 30
+        mode = args[1] if len(args) > 1 else "sampling"
+        if not 1 <= seconds <= 3600 or mode not in profiling.MODES:
+            raise ValueError
+    except ValueError:
+        send_message(chat_id, "Формат: /profile N [sampling|cprofile] (N от 1 до 3600 с) или /profile stop")
+        return
+    try:
+        profiler.start(mode)
+    except RuntimeError as e:
+        send_message(chat_id, f"❌ {e}. Остановить: /profile stop")
+        return
+    profile_timer = threading.Timer(seconds, finish_profiling)
+    profile_timer.daemon = True
+    profile_timer.start()
+    send_message(chat_id, f"Профилирование {mode} запущено на {seconds} с")
+
+
+def finish_profiling():
+    if profile_timer is not None:
+        profile_timer.cancel()
+    result = profiler.stop()
+    if result is None:
+        send_message(CONFIG["HR_CHAT_ID"], "Профилирование не запущено")
+        return
+    path, summary = result
+    # Сообщение Telegram ограничено 4096 символами, полный профиль - в файле на сервере бота
+    send_message(CONFIG["HR_CHAT_ID"], f"Профиль: {path or 'файл не записан'}\n{summary[:3500]}")
+
+
+@metrics.timed
 def back_to_main_menu(message):
     chat_id = message.chat.id
     with db_session() as session:
@@ -154,7 +278,7 @@ def back_to_main_menu(message):
         send_message(chat_id, "Выберите действие:", Keyboards.action() if user else Keyboards.main_menu())
 
 
-@bot.message_handler(func=lambda m: m.text == "🏖️ Отпуск")
+@metrics.timed
 def handle_vacation(message):
     chat_id = message.chat.id
     with db_session() as session:
@@ -165,7 +289,7 @@ def handle_vacation(message):
     send_message(chat_id, "Тип отпуска:", Keyboards.vacation_type())
 
 
-@bot.message_handler(func=lambda m: m.text == "🤒 Больничный")
+@metrics.timed
 def handle_sick_leave(message):
     chat_id = message.chat.id
     with db_session() as session:
@@ -174,10 +298,10 @@ def handle_sick_leave(message):
             send_message(chat_id, "Сначала зарегистрируйтесь с помощью /start")
             return
     send_message(chat_id, "Дата начала (ГГГГ-ММ-ДД):", Keyboards.main_menu())
-    bot.register_next_step_handler(message, application_start_date, "больничный")
+    bot.register_next_step_handler(message, application_start_date, LeaveType.SICK)
 
 
-@bot.message_handler(func=lambda m: m.text == "📋 Мои заявки")
+@metrics.timed
 def handle_my_applications(message):
     chat_id = message.chat.id
     with db_session() as session:
@@ -185,7 +309,11 @@ def handle_my_applications(message):
         if not user:
             send_message(chat_id, "Сначала зарегистрируйтесь с помощью /start")
             return
-        apps = session.query(Application).filter_by(user_id=chat_id).order_by(Application.application_id.desc()).all()
+        apps = session.execute(
+            select(all_applications.c.application_id, all_applications.c.type, all_applications.c.status)
+            .where(all_applications.c.user_id == chat_id)
+            .order_by(all_applications.c.application_id.desc())
+        ).all()
         if not apps:
             send_message(chat_id, "У вас нет заявок", Keyboards.action())
             return
@@ -196,12 +324,16 @@ def handle_my_applications(message):
         send_message(chat_id, "Ваши заявки:", markup)
 
 
-@bot.callback_query_handler(func=lambda call: call.data.startswith("view_"))
+@metrics.timed
 def view_application(call):
     chat_id = call.message.chat.id
+    answer_callback(call)
+    if not deduplicator.claim_callback(chat_id, call.data):
+        return
     app_id = int(call.data.split("_")[1])
     with db_session() as session:
-        app = session.query(Application).filter_by(application_id=app_id, user_id=chat_id).first()
+        app = session.execute(select(all_applications).where(
+            all_applications.c.application_id == app_id, all_applications.c.user_id == chat_id)).first()
         if app:
             text = (f"Заявка #{app.application_id}\n"
                     f"Тип: {app.type}\n"
@@ -210,22 +342,26 @@ def view_application(call):
                     f"Статус: {app.status}\n"
                     f"Причина: {app.reason or 'Не указана'}")
             markup = types.InlineKeyboardMarkup()
-            if app.status == "на рассмотрении":
+            if app.status == ApplicationStatus.PENDING:
                 markup.add(types.InlineKeyboardButton("✏️ Редактировать", callback_data=f"edit_{app_id}"))
             send_message(chat_id, text, markup)
 
 
-@bot.callback_query_handler(func=lambda call: call.data.startswith("edit_"))
+@metrics.timed
 def edit_application(call):
     chat_id = call.message.chat.id
+    answer_callback(call)
+    if not deduplicator.claim_callback(chat_id, call.data):
+        return
     app_id = int(call.data.split("_")[1])
     with db_session() as session:
         app = session.query(Application).filter_by(application_id=app_id, user_id=chat_id).first()
-        if app and app.status == "на рассмотрении":
+        if app and app.status == ApplicationStatus.PENDING:
             send_message(chat_id, "Новая дата начала (ГГГГ-ММ-ДД):", Keyboards.main_menu())
             bot.register_next_step_handler(call.message, edit_application_start_date, app_id)
 
 
+@metrics.timed
 def edit_application_start_date(message, app_id):
     chat_id = message.chat.id
     if handle_main_menu_return(message):
@@ -239,6 +375,7 @@ def edit_application_start_date(message, app_id):
     bot.register_next_step_handler(message, edit_application_end_date, app_id, result)
 
 
+@metrics.timed
 def edit_application_end_date(message, app_id, start_date):
     chat_id = message.chat.id
     if handle_main_menu_return(message):
@@ -252,38 +389,56 @@ def edit_application_end_date(message, app_id, start_date):
     bot.register_next_step_handler(message, edit_application_reason, app_id, start_date, result)
 
 
+@metrics.timed
 def edit_application_reason(message, app_id, start_date, end_date):
     chat_id = message.chat.id
     if handle_main_menu_return(message):
         return
-    with db_session() as session:
-        app = session.query(Application).filter_by(application_id=app_id, user_id=chat_id).first()
-        if app and app.status == "на рассмотрении":
+    try:
+        with db_session() as session:
+            app = session.query(Application).filter_by(application_id=app_id, user_id=chat_id).first()
+            if not app or app.status != ApplicationStatus.PENDING:
+                send_message(chat_id, "❌ Заявка уже рассмотрена и не может быть изменена", Keyboards.action())
+                return
+            # Старый период возвращается в остаток, новый резервируется в той же транзакции
+            leave_balance.release(session, leave_balances, chat_id, app.type, app.start_date, app.end_date)
+            try:
+                leave_balance.reserve(session, leave_balances, chat_id, app.type, start_date.date(), end_date.date())
+            except leave_balance.InsufficientBalance as e:
+                session.rollback()
+                send_message(chat_id, f"❌ {e}. Заявка не изменена", Keyboards.action())
+                return
             app.start_date = start_date.date()
             app.end_date = end_date.date()
             app.reason = message.text
             app.updated_at = datetime.utcnow()
             session.add(Log(user_id=chat_id, action=f"Редактирование заявки #{app_id}"))
+            # UPDATE с проверкой версии выполняется до сообщений: если HR успел принять решение,
+            # изменение откатывается вместе с резервом остатка
+            session.flush()
+            logger.info("Заявка обновлена", extra={"chat_id": chat_id, "application_id": app_id})
             send_message(chat_id, "✅ Заявка обновлена", Keyboards.action())
             send_message(CONFIG["HR_CHAT_ID"],
                          f"Заявка #{app_id} от {chat_id} обновлена: {app.type} с {app.start_date} по {app.end_date}. Причина: {app.reason}")
+    except StaleDataError:
+        logger.warning("Конфликт версий при редактировании заявки", extra={"chat_id": chat_id, "application_id": app_id})
+        send_message(chat_id, "❌ Заявка изменилась во время редактирования. Откройте ее заново", Keyboards.action())
 
 
-@bot.message_handler(
-    func=lambda m: m.text in ["🌴 Ежегодный основной оплачиваемый", "🌞 Ежегодный дополнительный оплачиваемый",
-                              "🏝️ Без сохранения заработной платы"])
+@metrics.timed
 def handle_vacation_type(message):
-    vacation_types = {
-        "🌴 Ежегодный основной оплачиваемый": "ежегодный основной оплачиваемый",
-        "🌞 Ежегодный дополнительный оплачиваемый": "ежегодный дополнительный оплачиваемый",
-        "🏝️ Без сохранения заработной платы": "без сохранения заработной платы"
-    }
-    app_type = vacation_types[message.text]
+    app_type = VACATION_TYPES[message.text]
+    if leave_balance.is_limited(app_type):
+        year = datetime.now().year
+        with db_session() as session:
+            left = leave_balance.remaining(session, leave_balances, message.chat.id, app_type, year)
+        send_message(message.chat.id, f"Остаток на {year} год: {left} дн.")
     send_message(message.chat.id, "Дата начала (ГГГГ-ММ-ДД):", Keyboards.main_menu())
     bot.register_next_step_handler(message, application_start_date, app_type)
 
 
 # Регистрация
+@metrics.timed
 def register_first_name(message):
     if handle_main_menu_return(message):
         return
@@ -291,6 +446,7 @@ def register_first_name(message):
     bot.register_next_step_handler(message, register_last_name, message.text)
 
 
+@metrics.timed
 def register_last_name(message, first_name):
     if handle_main_menu_return(message):
         return
@@ -298,6 +454,7 @@ def register_last_name(message, first_name):
     bot.register_next_step_handler(message, register_position, first_name, message.text)
 
 
+@metrics.timed
 def register_position(message, first_name, last_name):
     if handle_main_menu_return(message):
         return
@@ -305,6 +462,7 @@ def register_position(message, first_name, last_name):
     bot.register_next_step_handler(message, register_department, first_name, last_name, message.text)
 
 
+@metrics.timed
 def register_department(message, first_name, last_name, position):
     if handle_main_menu_return(message):
         return
@@ -312,6 +470,7 @@ def register_department(message, first_name, last_name, position):
     bot.register_next_step_handler(message, register_email, first_name, last_name, position, message.text)
 
 
+@metrics.timed
 def register_email(message, first_name, last_name, position, department):
     chat_id = message.chat.id
     if handle_main_menu_return(message):
@@ -327,7 +486,7 @@ def register_email(message, first_name, last_name, position, department):
             existing_user = session.query(User).filter_by(email=message.text).first()
             if existing_user:
                 send_message(chat_id, "❌ Этот email уже зарегистрирован", Keyboards.main_menu())
-                logger.warning(f"Попытка регистрации с занятым email: {message.text} для chat_id {chat_id}")
+                logger.warning(f"Попытка регистрации с занятым email: {message.text}", extra={"chat_id": chat_id})
                 bot.register_next_step_handler(message, register_email, first_name, last_name, position, department)
                 return
 
@@ -352,14 +511,15 @@ def register_email(message, first_name, last_name, position, department):
             if not saved_user:
                 raise Exception("Пользователь не был сохранен в базе данных")
 
-            logger.info(f"Пользователь {chat_id} успешно зарегистрирован: {first_name} {last_name}, {message.text}")
+            logger.info(f"Пользователь успешно зарегистрирован: {first_name} {last_name}, {message.text}", extra={"chat_id": chat_id})
             send_message(chat_id, "✅ Регистрация завершена", Keyboards.action())
         except Exception as e:
-            logger.error(f"Ошибка при регистрации пользователя {chat_id}: {str(e)}")
+            logger.error(f"Ошибка при регистрации пользователя: {str(e)}", extra={"chat_id": chat_id})
             send_message(chat_id, f"❌ Ошибка регистрации: {str(e)}. Попробуйте снова с /start", Keyboards.main_menu())
 
 
 # Подача заявки
+@metrics.timed
 def application_start_date(message, app_type):
     chat_id = message.chat.id
     if handle_main_menu_return(message):
@@ -373,6 +533,7 @@ def application_start_date(message, app_type):
     bot.register_next_step_handler(message, application_end_date, app_type, result)
 
 
+@metrics.timed
 def application_end_date(message, app_type, start_date):
     chat_id = message.chat.id
     if handle_main_menu_return(message):
@@ -382,34 +543,99 @@ def application_end_date(message, app_type, start_date):
         send_message(chat_id, f"❌ {result if not is_valid else 'Конец раньше начала'}", Keyboards.main_menu())
         handle_main_menu_return(message, application_end_date, app_type, start_date)
         return
+    if leave_balance.is_limited(app_type):
+        with db_session() as session:
+            for year, days in leave_balance.days_by_year(start_date.date(), result.date()).items():
+                left = leave_balance.remaining(session, leave_balances, chat_id, app_type, year)
+                if days > left:
+                    send_message(chat_id, f"❌ Недостаточно дней в {year} году: запрошено {days}, доступно {left}. "
+                                          f"Введите другую дату окончания", Keyboards.main_menu())
+                    bot.register_next_step_handler(message, application_end_date, app_type, start_date)
+                    return
     send_message(chat_id, "Причина:", Keyboards.main_menu())
     bot.register_next_step_handler(message, application_reason, app_type, start_date, result)
 
 
+@metrics.timed
 def application_reason(message, app_type, start_date, end_date):
     chat_id = message.chat.id
     if handle_main_menu_return(message):
         return
-    with db_session() as session:
-        app = Application(user_id=chat_id, start_date=start_date.date(), end_date=end_date.date(),
-                          type=app_type, status="на рассмотрении", reason=message.text)
-        session.add(app)
-        session.flush()
-        app_id = app.application_id
-        session.add(Log(user_id=chat_id, action=f"Подача заявки #{app_id}"))
-        send_message(CONFIG["HR_CHAT_ID"],
-                     f"Заявка #{app_id} от {chat_id}: {app_type} с {start_date.date()} по {end_date.date()}. Причина: {message.text}")
-        send_message(chat_id, "✅ Заявка подана", Keyboards.action())
+    # Та же заявка недавно подана: повтор не доходит ни до БД, ни до чата HR
+    submission = deduplicator.claim_submission(chat_id, app_type, start_date.date(), end_date.date())
+    if submission is None:
+        send_message(chat_id, "Такая заявка уже подана", Keyboards.action())
+        return
+    try:
+        with db_session() as session:
+            # Остаток мог измениться после проверки на шаге даты окончания: резерв атомарный
+            try:
+                leave_balance.reserve(session, leave_balances, chat_id, app_type, start_date.date(), end_date.date())
+            except leave_balance.InsufficientBalance as e:
+                session.rollback()
+                deduplicator.release_submission(submission)
+                send_message(chat_id, f"❌ {e}. Заявка не подана", Keyboards.action())
+                return
+            app = Application(user_id=chat_id, start_date=start_date.date(), end_date=end_date.date(),
+                              type=app_type, status=ApplicationStatus.PENDING, reason=message.text)
+            session.add(app)
+            session.flush()
+            app_id = app.application_id
+            session.add(Log(user_id=chat_id, action=f"Подача заявки #{app_id}"))
+    except Exception:
+        deduplicator.release_submission(submission)
+        raise
+    # Сообщения уходят после COMMIT: транзакция и блокировки остатка и счетчика версий
+    # не держатся на время запросов к Telegram
+    logger.info("Заявка подана", extra={"chat_id": chat_id, "application_id": app_id})
+    # numpy загружается при первой поданной заявке, а не при импорте бота
+    import workdays
+    working_days = workdays.calendar().count_one(start_date.date(), end_date.date())
+    send_message(CONFIG["HR_CHAT_ID"],
+                 f"Заявка #{app_id} от {chat_id}: {app_type} с {start_date.date()} по {end_date.date()} "
+                 f"({working_days} раб. дн.). Причина: {message.text}")
+    send_message(chat_id, f"✅ Заявка подана: {working_days} раб. дн.", Keyboards.action())
+
+
+# Порядок регистрации - порядок проверки фильтров
+def register_handlers(bot):
+    bot.register_message_handler(start, commands=['start'])
+    bot.register_message_handler(profile_command, commands=['profile'])
+    bot.register_message_handler(back_to_main_menu, func=lambda m: m.text == "🏠 В главное меню")
+    bot.register_message_handler(handle_vacation, func=lambda m: m.text == "🏖️ Отпуск")
+    bot.register_message_handler(handle_sick_leave, func=lambda m: m.text == "🤒 Больничный")
+    bot.register_message_handler(handle_my_applications, func=lambda m: m.text == "📋 Мои заявки")
+    bot.register_callback_query_handler(view_application, func=lambda call: call.data.startswith("view_"))
+    bot.register_callback_query_handler(edit_application, func=lambda call: call.data.startswith("edit_"))
+    bot.register_message_handler(handle_vacation_type, func=lambda m: m.text in VACATION_TYPES)
+
+
+def get_bot():
+    global bot
+    if bot is None:
+        bot = telebot.TeleBot(CONFIG["TELEGRAM_TOKEN"])
+        dedup.install(bot, deduplicator)
+        register_handlers(bot)
+    return bot
 
 
 # Запуск бота
 if __name__ == "__main__":
+    log_pipeline.setup_logging('bot.log', sampling=CONFIG["LOG_SAMPLING"])
     try:
         logger.info("Запуск бота...")
-        bot.polling(none_stop=True, timeout=20)
+        init_db()
+        if CONFIG["METRICS_PORT"]:
+            metrics.start_http_server(CONFIG["METRICS_PORT"])
+        if CONFIG["UPDATE_CAPTURE"]:
+            enable_update_capture(CONFIG["UPDATE_CAPTURE"])
+        get_bot().polling(none_stop=True, timeout=20)
     except KeyboardInterrupt:
         logger.info("Бот остановлен пользователем")
-        engine.dispose()
+        logger.info(f"Отброшено повторов: {deduplicator.stats()}")
+        if engine:
+            engine.dispose()
     except Exception as e:
         logger.error(f"Критическая ошибка бота: {str(e)}")
-        engine.dispose()
\ No newline at end of file
+        if engine:
+            engine.dispose()
\ No newline at end of file
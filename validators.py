@@ -0,0 +1,9 @@
+import re
+
+# Общие правила проверки данных пользователей для бота и админ-панели
+EMAIL_PATTERN = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+
+
+def validate_email(email):
+    is_valid = bool(EMAIL_PATTERN.match(email))
+    return is_valid, "Неверный email" if not is_valid else None
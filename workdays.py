@@ -0,0 +1,89 @@
+import os
+import csv
+import hashlib
+import threading
+from datetime import date
+import numpy as np
+
+# Длительность заявок в рабочих днях по производственному календарю: пятидневка минус
+# праздничные и перенесенные выходные дни плюс рабочие субботы из переносов.
+# Календарь - локальный CSV (date,kind; kind = holiday или workday), его обновляют раз в год
+# после выхода постановления о переносе выходных. Подсчет для пачки заявок - один вызов
+# np.busday_count по массивам дат вместо перебора дней в Python
+
+CALENDAR_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "production_calendar.csv")
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def to_datetime64(dates):
+    dates = list(dates)
+    ordinals = np.fromiter((d.toordinal() for d in dates), dtype=np.int64, count=len(dates))
+    return (ordinals - EPOCH_ORDINAL).astype("datetime64[D]")
+
+
+class WorkCalendar:
+    def __init__(self, holidays=(), workdays=(), weekmask="1111100", digest=""):
+        self.holidays = np.array(sorted(holidays), dtype="datetime64[D]")
+        # Рабочие выходные: busday_count их не знает, они досчитываются бинарным поиском
+        self.workdays = np.array(sorted(workdays), dtype="datetime64[D]")
+        self.busdaycal = np.busdaycalendar(weekmask=weekmask, holidays=self.holidays)
+        self.digest = digest
+
+    @classmethod
+    def load(cls, path=CALENDAR_PATH):
+        with open(path, "rb") as f:
+            data = f.read()
+        holidays, workdays = [], []
+        rows = csv.DictReader(data.decode("utf-8").splitlines())
+        for row in rows:
+            day = np.datetime64(row["date"].strip(), "D")
+            kind = row["kind"].strip()
+            if kind == "holiday":
+                holidays.append(day)
+            elif kind == "workday":
+                workdays.append(day)
+            else:
+                raise ValueError(f"{path}: неизвестный тип дня {kind} для {row['date']}")
+        return cls(holidays, workdays, digest=hashlib.sha1(data).hexdigest())
+
+    # Границы включительно, как в заявках; массивы datetime64[D] или списки date
+    def count(self, starts, ends):
+        if not isinstance(starts, np.ndarray):
+            starts, ends = to_datetime64(starts), to_datetime64(ends)
+        after_ends = ends + np.timedelta64(1, "D")
+        counts = np.busday_count(starts, after_ends, busdaycal=self.busdaycal)
+        if len(self.workdays):
+            counts += np.searchsorted(self.workdays, after_ends) - np.searchsorted(self.workdays, starts)
+        return np.maximum(counts, 0)
+
+    def count_one(self, start_date, end_date):
+        return int(self.count([start_date], [end_date])[0])
+
+
+default_calendar = None
+default_stamp = None
+default_lock = threading.Lock()
+
+
+def file_stamp(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+# Календарь по умолчанию перечитывается, только когда файл изменился (mtime и размер):
+# обновленный CSV меняет digest без перезапуска. Без файла считается чистая пятидневка
+def calendar():
+    global default_calendar, default_stamp
+    stamp = file_stamp(CALENDAR_PATH)
+    with default_lock:
+        if default_calendar is None or stamp != default_stamp:
+            try:
+                default_calendar = WorkCalendar.load(CALENDAR_PATH) if stamp is not None else WorkCalendar()
+            except FileNotFoundError:
+                default_calendar, stamp = WorkCalendar(), None
+            default_stamp = stamp
+        return default_calendar